@@ -0,0 +1,809 @@
+"""
+AI module
+
+Players choosing the next move of a 2048 game. They work on packed boards (see the bitboard module)
+and never import pygame. NTuplePlayer needs the weights trained by the ntuple module,
+MonteCarloPlayer plays its rollouts with the batch module, so it needs numpy
+
+    Usage example:
+
+    player = ExpectimaxPlayer(time_budget=0.008)
+    move = player.get_move(game.get_core().get_board())
+    if move is not None:
+        game.make_move(move)
+"""
+
+import os
+import time
+import random
+import threading
+from array import array
+import bitboard
+import ntuple
+import tables
+
+# Weights of the heuristic evaluation of a row
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+# The probabilities of the tiles spawned by GameCore: 2 five times out of six, 4 one time of six
+SPAWN_PROBABILITIES = ((1, 5/6), (2, 1/6))
+
+ROW_HEURISTIC = None
+
+
+def _row_heuristic(row:int) -> float:
+    """
+    Evaluates a single row: void cells, possible merges and monotonicity are rewarded, big scattered tiles are penalised
+
+    Args:
+        row: An integer, a 16-bit packed row
+
+    Returns:
+        The heuristic value of the row
+    """
+    line = [(row >> 4*k) & 0xF for k in range(4)]
+
+    total = 0.0
+    empty = 0
+    merges = 0
+    previous = 0
+    counter = 0
+    for rank in line:
+        total += rank ** SUM_POWER
+        if rank == 0:
+            empty += 1
+        else:
+            if previous == rank:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = rank
+    if counter > 0:
+        merges += 1 + counter
+
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for k in range(1, 4):
+        if line[k-1] > line[k]:
+            monotonicity_left += line[k-1] ** MONOTONICITY_POWER - line[k] ** MONOTONICITY_POWER
+        else:
+            monotonicity_right += line[k] ** MONOTONICITY_POWER - line[k-1] ** MONOTONICITY_POWER
+
+    return (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges
+            - MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right) - SUM_WEIGHT * total)
+
+
+def build_heuristic_table():
+    """
+    Loads (once) the table of the heuristic value of every row. It's built only the first time,
+    then it's shared by every process through a memory-mapped file (see the tables module)
+
+    Returns:
+        An array of 65536 doubles, indexed by packed row
+    """
+    global ROW_HEURISTIC
+    if ROW_HEURISTIC is None:
+        # The key changes with the weights, so that a stale table is never loaded
+        key = "heuristic v1 %r" % ((LOST_PENALTY, MONOTONICITY_POWER, MONOTONICITY_WEIGHT, SUM_POWER, SUM_WEIGHT, MERGES_WEIGHT, EMPTY_WEIGHT),)
+        ROW_HEURISTIC = tables.load("heuristic", key, lambda: {"ROW_HEURISTIC": array("d", (_row_heuristic(row) for row in range(65536)))})["ROW_HEURISTIC"]
+    return ROW_HEURISTIC
+
+
+def evaluate(board:int) -> float:
+    """
+    Evaluates a packed board as the sum of the heuristic values of its rows and columns
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        The heuristic value of the board
+    """
+    h = ROW_HEURISTIC
+    t = bitboard.transpose(board)
+    return (h[board & 0xFFFF] + h[(board >> 16) & 0xFFFF] + h[(board >> 32) & 0xFFFF] + h[board >> 48]
+            + h[t & 0xFFFF] + h[(t >> 16) & 0xFFFF] + h[(t >> 32) & 0xFFFF] + h[t >> 48])
+
+
+class RandomPlayer:
+    """
+    A class designed to choose a random legal move
+
+    Attributes:
+        __rng: A random.Random instance
+    """
+
+    def __init__(self, seed=None) -> None:
+        """
+        Inits RandomPlayer
+
+        Args:
+            seed: An optional seed for the random generator
+        """
+        self.__rng = random.Random(seed)
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        mask = bitboard.legal_mask(board)
+        moves = [move for direction, move in enumerate(bitboard.MOVES) if mask >> direction & 1]
+        return self.__rng.choice(moves) if moves else None
+
+
+class GreedyPlayer:
+    """
+    A class designed to choose the legal move with the best immediate score,
+    breaking ties with the number of void cells left on the board
+    """
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        best = None
+        best_key = None
+        for direction in range(4):
+            child, score = bitboard.move(board, direction)
+            if child == board:
+                continue
+            key = (score, len(bitboard.empty_cells(child)))
+            if best_key is None or key > best_key:
+                best, best_key = direction, key
+        return None if best is None else bitboard.MOVES[best]
+
+
+class NTuplePlayer:
+    """
+    A class designed to choose the legal move with the best immediate score plus learned value of its afterstate
+    (see the ntuple module)
+
+    Attributes:
+        network: An ntuple.NTupleNetwork
+    """
+
+    def __init__(self, network=None, path:str=None) -> None:
+        """
+        Inits NTuplePlayer
+
+        Args:
+            network: An optional ntuple.NTupleNetwork
+            path: An optional string, the weight file loaded if no network is given (ntuple.DEFAULT_PATH by default)
+        """
+        self.network = network if network is not None else ntuple.load(path or ntuple.DEFAULT_PATH)
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        best = self.network.best_move(board)
+        return None if best is None else bitboard.MOVES[best[0]]
+
+
+class _Timeout(Exception):
+    """
+    Raised inside the search when the time budget of a decision is over
+    """
+
+
+class ExpectimaxPlayer:
+    """
+    A class designed to choose moves with a depth-limited expectimax search
+
+    The search alternates move nodes (the player picks the best move) and chance nodes
+    (the average over every void cell and every spawnable tile). It deepens iteratively
+    until the maximum depth or the time budget is reached, trying first the best move of the previous iteration.
+
+    In pure Python a full depth-3 search costs about 80 ms per decision on average (190 ms at the 99th percentile),
+    so with the default budget of 8 ms the budget bounds the depth, not the other way around: over a real game
+    about 60% of the decisions complete depth 2, the others only depth 1, and depth 3 completes in under 1% of them.
+    A deeper player needs a bigger budget (time_budget=None for a fixed depth)
+
+    Attributes:
+        depth: An integer, the maximum number of tile spawns searched ahead (reached only if the time budget allows it)
+        time_budget: A float, the maximum time (in seconds) spent on a single decision, None for no limit
+        probability_cutoff: A float, chance nodes reached with a lower probability are evaluated with the heuristic
+        table_size: An integer, the maximum number of entries of the transposition table
+        evaluator: A function mapping a packed board (an afterstate) to its value, used at the leaves
+            instead of the heuristic (for example NTupleNetwork.evaluate), None for the heuristic
+        symmetric: A boolean, if True the transposition table is keyed on the canonical boards (see bitboard.canonical_board),
+            so the symmetric boards share their entry
+        cache: A cache.EvalCache or cache.SharedEvalCache (or None), keyed on the canonical boards: the leaf values
+            missing from the leaves of the player are looked up there before being evaluated, and stored there after
+        __table: A dictionary, the transposition table mapping a packed board to a tuple (depth, value)
+        __leaves: A dictionary, mapping a packed board to its heuristic value
+        __deadline: A float, the time at which the current decision must be over
+        __nodes: An integer, the number of nodes visited during the last decision
+        __reached_depth: An integer, the depth of the last completed iteration of the last decision
+    """
+
+    def __init__(self, depth:int=3, time_budget:float=0.008, probability_cutoff:float=1e-3, table_size:int=1 << 16,
+                 evaluator=None, symmetric:bool=False, cache=None) -> None:
+        """
+        Inits ExpectimaxPlayer
+
+        Args:
+            depth: An integer, the maximum number of tile spawns searched ahead
+            time_budget: A float, the maximum time (in seconds) spent on a single decision, None for no limit
+            probability_cutoff: A float, chance nodes reached with a lower probability are evaluated with the heuristic
+            table_size: An integer, the maximum number of entries of the transposition table
+            evaluator: An optional function mapping a packed board to its value, used at the leaves instead of the heuristic
+            symmetric: A boolean, if True the symmetric boards share their entry of the transposition table
+            cache: An optional cache.EvalCache or cache.SharedEvalCache, shared with other players, of the leaf values
+        """
+        self.depth = depth
+        self.time_budget = time_budget
+        self.probability_cutoff = probability_cutoff
+        self.table_size = table_size
+        self.evaluator = evaluator
+        self.symmetric = symmetric
+        self.cache = cache
+
+        build_heuristic_table()
+        self.__table = {}
+        self.__leaves = {}
+        self.__deadline = None
+        self.__nodes = 0
+        self.__reached_depth = 0
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        direction = self.get_direction(board)
+        return None if direction is None else bitboard.MOVES[direction]
+
+    def get_direction(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board
+
+        Returns:
+            An integer (bitboard.UP, RIGHT, DOWN or LEFT), or None if there's no legal move
+        """
+        self.__nodes = 0
+        self.__reached_depth = 0
+        self.__deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+
+        # I list the legal moves and the boards they lead to
+        children = [(direction, child) for direction, child in enumerate(bitboard.move_all(board)) if child != board]
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0][0]
+
+        if len(self.__table) > self.table_size:
+            self.__table.clear()
+        if len(self.__leaves) > self.table_size:
+            self.__leaves.clear()
+
+        best = children[0][0]
+        for depth in range(1, self.depth+1):
+            values = {}
+            try:
+                for direction, child in children:
+                    values[direction] = self.__chance(child, depth, 1.0)
+            except _Timeout:
+                # The previous best move is searched first, so the moves completed
+                # at this depth can still be compared against it
+                if len(values) > 1:
+                    best = max(values, key=values.get)
+                break
+
+            best = max(values, key=values.get)
+            self.__reached_depth = depth
+
+            # Move ordering: the next iteration starts from the best move
+            children.sort(key=lambda c: values[c[0]], reverse=True)
+
+        return best
+
+    def get_stats(self) -> tuple:
+        """
+        Returns some statistics about the last decision
+
+        Returns:
+            A tuple of 2 integers: the number of visited nodes and the depth of the last completed iteration
+        """
+        return self.__nodes, self.__reached_depth
+
+    def search(self, board:int, depth:int, probability:float=1.0, deadline:float=None):
+        """
+        Evaluates a move node: the best value among the boards reachable from a board, searching depth spawns ahead.
+        It's the unit of work of ParallelExpectimaxPlayer
+
+        Args:
+            board: An integer, a packed board
+            depth: An integer, the number of tile spawns searched ahead
+            probability: A float, the probability of reaching the board (see probability_cutoff)
+            deadline: An optional float, the time (of time.monotonic, shared by the processes) at which the search must stop
+
+        Returns:
+            A float, or None if the deadline was reached
+        """
+        self.__nodes = 0
+        self.__deadline = None if deadline is None else time.perf_counter() + (deadline - time.monotonic())
+        if len(self.__table) > self.table_size:
+            self.__table.clear()
+        if len(self.__leaves) > self.table_size:
+            self.__leaves.clear()
+
+        try:
+            return self.__moves(board, depth, probability)
+        except _Timeout:
+            return None
+
+    def __moves(self, board:int, depth:int, probability:float) -> float:
+        """
+        Evaluates a move node: the best value among the boards reachable with a legal move.
+        At the last level (or below the probability cutoff) the boards are evaluated with the heuristic
+        """
+        best = 0.0
+        if depth <= 0 or probability < self.probability_cutoff:
+            h = ROW_HEURISTIC
+            leaves = self.__leaves
+            evaluator = self.evaluator
+            cache = self.cache
+            for child in bitboard.move_all(board):
+                if child != board:
+                    value = leaves.get(child)
+                    if value is None:
+                        # The shared cache is looked up only when the leaves of the player miss
+                        if cache is not None:
+                            key = bitboard.canonical_board(child)
+                            value = cache.get(key)
+                        if value is None:
+                            if evaluator is not None:
+                                value = evaluator(child)
+                            else:
+                                # I inline evaluate, since this is the hottest loop of the search
+                                t = bitboard.transpose(child)
+                                value = (h[child & 0xFFFF] + h[(child >> 16) & 0xFFFF] + h[(child >> 32) & 0xFFFF] + h[child >> 48]
+                                         + h[t & 0xFFFF] + h[(t >> 16) & 0xFFFF] + h[(t >> 32) & 0xFFFF] + h[t >> 48])
+                            if cache is not None:
+                                cache.put(key, value)
+                        leaves[child] = value
+                    if value > best:
+                        best = value
+            return best
+
+        for child in bitboard.move_all(board):
+            if child != board:
+                value = self.__chance(child, depth, probability)
+                if value > best:
+                    best = value
+        return best
+
+    def __chance(self, board:int, depth:int, probability:float) -> float:
+        """
+        Evaluates a chance node: the average value over every possible spawned tile
+        """
+        self.__nodes += 1
+        if self.__deadline is not None and not self.__nodes & 7 and time.perf_counter() > self.__deadline:
+            raise _Timeout()
+
+        # I check whether the board has already been evaluated at least as deep as now
+        # The symmetric boards have the same value, so they can share their entry
+        key = bitboard.canonical_board(board) if self.symmetric else board
+        entry = self.__table.get(key)
+        if entry is not None and entry[0] >= depth:
+            return entry[1]
+
+        cells = bitboard.empty_cells(board)
+        cell_probability = probability / len(cells)
+        moves = self.__moves
+        total = 0.0
+        for k in cells:
+            for exponent, p in SPAWN_PROBABILITIES:
+                total += p * moves(board | exponent << 4*k, depth-1, cell_probability * p)
+        value = total / len(cells)
+
+        self.__table[key] = (depth, value)
+        return value
+
+
+# The search player of the current worker (thread or process) of ParallelExpectimaxPlayer
+_search_worker = threading.local()
+
+
+def _init_search_worker(probability_cutoff:float, table_size:int, symmetric:bool, cache, weights:str) -> None:
+    """
+    Builds the search player of a worker, kept for every task (and every decision) the worker runs
+    """
+    evaluator = None if weights is None else ntuple.load(weights).evaluate
+    _search_worker.player = ExpectimaxPlayer(time_budget=None, probability_cutoff=probability_cutoff, table_size=table_size,
+                                             evaluator=evaluator, symmetric=symmetric, cache=cache)
+
+
+def _search_chunk(boards:list, depth:int, deadline) -> list:
+    """
+    Evaluates a chunk of the boards of the first chance layer in a worker
+
+    Args:
+        boards: A list of tuples (board, probability), the boards after a root move and a spawn
+        depth: An integer, the number of tile spawns searched ahead of them
+        deadline: An optional float, the time (of time.monotonic) at which the search must stop
+
+    Returns:
+        A list with the value of every board, or None if the deadline was reached
+    """
+    player = _search_worker.player
+    values = []
+    for board, probability in boards:
+        value = player.search(board, depth, probability, deadline)
+        if value is None:
+            return None
+        values.append(value)
+    return values
+
+
+class ParallelExpectimaxPlayer:
+    """
+    A class designed to choose moves with an expectimax search split across a pool of workers
+
+    The root is split below its first chance layer: every legal move and every tile it can spawn is a board searched
+    by a worker (see ExpectimaxPlayer.search), the boards are spread in chunks over the workers.
+    Every worker keeps its own transposition table across the decisions, and the leaf values are shared by all of them
+    through a cache (in shared memory for a process pool). The values are combined in a fixed order,
+    exactly as ExpectimaxPlayer does, but the values themselves aren't reproducible: a chunk runs on whichever worker
+    is free, and an entry of its table left by a deeper search (of this or of a previous decision) is reused,
+    so two runs on the same boards can choose different moves. With time_budget=None and table_size=0
+    every board starts from an empty table and the choices are reproducible, at about twice the time per decision.
+    It deepens iteratively: when the time budget is over, the move of the last completed depth is chosen
+
+    Attributes:
+        depth: An integer, the maximum number of tile spawns searched ahead
+        time_budget: A float, the maximum time (in seconds) spent on a single decision, None for no limit
+        workers: An integer, the number of workers of the pool
+        __pool: A concurrent.futures executor, the pool of workers
+        __cache: A cache.SharedEvalCache or cache.EvalCache (or None), the leaf values shared by the workers
+        __background: A concurrent.futures.ThreadPoolExecutor (or None), running the decisions of get_move_async
+        __tasks: An integer, the number of boards searched during the last decision
+        __reached_depth: An integer, the depth of the last completed iteration of the last decision
+    """
+
+    def __init__(self, depth:int=5, time_budget:float=0.1, workers:int=None, processes:bool=True,
+                 probability_cutoff:float=1e-3, table_size:int=1 << 18, symmetric:bool=False,
+                 cache_size:int=1 << 20, weights:str=None) -> None:
+        """
+        Inits ParallelExpectimaxPlayer and starts its pool
+
+        Args:
+            depth: An integer, the maximum number of tile spawns searched ahead
+            time_budget: A float, the maximum time (in seconds) spent on a single decision, None for no limit
+            workers: An optional integer, the number of workers, by default the number of CPUs
+            processes: A boolean, if True the workers are processes, if False threads (which share the interpreter lock)
+            probability_cutoff: A float, chance nodes reached with a lower probability are evaluated at once
+            table_size: An integer, the maximum number of entries of the transposition table of every worker
+            symmetric: A boolean, if True the symmetric boards share their entry of the transposition tables
+            cache_size: An integer, the number of leaf values shared by the workers, 0 for no shared cache
+            weights: An optional string, the weight file of an n-tuple network evaluating the leaves instead of the heuristic
+        """
+        import cache
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        self.depth = depth
+        self.time_budget = time_budget
+        self.workers = workers or os.cpu_count() or 1
+
+        if not cache_size:
+            self.__cache = None
+        elif processes:
+            self.__cache = cache.SharedEvalCache(cache_size)
+        else:
+            self.__cache = cache.EvalCache(cache_size)
+
+        settings = (probability_cutoff, table_size, symmetric, self.__cache, weights)
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.__pool = executor(self.workers, initializer=_init_search_worker, initargs=settings)
+        self.__background = None
+        self.__tasks = 0
+        self.__reached_depth = 0
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        direction = self.get_direction(board)
+        return None if direction is None else bitboard.MOVES[direction]
+
+    def get_move_async(self, board:int):
+        """
+        Chooses the move to make on a board in a background thread, so the caller (the frame loop) doesn't wait
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A concurrent.futures.Future, its result is the move (see get_move)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        if self.__background is None:
+            self.__background = ThreadPoolExecutor(1)
+        return self.__background.submit(self.get_move, board)
+
+    def get_direction(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board
+
+        Returns:
+            An integer (bitboard.UP, RIGHT, DOWN or LEFT), or None if there's no legal move
+        """
+        deadline = None if self.time_budget is None else time.monotonic() + self.time_budget
+        self.__reached_depth = 0
+
+        children = [(direction, child) for direction, child in enumerate(bitboard.move_all(board)) if child != board]
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0][0]
+
+        # The first chance layer: every root move and every tile it can spawn
+        boards = []
+        for _, child in children:
+            cells = bitboard.empty_cells(child)
+            cell_probability = 1.0 / len(cells)
+            for k in cells:
+                for exponent, p in SPAWN_PROBABILITIES:
+                    boards.append((child | exponent << 4*k, cell_probability * p))
+        self.__tasks = len(boards)
+
+        best = children[0][0]
+        for depth in range(1, self.depth+1):
+            values = self.__search(boards, depth-1, deadline)
+            if values is None:
+                break
+
+            # I combine the values in the same order of ExpectimaxPlayer's chance nodes
+            position = 0
+            totals = []
+            for _, child in children:
+                cells = bitboard.empty_cells(child)
+                total = 0.0
+                for _ in cells:
+                    for _, p in SPAWN_PROBABILITIES:
+                        total += p * values[position]
+                        position += 1
+                totals.append(total / len(cells))
+            best = children[totals.index(max(totals))][0]
+            self.__reached_depth = depth
+
+            if deadline is not None and time.monotonic() > deadline:
+                break
+        return best
+
+    def __search(self, boards:list, depth:int, deadline):
+        """
+        Searches the boards of the first chance layer on the pool, in chunks interleaved over the list
+        (the boards of a move are alike, so every chunk gets a share of every move)
+
+        Returns:
+            A list with the value of every board, or None if the deadline was reached
+        """
+        chunks = min(len(boards), 4 * self.workers)
+        futures = [self.__pool.submit(_search_chunk, boards[k::chunks], depth, deadline) for k in range(chunks)]
+        values = [None] * len(boards)
+        for k, future in enumerate(futures):
+            result = future.result()
+            if result is None:
+                for other in futures:
+                    other.cancel()
+                return None
+            values[k::chunks] = result
+        return values
+
+    def get_stats(self) -> tuple:
+        """
+        Returns some statistics about the last decision
+
+        Returns:
+            A tuple of 2 integers: the number of boards of the first chance layer and the depth of the last completed iteration
+        """
+        return self.__tasks, self.__reached_depth
+
+    def close(self) -> None:
+        """
+        Stops the workers and frees the shared cache
+        """
+        if self.__background is not None:
+            self.__background.shutdown()
+        self.__pool.shutdown(cancel_futures=True)
+        if self.__cache is not None and hasattr(self.__cache, "close"):
+            self.__cache.close()
+
+
+def _rollouts(children:tuple, count:int, policy:str, depth, seed:int) -> list:
+    """
+    Plays count rollouts from every board, in a single batch (see batch.rollout_packed).
+    It's a module function, so that it can be sent to the workers of a process pool
+
+    Args:
+        children: A tuple of packed boards, the boards reached by the first moves (before the spawn)
+        count: An integer, the number of rollouts played from every board
+        policy: A string, the policy of the rollouts (see batch.ROLLOUT_POLICIES)
+        depth: An optional integer, the maximum number of moves of a rollout
+        seed: An integer, the seed of the rollouts
+
+    Returns:
+        A list with the total score of the rollouts of every board
+    """
+    # numpy is imported only by the players that need it
+    import numpy as np
+    import batch
+
+    packed = np.repeat(np.array(children, dtype=np.uint64), count)
+    scores = batch.rollout_packed(packed, np.random.default_rng(seed), policy, depth)
+    return [int(total) for total in scores.reshape(len(children), count).sum(axis=1)]
+
+
+class MonteCarloPlayer:
+    """
+    A class designed to choose moves with Monte Carlo rollouts
+
+    For every legal move, the rollouts start from the board it leads to and play random (or greedy) moves
+    until the game is over or the depth limit is reached. The move with the best mean score
+    (its immediate score plus the score of its rollouts) is chosen. The rollouts of all the moves are played
+    in batches with the vectorized engine of the batch module, optionally split across the workers of a pool
+
+    Attributes:
+        rollouts: An integer, the maximum number of rollouts played for every legal move
+        policy: A string, the policy of the rollouts, "random" or "greedy"
+        depth: An integer, the maximum number of moves of a rollout, None to play until the game is over
+        time_budget: A float, the maximum time (in seconds) spent on a single decision, None for no limit.
+            At least one round of rollouts is always played
+        round_size: An integer, the number of rollouts played for every move in a round (the time budget is checked between rounds)
+        pool: A concurrent.futures executor (or None), the rounds are split across its workers
+        workers: An integer, the number of tasks a round is split into when a pool is given
+        __rng: A random.Random instance, generating the seeds of the rollouts
+        __rollouts_played: An integer, the number of rollouts played for every move during the last decision
+    """
+
+    def __init__(self, rollouts:int=200, policy:str="random", depth:int=None, time_budget:float=None,
+                 round_size:int=50, pool=None, workers:int=None, seed=None) -> None:
+        """
+        Inits MonteCarloPlayer
+
+        Args:
+            rollouts: An integer, the maximum number of rollouts played for every legal move
+            policy: A string, the policy of the rollouts, "random" or "greedy"
+            depth: An optional integer, the maximum number of moves of a rollout, None to play until the game is over
+            time_budget: An optional float, the maximum time (in seconds) spent on a single decision, None for no limit
+            round_size: An integer, the number of rollouts played for every move in a round
+            pool: An optional concurrent.futures executor (ThreadPoolExecutor or ProcessPoolExecutor)
+            workers: An optional integer, the number of tasks a round is split into, by default the number of CPUs
+            seed: An optional seed for the random generator of the rollouts
+        """
+        import batch
+        if policy not in batch.ROLLOUT_POLICIES:
+            raise ValueError("unknown rollout policy: " + policy)
+
+        self.rollouts = rollouts
+        self.policy = policy
+        self.depth = depth
+        self.time_budget = time_budget
+        self.round_size = round_size
+        self.pool = pool
+        self.workers = workers or os.cpu_count() or 1
+        self.__rng = random.Random(seed)
+        self.__rollouts_played = 0
+
+    def get_move(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+
+        Returns:
+            A string ("up", "right", "down" or "left"), or None if there's no legal move
+        """
+        direction = self.get_direction(board)
+        return None if direction is None else bitboard.MOVES[direction]
+
+    def get_direction(self, board:int):
+        """
+        Chooses the move to make on a board
+
+        Args:
+            board: An integer, a packed board
+
+        Returns:
+            An integer (bitboard.UP, RIGHT, DOWN or LEFT), or None if there's no legal move
+        """
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        self.__rollouts_played = 0
+
+        children = []
+        for direction in range(4):
+            child, score = bitboard.move(board, direction)
+            if child != board:
+                children.append((direction, child, score))
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0][0]
+
+        boards = tuple(child for _, child, _ in children)
+        totals = [0] * len(children)
+        while self.__rollouts_played < self.rollouts:
+            count = min(self.round_size, self.rollouts - self.__rollouts_played)
+            for k, total in enumerate(self.__play_round(boards, count)):
+                totals[k] += total
+            self.__rollouts_played += count
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+        means = [score + total / self.__rollouts_played for (_, _, score), total in zip(children, totals)]
+        return children[means.index(max(means))][0]
+
+    def get_stats(self) -> int:
+        """
+        Returns the number of rollouts played for every legal move during the last decision
+        """
+        return self.__rollouts_played
+
+    def __play_round(self, boards:tuple, count:int) -> list:
+        """
+        Plays a round of rollouts, splitting it across the workers of the pool if there's one
+
+        Args:
+            boards: A tuple of packed boards, the boards reached by the legal moves
+            count: An integer, the number of rollouts played from every board
+
+        Returns:
+            A list with the total score of the rollouts of every board
+        """
+        if self.pool is None or count < 2:
+            return _rollouts(boards, count, self.policy, self.depth, self.__rng.getrandbits(63))
+
+        # Every task gets its own seed, drawn in order, so the result doesn't depend on the scheduling
+        tasks = min(self.workers, count)
+        futures = [self.pool.submit(_rollouts, boards, count // tasks + (k < count % tasks), self.policy, self.depth,
+                                    self.__rng.getrandbits(63)) for k in range(tasks)]
+        totals = [0] * len(boards)
+        for future in futures:
+            for k, total in enumerate(future.result()):
+                totals[k] += total
+        return totals
@@ -0,0 +1,144 @@
+"""
+Autoplay module
+
+The AIWorker class computes the moves of the AI in a separate process, so the frame loop never waits for the search:
+the boards are sent through a queue of requests and the moves come back through a queue of results,
+read without blocking once every frame.
+Only the newest request matters: the worker skips the older ones, and the caller ignores the results
+about boards that are gone (after a move or a new game).
+The turbo mode doesn't use the worker: a round trip through the queues for every move would cost more
+than the shallow search it plays with, so its moves are searched in the frame loop (see TURBO_DEPTH)
+
+    Usage example:
+
+    worker = AIWorker()
+    worker.request(board)
+    ...
+    result = worker.poll()
+    if result is not None and result[0] == board:
+        game.queue_move(result[1])
+    ...
+    worker.close()
+"""
+
+import multiprocessing
+import queue
+
+import ai
+
+# The speeds of the autoplay, in moves per second. None is the turbo mode: no animations,
+# as many moves as the frame leaves time for
+SPEEDS = (1, 2, 4, 8, 16, None)
+DEFAULT_SPEED = 2
+
+# The fraction of a frame the turbo mode spends making moves, the rest is left to draw the frame
+TURBO_FRACTION = 0.6
+
+# The depth of the search of the turbo mode, made in the frame loop (about 0.4 ms per move)
+TURBO_DEPTH = 1
+
+
+def _serve(requests:multiprocessing.Queue, results:multiprocessing.Queue, depth:int, time_budget:float) -> None:
+    """
+    The loop of the worker process: it answers the requests until it receives None
+
+    Args:
+        requests: A multiprocessing.Queue of boards, a None stops the worker
+        results: A multiprocessing.Queue where the tuples (board, move) are put, move is None if there's no legal move
+        depth: An integer, the maximum depth of the search
+        time_budget: A float, the maximum time (in seconds) of a decision
+    """
+    player = ai.ExpectimaxPlayer(depth=depth, time_budget=time_budget)
+
+    while True:
+        request = requests.get()
+        # Only the newest request matters, the older ones are about boards already gone
+        try:
+            while request is not None:
+                request = requests.get_nowait()
+        except queue.Empty:
+            pass
+        if request is None:
+            break
+
+        results.put((request, player.get_move(request)))
+
+
+class AIWorker:
+    """
+    A class designed to compute the moves of the AI in a worker process
+
+    Attributes:
+        __requests: A multiprocessing.Queue, the boards sent to the worker
+        __results: A multiprocessing.Queue, the moves sent back by the worker
+        __process: The multiprocessing.Process of the worker
+        __waiting: An integer, the board of the last request, None if it has been answered
+    """
+
+    def __init__(self, depth:int=3, time_budget:float=0.05) -> None:
+        """
+        Inits AIWorker and starts its process
+
+        Args:
+            depth: An integer, the maximum depth of the search (see ai.ExpectimaxPlayer)
+            time_budget: A float, the maximum time (in seconds) of a decision
+        """
+        self.__requests = multiprocessing.Queue()
+        self.__results = multiprocessing.Queue()
+        self.__process = multiprocessing.Process(target=_serve, args=(self.__requests, self.__results, depth, time_budget), daemon=True)
+        self.__process.start()
+        self.__waiting = None
+
+    def request(self, board:int) -> None:
+        """
+        Asks the worker the move to make on a board
+
+        Args:
+            board: An integer, a packed board (see GameCore.get_board)
+        """
+        self.__requests.put(board)
+        self.__waiting = board
+
+    def is_alive(self) -> bool:
+        """
+        Checks whether the worker process is still running (it may have been killed or crashed)
+        """
+        return self.__process.is_alive()
+
+    def is_pending(self) -> bool:
+        """
+        Checks whether the last request hasn't been answered yet. A dead worker never answers, so nothing is pending
+        """
+        return self.__waiting is not None and self.__process.is_alive()
+
+    def poll(self, timeout:float=None):
+        """
+        Reads the newest answer of the worker
+
+        Args:
+            timeout: An optional float, the maximum time (in seconds) to wait for an answer. If None it doesn't wait
+
+        Returns:
+            A tuple (board, move), move is None if there's no legal move; None if there's no new answer
+        """
+        result = None
+        try:
+            if timeout is not None and self.is_pending():
+                result = self.__results.get(timeout=timeout)
+            while True:
+                result = self.__results.get_nowait()
+        except queue.Empty:
+            pass
+        # The skipped requests are never answered, only the last one matters
+        if result is not None and result[0] == self.__waiting:
+            self.__waiting = None
+        return result
+
+    def close(self) -> None:
+        """
+        Stops the worker process
+        """
+        self.__requests.put(None)
+        self.__process.join(1.0)
+        if self.__process.is_alive():
+            self.__process.terminate()
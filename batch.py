@@ -0,0 +1,420 @@
+"""
+Batch module
+
+The BatchGame class plays many 2048 games at once, stepping all the boards
+with vectorized NumPy operations. It's meant for headless simulations: it never imports pygame
+
+    Usage example:
+
+    games = BatchGame(10000, seed=42)
+    while not games.game_over.all():
+        rewards, moved = games.step(policy(games.boards, games.legal_moves()))
+
+The games are stored packed (see the bitboard module): the (N,4,4) boards are unpacked only when they're read
+"""
+
+from array import array
+import numpy as np
+import bitboard
+import tables
+
+# The row lookup tables of the bitboard module, seen as NumPy arrays (no copy is made)
+ROW_LEFT = np.frombuffer(bitboard.ROW_LEFT, dtype=np.uint16)
+ROW_RIGHT = np.frombuffer(bitboard.ROW_RIGHT, dtype=np.uint16)
+SCORE_LEFT = np.frombuffer(bitboard.SCORE_LEFT, dtype=np.uint32)
+SCORE_RIGHT = np.frombuffer(bitboard.SCORE_RIGHT, dtype=np.uint32)
+ROW_LEGAL = np.frombuffer(bitboard.ROW_LEGAL, dtype=np.uint8)
+
+# The policies choosing the moves of rollout_packed
+ROLLOUT_POLICIES = ("random", "greedy")
+
+
+def _build_tables() -> dict:
+    """
+    Builds the lookup tables of the batch engine
+
+    Returns:
+        A dictionary mapping the name of every table to an array
+    """
+    # The row results of every move, indexed by direction*65536 + row
+    row_result = np.empty((4, 65536), dtype=np.uint16)
+    row_result[[bitboard.UP, bitboard.LEFT]] = ROW_LEFT
+    row_result[[bitboard.RIGHT, bitboard.DOWN]] = ROW_RIGHT
+    row_score = np.empty((4, 65536), dtype=np.uint32)
+    row_score[[bitboard.UP, bitboard.LEFT]] = SCORE_LEFT
+    row_score[[bitboard.RIGHT, bitboard.DOWN]] = SCORE_RIGHT
+
+    # The void cells of every row as a 4-bit mask, and for every 16-bit mask
+    # its number of set bits and the position of its k-th set bit (at index mask*16 + k)
+    bits = (np.arange(65536)[:, None] >> np.arange(16)) & 1
+    row_void = (((np.arange(65536)[:, None] >> np.arange(0,16,4)) & 0xF) == 0).astype(np.uint8) @ np.array([1,2,4,8], dtype=np.uint8)
+    mask_count = bits.sum(axis=1).astype(np.uint8)
+    mask_select = np.stack([np.argmax(bits.cumsum(axis=1) > k, axis=1) for k in range(16)], axis=1).astype(np.uint8)
+
+    return {
+        "ROW_RESULT": array("H", row_result.tobytes()),
+        "ROW_SCORE": array("I", row_score.tobytes()),
+        "ROW_VOID": array("B", row_void.tobytes()),
+        "MASK_COUNT": array("B", mask_count.tobytes()),
+        "MASK_SELECT": array("B", mask_select.tobytes()),
+    }
+
+
+# The tables are built once and shared by every process through a memory-mapped file (see the tables module)
+_TABLES = tables.load("batch", "batch v1, " + bitboard.TABLES_KEY, _build_tables)
+ROW_RESULT = np.frombuffer(_TABLES["ROW_RESULT"], dtype=np.uint16)
+ROW_SCORE = np.frombuffer(_TABLES["ROW_SCORE"], dtype=np.uint32)
+ROW_VOID = np.frombuffer(_TABLES["ROW_VOID"], dtype=np.uint8)
+MASK_COUNT = np.frombuffer(_TABLES["MASK_COUNT"], dtype=np.uint8)
+MASK_SELECT = np.frombuffer(_TABLES["MASK_SELECT"], dtype=np.uint8)
+
+# For every 4-bit mask of legal moves (the move d in the bit 3-d, see random_moves) its number of legal moves
+# and its k-th legal move (at index mask*4 + k)
+MOVE_COUNT = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.uint8)
+MOVE_SELECT = np.array([([d for d in range(4) if mask >> (3-d) & 1] + [0]*4)[k] for mask in range(16) for k in range(4)], dtype=np.int64)
+
+_U64 = np.uint64
+
+
+def pack(boards:np.ndarray) -> np.ndarray:
+    """
+    Packs a stack of boards into 64-bit integers, with the same layout of the bitboard module
+
+    Args:
+        boards: A (N,4,4) uint8 array of exponents
+
+    Returns:
+        A (N,) uint64 array of packed boards
+    """
+    # Every row is read as a little endian uint32, one cell per byte.
+    # I fold the 4 bytes into 4 nibbles, and 4 rows of 16 bits make a packed board
+    rows = np.ascontiguousarray(boards).reshape(-1,4,4).view("<u4")[..., 0]
+    pairs = rows | (rows >> 4)
+    rows = ((pairs & 0xFF) | ((pairs >> 8) & 0xFF00)).astype("<u2")
+    return rows.view("<u8")[:, 0]
+
+
+def unpack(packed:np.ndarray) -> np.ndarray:
+    """
+    Unpacks 64-bit integers into a stack of boards
+
+    Args:
+        packed: A (N,) uint64 array of packed boards
+
+    Returns:
+        A (N,4,4) uint8 array of exponents
+    """
+    rows = np.ascontiguousarray(packed, dtype="<u8").view("<u2").reshape(-1,4).astype("<u4")
+    pairs = (rows & 0xFF) | ((rows & 0xFF00) << 8)
+    rows = (pairs & 0x000F000F) | ((pairs & 0x00F000F0) << 4)
+    return rows.view(np.uint8).reshape(-1,4,4)
+
+
+def transpose(packed:np.ndarray) -> np.ndarray:
+    """
+    Transposes packed boards, so that their columns become their rows (see bitboard.transpose)
+
+    Args:
+        packed: A (N,) uint64 array of packed boards
+
+    Returns:
+        A (N,) uint64 array of the packed transposed boards
+    """
+    a = (packed & _U64(0xF0F00F0FF0F00F0F)) | ((packed & _U64(0x0000F0F00000F0F0)) << _U64(12)) | ((packed & _U64(0x0F0F00000F0F0000)) >> _U64(12))
+    return (a & _U64(0xFF00FF0000FF00FF)) | ((a & _U64(0x00FF00FF00000000)) >> _U64(24)) | ((a & _U64(0x00000000FF00FF00)) << _U64(24))
+
+
+def move_packed(packed:np.ndarray, direction) -> tuple:
+    """
+    Makes a move on every packed board, without spawning any tile
+
+    Args:
+        packed: A (N,) uint64 array of packed boards
+        direction: An integer (bitboard.UP, RIGHT, DOWN or LEFT), or a (N,) integer array with a direction for every board
+
+    Returns:
+        A tuple of 2 elements: the (N,) uint64 array of the resulting boards and the (N,) int64 array of the score gained
+    """
+    direction = np.broadcast_to(np.asarray(direction, dtype=np.int64), packed.shape)
+    vertical = (direction == bitboard.UP) | (direction == bitboard.DOWN)
+
+    # The columns of the board are the rows of the transposed board
+    lines = np.where(vertical, transpose(packed), packed)
+    index = lines.view("<u2").reshape(-1,4) + (direction.astype(np.uint32) << 16)[:, None]
+
+    new_lines = ROW_RESULT.take(index).view("<u8")[:, 0]
+    # Summing the 4 columns one by one is much faster than a reduction along a short axis
+    row_scores = ROW_SCORE.take(index)
+    scores = (row_scores[:, 0] + row_scores[:, 1] + row_scores[:, 2] + row_scores[:, 3]).astype(np.int64)
+    return np.where(vertical, transpose(new_lines), new_lines), scores
+
+
+def move_boards(boards:np.ndarray, direction) -> tuple:
+    """
+    Makes a move on every board of a stack, without spawning any tile
+
+    Args:
+        boards: A (N,4,4) uint8 array of exponents
+        direction: An integer (bitboard.UP, RIGHT, DOWN or LEFT), or a (N,) integer array with a direction for every board
+
+    Returns:
+        A tuple of 2 elements: the (N,4,4) array of the resulting boards and the (N,) int64 array of the score gained
+    """
+    packed, scores = move_packed(pack(boards), direction)
+    return unpack(packed), scores
+
+
+def spawn_packed(packed:np.ndarray, mask:np.ndarray, rng:np.random.Generator) -> np.ndarray:
+    """
+    Spawns a tile in a random void cell of the selected packed boards
+
+    Args:
+        packed: A (N,) uint64 array of packed boards
+        mask: A (N,) boolean array, the boards where a tile will spawn
+        rng: A numpy Generator
+
+    Returns:
+        A (N,) uint64 array, the packed boards after the spawn
+    """
+    # I build the 16-bit mask of the void cells of every board
+    rows = ROW_VOID.take(packed.view("<u2").reshape(-1,4)).astype(np.uint16)
+    void = rows[:, 0] | (rows[:, 1] << 4) | (rows[:, 2] << 8) | (rows[:, 3] << 12)
+    counts = MASK_COUNT.take(void)
+
+    # I pick the k-th void cell of every board, choosing k uniformly
+    k = (rng.random(len(packed), dtype=np.float32) * counts).astype(np.int64)
+    position = MASK_SELECT.take(void.astype(np.int64)*16 + np.minimum(k, 15)).astype(np.uint64)
+
+    # The new tile's value will be 2 five times out of six, 4 one time of six
+    values = np.where(rng.random(len(packed), dtype=np.float32) < 1/6, _U64(2), _U64(1))
+    values *= mask & (counts > 0)
+    return packed | (values << (position << _U64(2)))
+
+
+def legal_packed(packed:np.ndarray) -> np.ndarray:
+    """
+    Computes the legality of every move on packed boards
+
+    Args:
+        packed: A (N,) uint64 array of packed boards
+
+    Returns:
+        A (N,4) boolean array, the element [n,d] is True if the move d is legal on the n-th board
+    """
+    def fold(lines):
+        # I OR together the legality bits of the 4 lines of every board
+        bits = ROW_LEGAL.take(lines.view("<u2").reshape(-1,4)).view("<u4")[:, 0]
+        return (bits | (bits >> 8) | (bits >> 16) | (bits >> 24)) & 3
+
+    rows = fold(packed)
+    cols = fold(transpose(packed))
+
+    legal = np.empty((len(packed), 4), dtype=bool)
+    legal[:, bitboard.UP] = cols & 1
+    legal[:, bitboard.RIGHT] = rows & 2
+    legal[:, bitboard.DOWN] = cols & 2
+    legal[:, bitboard.LEFT] = rows & 1
+    return legal
+
+
+def random_moves(legal:np.ndarray, rng:np.random.Generator) -> np.ndarray:
+    """
+    Chooses a uniform random legal move on every board
+
+    Args:
+        legal: A (N,4) boolean array of legal moves (see legal_packed)
+        rng: A numpy Generator
+
+    Returns:
+        A (N,) int64 array of moves (bitboard.UP, RIGHT, DOWN or LEFT), an arbitrary one for the boards with no legal move
+    """
+    # The 4 flags of a board read as a little endian uint32 have one byte each: the multiplication
+    # gathers them in the top byte as a 4-bit mask (the flag of the move d in the bit 3-d)
+    flags = np.ascontiguousarray(legal).view("<u4")[:, 0]
+    masks = (flags * np.uint32(0x08040201)) >> np.uint32(24)
+    counts = MOVE_COUNT.take(masks)
+    k = (rng.random(len(flags), dtype=np.float32) * counts).astype(np.int64)
+    return MOVE_SELECT.take(masks.astype(np.int64)*4 + np.minimum(k, 3))
+
+
+def legal_moves_of(boards:np.ndarray) -> np.ndarray:
+    """
+    Computes the legality of every move on a stack of boards
+
+    Args:
+        boards: A (N,4,4) uint8 array of exponents
+
+    Returns:
+        A (N,4) boolean array, the element [n,d] is True if the move d is legal on the n-th board
+    """
+    return legal_packed(pack(boards))
+
+
+def rollout_packed(packed:np.ndarray, rng:np.random.Generator, policy:str="random", depth:int=None) -> np.ndarray:
+    """
+    Plays a rollout from every packed board: moves and spawns until the game is over or the depth limit is reached.
+    At every step only the boards still playing are moved, so long rollouts don't pay for the finished ones
+
+    Args:
+        packed: A (N,) uint64 array of packed boards, a tile is spawned on them before the first move
+        rng: A numpy Generator, used to choose the moves and to spawn the tiles
+        policy: A string, "random" (a uniform legal move) or "greedy" (the legal move with the best immediate score,
+            ties broken at random)
+        depth: An optional integer, the maximum number of moves of a rollout. If None, every rollout plays until the game is over
+
+    Returns:
+        A (N,) int64 array, the score gained by every rollout
+    """
+    if policy not in ROLLOUT_POLICIES:
+        raise ValueError("unknown rollout policy: " + policy)
+
+    boards = spawn_packed(np.asarray(packed, dtype=np.uint64), np.ones(len(packed), dtype=bool), rng)
+    scores = np.zeros(len(boards), dtype=np.int64)
+    index = np.arange(len(boards))
+    step = 0
+    while len(index) and (depth is None or step < depth):
+        legal = legal_packed(boards)
+        playing = legal.view("<u4")[:, 0] != 0
+        if not playing.all():
+            index, boards, legal = index[playing], boards[playing], legal[playing]
+            if not len(index):
+                break
+
+        if policy == "greedy":
+            # A random key for every move breaks the ties: the illegal ones can't win the argmax
+            keys = rng.random(legal.shape, dtype=np.float32)
+            keys += np.stack([move_packed(boards, direction)[1] for direction in range(4)], axis=1)
+            keys[~legal] = -1
+            moves = keys.argmax(axis=1)
+        else:
+            moves = random_moves(legal, rng)
+
+        boards, gains = move_packed(boards, moves)
+        boards = spawn_packed(boards, np.ones(len(boards), dtype=bool), rng)
+        scores[index] += gains
+        step += 1
+    return scores
+
+
+class BatchGame:
+    """
+    A class designed to play many 2048 games at once
+
+    Attributes:
+        boards: A (N,4,4) uint8 array, the exponents of the tiles of every board (0 for a void cell), unpacked from packed
+            the first time it's read after a change. It must be treated as read only
+        packed: A (N,) uint64 array, the boards packed with the layout of the bitboard module (the state of the games)
+        scores: A (N,) int64 array, the score of every game
+        moves: A (N,) int64 array, the number of moves made in every game
+        game_over: A (N,) boolean array, True for the games that are over
+        __legal: A (N,4) boolean array, the legal moves of every board
+        __boards: The (N,4,4) array returned by boards, None if it must be unpacked again
+        __rng: A numpy Generator, used to spawn the tiles
+    """
+
+    def __init__(self, n:int, seed=None) -> None:
+        """
+        Inits BatchGame and starts n new games
+
+        Args:
+            n: An integer, the number of games played at once
+            seed: An optional seed for the random generator used to spawn the tiles
+        """
+        self.__rng = np.random.default_rng(seed)
+        self.packed = np.zeros(n, dtype=np.uint64)
+        self.__boards = None
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.moves = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.__legal = np.zeros((n,4), dtype=bool)
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.packed)
+
+    @property
+    def boards(self) -> np.ndarray:
+        # A step only moves the packed boards, most policies never read the unpacked ones
+        if self.__boards is None:
+            self.__boards = unpack(self.packed)
+        return self.__boards
+
+    def reset(self, mask:np.ndarray=None) -> None:
+        """
+        Starts new games by spawning the first 2 tiles
+
+        Args:
+            mask: An optional (N,) boolean array, the games to reset. If None, every game is reset
+        """
+        if mask is None:
+            index = np.arange(len(self.packed))
+        else:
+            index = np.flatnonzero(mask)
+
+        self.scores[index] = 0
+        self.moves[index] = 0
+
+        # I generate the first two tiles of the games
+        packed = np.zeros(len(index), dtype=np.uint64)
+        selected = np.ones(len(index), dtype=bool)
+        packed = spawn_packed(packed, selected, self.__rng)
+        packed = spawn_packed(packed, selected, self.__rng)
+
+        self.packed[index] = packed
+        self.__boards = None
+        self.__legal[index] = legal_packed(packed)
+        self.game_over[index] = False
+
+    def __update(self, packed:np.ndarray) -> None:
+        """
+        Stores the new packed boards, updating the legal moves and the game over flags
+
+        Args:
+            packed: A (N,) uint64 array of packed boards
+        """
+        self.packed = packed
+        self.__boards = None
+        self.__legal = legal_packed(packed)
+        # The 4 flags of a board read as a single uint32 are 0 only if no move is legal
+        self.game_over = self.__legal.view("<u4")[:, 0] == 0
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Returns the legal moves of every board
+
+        Returns:
+            A (N,4) boolean array, the element [n,d] is True if the move d (bitboard.UP, RIGHT, DOWN or LEFT) is legal on the n-th board
+        """
+        return self.__legal
+
+    def step(self, moves:np.ndarray) -> tuple:
+        """
+        Makes one move on every board, then spawns a new tile on the boards that changed.
+        Illegal moves and games already over leave the board unchanged
+
+        Args:
+            moves: A (N,) integer array, the move (bitboard.UP, RIGHT, DOWN or LEFT) to make on every board
+
+        Returns:
+            A tuple of 2 elements: the (N,) int64 array of the score gained by every game
+            and the (N,) boolean array of the boards that changed
+        """
+        # An illegal move (or any move of a game over) leaves every row unchanged and scores 0,
+        # so the tables already handle it
+        packed, rewards = move_packed(self.packed, moves)
+        moved = packed != self.packed
+
+        self.scores += rewards
+        self.moves += moved
+        self.__update(spawn_packed(packed, moved, self.__rng))
+        return rewards, moved
+
+    def max_tiles(self) -> np.ndarray:
+        """
+        Returns the biggest tile of every board
+
+        Returns:
+            A (N,) int64 array of tile values
+        """
+        exponents = self.boards.reshape(-1, 16).max(axis=1).astype(np.int64)
+        return np.where(exponents > 0, 1 << exponents, 0)
@@ -0,0 +1,518 @@
+"""
+Benchmark module
+
+Measures the speed of the hot paths of the game: the moves and the legality checks of the engines
+(on every board size), the spawns and the moves of GameCore, the moves of Game, whole headless games
+(one at a time with GameCore, and many at once with batch.BatchGame), the latency of the decisions of ai.ExpectimaxPlayer
+(at its default time budget), the scaling of ai.ParallelExpectimaxPlayer with its number of workers, the frame time of Game.show (drawn with the dummy SDL video driver)
+and the throughput of the game server (with many concurrent local clients).
+The boards and the games are seeded, so every run measures the same positions.
+
+The results can be written to a JSON file and compared against a previous one (the baseline):
+the benchmark fails if a result is worse than the baseline by more than the tolerance
+
+    Usage example:
+
+    python benchmark.py --output baseline.json
+    ...
+    python benchmark.py --baseline baseline.json --tolerance 0.1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import bitboard
+import grid
+from core import GameCore
+
+SIZES = ("3x3", "3x4", "4x4", "5x5", "6x6", "8x8", "4x6")
+BENCHMARKS = ("moves", "legality", "spawns", "core_moves", "game_moves", "games", "batch_games", "expectimax", "parallel", "show", "server")
+
+
+def sample_boards(rows:int, cols:int, count:int=1000, seed:int=0) -> list:
+    """
+    Collects the boards met during seeded random games
+
+    Args:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+        count: An integer, the number of boards to collect
+        seed: An integer, the seed of the games and of the moves
+
+    Returns:
+        A list of count boards of the grid of the given size
+    """
+    rng = random.Random(seed)
+    boards = []
+    game = 0
+    while len(boards) < count:
+        core = GameCore(seed=seed+game, rows=rows, cols=cols)
+        while len(boards) < count and not core.check_game_over():
+            boards.append(core.get_board())
+            core.make_move(rng.choice(core.legal_moves()))
+        game += 1
+    return boards
+
+
+def _rate(step, duration:float) -> float:
+    """
+    Calls a function until the duration is over
+
+    Args:
+        step: A function with no arguments, returning the number of operations it made
+        duration: A float, the minimum time (in seconds) of the measure
+
+    Returns:
+        The number of operations per second
+    """
+    operations = 0
+    start = time.perf_counter()
+    while True:
+        operations += step()
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return operations / elapsed
+
+
+def bench_moves(rows:int, cols:int, duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many moves per second the engine of a board size makes
+
+    Args:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+        duration: A float, the minimum time (in seconds) of the measure
+        seed: An integer, the seed of the sampled boards
+
+    Returns:
+        The number of moves per second, every move of every direction is counted
+    """
+    move = grid.make_grid(rows, cols).move
+    boards = sample_boards(rows, cols, seed=seed)
+
+    def step():
+        for board in boards:
+            for direction in range(4):
+                move(board, direction)
+        return 4*len(boards)
+    return _rate(step, duration)
+
+
+def bench_legality(rows:int, cols:int, duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many boards per second the engine of a board size checks for legal moves
+
+    Args:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+        duration: A float, the minimum time (in seconds) of the measure
+        seed: An integer, the seed of the sampled boards
+
+    Returns:
+        The number of legality checks (of all the 4 moves at once) per second
+    """
+    legal_mask = grid.make_grid(rows, cols).legal_mask
+    boards = sample_boards(rows, cols, seed=seed)
+
+    def step():
+        for board in boards:
+            legal_mask(board)
+        return len(boards)
+    return _rate(step, duration)
+
+
+def bench_spawns(duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many tiles per second GameCore spawns, resetting a game (2 spawns) over and over
+
+    Returns:
+        The number of spawned tiles per second
+    """
+    core = GameCore(seed=seed)
+
+    def step():
+        for _ in range(1000):
+            core.reset()
+        return 2000
+    return _rate(step, duration)
+
+
+def bench_core_moves(duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many moves per second GameCore makes, spawns and legality updates included
+
+    Returns:
+        The number of moves per second
+    """
+    return _play(GameCore(seed=seed), random.Random(seed), duration)
+
+
+def bench_game_moves(duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many moves per second Game makes, the computation of the animations included (nothing is drawn)
+
+    Returns:
+        The number of moves per second
+    """
+    _init_display()
+    from game import Game
+    return _play(Game((0,0), 96, 12, None, 50, seed=seed), random.Random(seed), duration)
+
+
+def _play(game, rng:random.Random, duration:float) -> float:
+    """
+    Plays random moves on a GameCore or a Game, starting a new game when the current one is over
+
+    Returns:
+        The number of moves per second
+    """
+    def step():
+        for _ in range(1000):
+            moves = game.legal_moves()
+            if moves:
+                game.make_move(rng.choice(moves))
+            else:
+                game.reset()
+        return 1000
+    return _rate(step, duration)
+
+
+def bench_games(duration:float=1.0, seed:int=0) -> float:
+    """
+    Measures how many whole random games per second GameCore plays
+
+    Returns:
+        The number of games per second
+    """
+    rng = random.Random(seed)
+    games = [0]
+
+    def step():
+        core = GameCore(seed=seed+games[0])
+        while True:
+            moves = core.legal_moves()
+            if not moves:
+                break
+            core.make_move(rng.choice(moves))
+        games[0] += 1
+        return 1
+    return _rate(step, duration)
+
+
+def bench_batch_games(duration:float=1.0, seed:int=0, n:int=1024) -> float:
+    """
+    Measures how many whole random games per second batch.BatchGame plays, n games at once
+    (a batch is over when its longest game is)
+
+    Args:
+        duration: A float, the minimum time (in seconds) of the measure
+        seed: An integer, the seed of the games and of the moves
+        n: An integer, the number of games played at once
+
+    Returns:
+        The number of games per second
+    """
+    import numpy as np
+    from batch import BatchGame, random_moves
+
+    games = BatchGame(n, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    def step():
+        games.reset()
+        while not games.game_over.all():
+            games.step(random_moves(games.legal_moves(), rng))
+        return n
+    return _rate(step, duration)
+
+
+def bench_expectimax(duration:float=1.0, seed:int=0) -> tuple:
+    """
+    Measures the latency of the decisions of ai.ExpectimaxPlayer at its default depth and time budget,
+    playing a seeded game (and starting a new one when it's over)
+
+    Returns:
+        A tuple of 2 floats: the mean and the 99th percentile of the time of a decision (in milliseconds)
+    """
+    import ai
+
+    player = ai.ExpectimaxPlayer()
+    core = GameCore(seed=seed)
+    games = 1
+    times = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        if core.check_game_over():
+            core = GameCore(seed=seed+games)
+            games += 1
+        decision_start = time.perf_counter()
+        move = player.get_move(core.get_board())
+        times.append(time.perf_counter() - decision_start)
+        core.make_move(move)
+
+    times.sort()
+    return 1000 * sum(times) / len(times), 1000 * times[min(len(times)-1, int(0.99 * len(times)))]
+
+
+def bench_parallel_expectimax(duration:float=1.0, seed:int=0, workers:tuple=(1, 2, 4), depth:int=3) -> dict:
+    """
+    Measures how ai.ParallelExpectimaxPlayer scales with the number of its worker processes:
+    every pool makes fixed-depth decisions (no time budget) on the same boards of seeded random games.
+    The pools are started, and make a first decision, before the measure
+
+    Args:
+        duration: A float, the minimum time (in seconds) of the measure of every pool
+        seed: An integer, the seed of the boards
+        workers: A tuple of integers, the number of workers of every pool, the first one is the reference of the speedups
+        depth: An integer, the number of tile spawns searched ahead
+
+    Returns:
+        A dictionary mapping every number of workers to a tuple of 2 floats:
+        the decisions per second and the speedup over the first pool
+    """
+    import ai
+
+    # The boards with a single legal move are decided without searching, so they're left out
+    boards = [board for board in sample_boards(4, 4, 200, seed) if bin(bitboard.legal_mask(board)).count("1") > 1]
+    results = {}
+    for count in workers:
+        player = ai.ParallelExpectimaxPlayer(depth=depth, time_budget=None, workers=count)
+        try:
+            player.get_direction(boards[0])
+            positions = itertools.cycle(boards)
+
+            def step():
+                player.get_direction(next(positions))
+                return 1
+            rate = _rate(step, duration)
+        finally:
+            player.close()
+        results[count] = (rate, rate / results[workers[0]][0] if results else 1.0)
+    return results
+
+
+def bench_show(duration:float=1.0, seed:int=0) -> tuple:
+    """
+    Measures the time Game.show takes to draw a frame while the tiles are moving and spawning.
+    The animations are driven by a simulated clock running at 60 frames per second, so every run draws the same frames
+
+    Returns:
+        A tuple of 2 floats: the mean and the 99th percentile of the frame time (in milliseconds)
+    """
+    pygame = _init_display()
+    from game import Game
+    screen = pygame.display.get_surface()
+    clock = [0]
+    game = Game((53,108), 96, 12, None, 50, seed=seed, clock=lambda: clock[0])
+    rng = random.Random(seed)
+
+    times = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        moves = game.legal_moves()
+        if moves:
+            game.make_move(rng.choice(moves))
+        else:
+            game.reset()
+        # Only the frames that draw something are measured
+        while game.is_animating() and not game.check_game_over():
+            frame_start = time.perf_counter()
+            game.show(screen)
+            times.append(time.perf_counter() - frame_start)
+            clock[0] += 1000 // 60
+
+    times.sort()
+    return 1000 * sum(times) / len(times), 1000 * times[min(len(times)-1, int(0.99 * len(times)))]
+
+
+def bench_server(duration:float=1.0, seed:int=0, clients:int=64) -> tuple:
+    """
+    Measures the throughput of the game server: many clients, connected through a local TCP socket,
+    play seeded random games at once, starting a new session when their game is over
+
+    Args:
+        duration: A float, the minimum time (in seconds) of the measure
+        seed: An integer, the seed of the sessions and of the moves
+        clients: An integer, the number of concurrent connections, each one playing a session at a time
+
+    Returns:
+        A tuple of 2 floats: the number of moves per second and the number of sessions started per second
+    """
+    import asyncio
+    import json
+    from server import Server
+
+    async def client(port, k, deadline, counts):
+        rng = random.Random(seed + k)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        state = None
+        while time.perf_counter() < deadline:
+            if state is None or state["over"]:
+                if state is not None:
+                    writer.write(b'{"op":"close","session":%d}\n' % state["session"])
+                    await reader.readline()
+                writer.write(b'{"op":"new","seed":%d}\n' % rng.getrandbits(32))
+                counts[1] += 1
+            else:
+                writer.write(b'{"op":"move","session":%d,"move":"%s"}\n' % (state["session"], rng.choice(state["legal"]).encode()))
+                counts[0] += 1
+            state = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+
+    async def measure():
+        listener = await Server(seed=seed).serve_tcp("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        counts = [0, 0]
+        start = time.perf_counter()
+        await asyncio.gather(*(client(port, k, start + duration, counts) for k in range(clients)))
+        elapsed = time.perf_counter() - start
+        listener.close()
+        await listener.wait_closed()
+        return counts[0] / elapsed, counts[1] / elapsed
+
+    return asyncio.run(measure())
+
+
+def _init_display():
+    """
+    Opens (once) a window with the dummy SDL video driver, so that the renderer can be measured without a screen
+
+    Returns:
+        The pygame module
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    if pygame.display.get_surface() is None:
+        pygame.init()
+        pygame.display.set_mode((550,660))
+    return pygame
+
+
+def run(benchmarks:list, sizes:list, duration:float, seed:int) -> dict:
+    """
+    Runs the benchmarks
+
+    Args:
+        benchmarks: A list of strings, the names of the benchmarks to run (see BENCHMARKS)
+        sizes: A list of tuples of 2 integers, the board sizes of the engine benchmarks
+        duration: A float, the minimum time (in seconds) of every measure
+        seed: An integer, the seed of the boards and of the games
+
+    Returns:
+        A dictionary mapping the name of every result to a dictionary {"value": value, "unit": unit}.
+        The results measured in operations per second (or as a speedup, "x") are better when higher, the others when lower
+    """
+    results = {}
+    for name in benchmarks:
+        if name in ("moves", "legality"):
+            bench = bench_moves if name == "moves" else bench_legality
+            unit = "moves/s" if name == "moves" else "checks/s"
+            for rows, cols in sizes:
+                results["%s/%dx%d" % (name, rows, cols)] = {"value": bench(rows, cols, duration, seed), "unit": unit}
+        elif name == "spawns":
+            results[name] = {"value": bench_spawns(duration, seed), "unit": "spawns/s"}
+        elif name == "core_moves":
+            results[name] = {"value": bench_core_moves(duration, seed), "unit": "moves/s"}
+        elif name == "game_moves":
+            results[name] = {"value": bench_game_moves(duration, seed), "unit": "moves/s"}
+        elif name == "games":
+            results[name] = {"value": bench_games(duration, seed), "unit": "games/s"}
+        elif name == "batch_games":
+            results[name] = {"value": bench_batch_games(duration, seed), "unit": "games/s"}
+        elif name == "expectimax":
+            mean, p99 = bench_expectimax(duration, seed)
+            results["expectimax/mean"] = {"value": mean, "unit": "ms"}
+            results["expectimax/p99"] = {"value": p99, "unit": "ms"}
+        elif name == "parallel":
+            for workers, (rate, speedup) in bench_parallel_expectimax(duration, seed).items():
+                results["parallel/%d" % workers] = {"value": rate, "unit": "decisions/s"}
+                if workers != 1:
+                    results["parallel/%d/speedup" % workers] = {"value": speedup, "unit": "x"}
+        elif name == "show":
+            mean, p99 = bench_show(duration, seed)
+            results["show/mean"] = {"value": mean, "unit": "ms"}
+            results["show/p99"] = {"value": p99, "unit": "ms"}
+        elif name == "server":
+            moves, sessions = bench_server(duration, seed)
+            results["server/moves"] = {"value": moves, "unit": "moves/s"}
+            results["server/sessions"] = {"value": sessions, "unit": "sessions/s"}
+        else:
+            raise ValueError("unknown benchmark: " + name)
+    return results
+
+
+def compare(results:dict, baseline:dict, tolerance:float) -> list:
+    """
+    Compares the results against a baseline
+
+    Args:
+        results: A dictionary of results (see run)
+        baseline: A dictionary of results, usually loaded from the output of a previous run
+        tolerance: A float, the relative slowdown allowed before a result is a regression
+
+    Returns:
+        A list of tuples (name, value, baseline value, change, regression), one for every result found in both.
+        The change is positive when the result improved, negative when it got worse
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        value, old = result["value"], baseline[name]["value"]
+        if result["unit"].endswith("/s") or result["unit"] == "x":
+            change = value / old - 1
+        else:
+            change = old / value - 1
+        rows.append((name, value, old, change, change < -tolerance))
+    return rows
+
+
+def parse_size(size:str) -> tuple:
+    rows, cols = size.lower().split("x")
+    return int(rows), int(cols)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measures the speed of the hot paths of the game")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="board sizes of the engine benchmarks, as ROWSxCOLS")
+    parser.add_argument("--duration", type=float, default=1.0, help="minimum time (in seconds) of every measure")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the boards and of the games")
+    parser.add_argument("--output", help="JSON file where the results are written")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare the results against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown allowed against the baseline before failing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sizes = [parse_size(size) for size in args.sizes]
+    results = run(args.only, sizes, args.duration, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if not args.baseline:
+        for name, result in results.items():
+            print("%-16s %14.3f %s" % (name, result["value"], result["unit"]))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for name, value, old, change, regression in compare(results, baseline, args.tolerance):
+        regressions += regression
+        print("%-16s %14.3f %14.3f %+7.1f%%%s" % (name, value, old, 100*change, "  REGRESSION" if regression else ""))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
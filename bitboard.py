@@ -0,0 +1,379 @@
+"""
+Bitboard module
+
+A table driven engine for a 4x4 2048 board packed in a single 64-bit integer.
+Every cell is stored as a 4-bit exponent: 0 for a void cell, n for a tile of value 2**n,
+so the biggest tile is 2**MAX_EXPONENT (32768): two of them don't merge, and a bigger tile can't be packed.
+The cell (i,j) is stored in the nibble starting at bit 4*(4*i+j), so the row i
+is the 16-bit value (board >> 16*i) & 0xFFFF, with its leftmost cell in the lowest nibble.
+
+Every move is resolved with 4 lookups in precomputed 65536-entry tables.
+The tables are built once and shared by every process through a memory-mapped file (see the tables module)
+
+    Usage example:
+
+    board = from_matrix(matrix)
+    if is_legal(board, LEFT):
+        board, score = move(board, LEFT)
+"""
+
+from array import array
+import tables
+
+# The moves, their index is also their bit in the mask of legal moves of GameCore (see GameCore.legal_moves)
+UP, RIGHT, DOWN, LEFT = 0, 1, 2, 3
+MOVES = ("up", "right", "down", "left")
+MOVE_INDEX = {name: index for index, name in enumerate(MOVES)}
+
+# A tile can't grow over 2**15, the biggest exponent fitting in a nibble
+MAX_EXPONENT = 15
+
+ROW_MASK = 0xFFFF
+
+
+def slide_line(line:list, max_exponent:int=MAX_EXPONENT) -> list:
+    """
+    Computes where every tile of a line ends up after a move.
+    It works on lines of any length, and it's the only slide routine of the engines:
+    the row tables are built with it, and so are the moves of the boards of the grid module
+
+    Args:
+        line: A list of exponents, listed starting from the edge the tiles are moved toward
+        max_exponent: An integer, tiles with this exponent don't merge anymore
+
+    Returns:
+        A list of tuples of 3 elements, one for every non-void cell: the index of the cell,
+        the index of the destination of the tile and a boolean representing if the tile merges at its destination
+    """
+    moves = []
+    dst = -1
+    last = 0
+    can_merge = False
+    for k, e in enumerate(line):
+        if e == 0:
+            continue
+        if can_merge and e == last and e != max_exponent:
+            # The current tile merges with the previous one
+            moves.append((k, dst, True))
+            can_merge = False
+        else:
+            dst += 1
+            last = e
+            can_merge = True
+            moves.append((k, dst, False))
+    return moves
+
+
+def _slide_row(line:list) -> tuple:
+    """
+    Slides a row of 4 exponents to the left, merging equal tiles
+
+    Args:
+        line: A list of 4 integers, the exponents of the row from left to right
+
+    Returns:
+        A tuple of 2 elements: the list of the 4 resulting exponents and the score gained
+    """
+    result = [0]*4
+    score = 0
+    for src, dst, merged in slide_line(line):
+        if merged:
+            result[dst] += 1
+            score += 1 << result[dst]
+        else:
+            result[dst] = line[src]
+    return result, score
+
+
+def _pack_row(line:list) -> int:
+    return line[0] | (line[1] << 4) | (line[2] << 8) | (line[3] << 12)
+
+
+def _unpack_col(row:int) -> int:
+    # The k-th nibble of the row becomes the k-th cell of the first column
+    return (row & 0xF) | ((row >> 4) & 0xF) << 16 | ((row >> 8) & 0xF) << 32 | ((row >> 12) & 0xF) << 48
+
+
+# The version of the row tables, it must change whenever _build_tables builds different tables
+TABLES_KEY = "bitboard rows v1, max exponent %d" % MAX_EXPONENT
+
+
+def _build_tables() -> dict:
+    """
+    Builds the row lookup tables used by move, is_legal and score
+
+    Returns:
+        A dictionary mapping the name of every table to an array
+    """
+    ROW_LEFT = array("H", bytes(2*65536))
+    ROW_RIGHT = array("H", bytes(2*65536))
+    SCORE_LEFT = array("I", bytes(4*65536))
+    SCORE_RIGHT = array("I", bytes(4*65536))
+    COL_UP = array("Q", bytes(8*65536))
+    COL_DOWN = array("Q", bytes(8*65536))
+    ROW_LEGAL = array("B", bytes(65536))
+
+    for row in range(65536):
+        line = [(row >> 4*k) & 0xF for k in range(4)]
+
+        left, left_score = _slide_row(line)
+        right, right_score = _slide_row(line[::-1])
+        right.reverse()
+
+        left = _pack_row(left)
+        right = _pack_row(right)
+
+        ROW_LEFT[row] = left
+        ROW_RIGHT[row] = right
+        SCORE_LEFT[row] = left_score
+        SCORE_RIGHT[row] = right_score
+        COL_UP[row] = _unpack_col(left)
+        COL_DOWN[row] = _unpack_col(right)
+        # bit 0: the row can be moved to the left, bit 1: the row can be moved to the right
+        ROW_LEGAL[row] = (left != row) | (right != row) << 1
+
+    return {"ROW_LEFT": ROW_LEFT, "ROW_RIGHT": ROW_RIGHT, "SCORE_LEFT": SCORE_LEFT, "SCORE_RIGHT": SCORE_RIGHT,
+            "COL_UP": COL_UP, "COL_DOWN": COL_DOWN, "ROW_LEGAL": ROW_LEGAL}
+
+
+_TABLES = tables.load("bitboard", TABLES_KEY, _build_tables)
+ROW_LEFT = _TABLES["ROW_LEFT"]
+ROW_RIGHT = _TABLES["ROW_RIGHT"]
+SCORE_LEFT = _TABLES["SCORE_LEFT"]
+SCORE_RIGHT = _TABLES["SCORE_RIGHT"]
+COL_UP = _TABLES["COL_UP"]
+COL_DOWN = _TABLES["COL_DOWN"]
+ROW_LEGAL = _TABLES["ROW_LEGAL"]
+
+
+def transpose(board:int) -> int:
+    """
+    Transposes a packed board, so that its columns become its rows
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        The packed transposed board
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(board:int) -> int:
+    """
+    Reflects a packed board horizontally, reversing the cells of every row
+    """
+    return (((board & 0xF000F000F000F000) >> 12) | ((board & 0x0F000F000F000F00) >> 4)
+            | ((board & 0x00F000F000F000F0) << 4) | ((board & 0x000F000F000F000F) << 12))
+
+
+def flip(board:int) -> int:
+    """
+    Reflects a packed board vertically, reversing the order of its rows
+    """
+    return ((board & 0xFFFF) << 48) | ((board & 0xFFFF0000) << 16) | ((board >> 16) & 0xFFFF0000) | (board >> 48)
+
+
+def symmetries(board:int) -> tuple:
+    """
+    Lists the 8 symmetries of a packed board (its 4 rotations and their reflections)
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        A tuple of 8 packed boards, the first one is the board itself
+    """
+    f = flip(board)
+    t = transpose(board)
+    tf = flip(t)
+    return (board, mirror(board), f, mirror(f), t, mirror(t), tf, mirror(tf))
+
+
+def canonical_board(board:int) -> int:
+    """
+    Picks the canonical form of a board: the smallest of its 8 symmetries (see symmetries).
+    The symmetric boards share the canonical form, so it can be the key of their (common) evaluation
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        An integer, the canonical packed board
+    """
+    f = flip(board)
+    t = transpose(board)
+    tf = flip(t)
+    return min(board, mirror(board), f, mirror(f), t, mirror(t), tf, mirror(tf))
+
+
+def move(board:int, direction:int) -> tuple:
+    """
+    Makes a move on a packed board, without spawning any tile
+
+    Args:
+        board: An integer, a packed board
+        direction: An integer, it must be UP, RIGHT, DOWN or LEFT
+
+    Returns:
+        A tuple of 2 integers: the resulting packed board and the score gained with the move.
+        If the move is not legal the board is returned unchanged
+    """
+    if direction == LEFT:
+        r0, r1, r2, r3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+        return (ROW_LEFT[r0] | ROW_LEFT[r1] << 16 | ROW_LEFT[r2] << 32 | ROW_LEFT[r3] << 48,
+                SCORE_LEFT[r0] + SCORE_LEFT[r1] + SCORE_LEFT[r2] + SCORE_LEFT[r3])
+    if direction == RIGHT:
+        r0, r1, r2, r3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+        return (ROW_RIGHT[r0] | ROW_RIGHT[r1] << 16 | ROW_RIGHT[r2] << 32 | ROW_RIGHT[r3] << 48,
+                SCORE_RIGHT[r0] + SCORE_RIGHT[r1] + SCORE_RIGHT[r2] + SCORE_RIGHT[r3])
+
+    # The columns of the board are the rows of the transposed board
+    t = transpose(board)
+    c0, c1, c2, c3 = t & ROW_MASK, (t >> 16) & ROW_MASK, (t >> 32) & ROW_MASK, t >> 48
+    if direction == UP:
+        return (COL_UP[c0] | COL_UP[c1] << 4 | COL_UP[c2] << 8 | COL_UP[c3] << 12,
+                SCORE_LEFT[c0] + SCORE_LEFT[c1] + SCORE_LEFT[c2] + SCORE_LEFT[c3])
+    return (COL_DOWN[c0] | COL_DOWN[c1] << 4 | COL_DOWN[c2] << 8 | COL_DOWN[c3] << 12,
+            SCORE_RIGHT[c0] + SCORE_RIGHT[c1] + SCORE_RIGHT[c2] + SCORE_RIGHT[c3])
+
+
+def move_all(board:int) -> tuple:
+    """
+    Makes every move on a packed board at once, without spawning any tile and without computing the score.
+    It's faster than 4 calls of move, since rows and columns are extracted only once
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        A tuple of 4 integers, the boards resulting from the moves UP, RIGHT, DOWN and LEFT
+    """
+    r0, r1, r2, r3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+    t = transpose(board)
+    c0, c1, c2, c3 = t & ROW_MASK, (t >> 16) & ROW_MASK, (t >> 32) & ROW_MASK, t >> 48
+    return (COL_UP[c0] | COL_UP[c1] << 4 | COL_UP[c2] << 8 | COL_UP[c3] << 12,
+            ROW_RIGHT[r0] | ROW_RIGHT[r1] << 16 | ROW_RIGHT[r2] << 32 | ROW_RIGHT[r3] << 48,
+            COL_DOWN[c0] | COL_DOWN[c1] << 4 | COL_DOWN[c2] << 8 | COL_DOWN[c3] << 12,
+            ROW_LEFT[r0] | ROW_LEFT[r1] << 16 | ROW_LEFT[r2] << 32 | ROW_LEFT[r3] << 48)
+
+
+def is_legal(board:int, direction:int) -> bool:
+    """
+    Checks whether a move is legal on a packed board
+
+    Args:
+        board: An integer, a packed board
+        direction: An integer, it must be UP, RIGHT, DOWN or LEFT
+
+    Returns:
+        True if the move is legal, False if it isn't
+    """
+    if direction == LEFT or direction == RIGHT:
+        rows = board
+    else:
+        rows = transpose(board)
+    bit = 2 if direction == RIGHT or direction == DOWN else 1
+    return bool((ROW_LEGAL[rows & ROW_MASK] | ROW_LEGAL[(rows >> 16) & ROW_MASK]
+                 | ROW_LEGAL[(rows >> 32) & ROW_MASK] | ROW_LEGAL[rows >> 48]) & bit)
+
+
+def legal_mask(board:int) -> int:
+    """
+    Computes the legality of all the moves at once
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        An integer whose bit d is set if the move d (UP, RIGHT, DOWN or LEFT) is legal
+    """
+    rows = ROW_LEGAL[board & ROW_MASK] | ROW_LEGAL[(board >> 16) & ROW_MASK] | ROW_LEGAL[(board >> 32) & ROW_MASK] | ROW_LEGAL[board >> 48]
+    t = transpose(board)
+    cols = ROW_LEGAL[t & ROW_MASK] | ROW_LEGAL[(t >> 16) & ROW_MASK] | ROW_LEGAL[(t >> 32) & ROW_MASK] | ROW_LEGAL[t >> 48]
+    return (cols & 1) << UP | (rows >> 1) << RIGHT | (cols >> 1) << DOWN | (rows & 1) << LEFT
+
+
+def empty_cells(board:int) -> list:
+    """
+    Lists the void cells of a packed board
+
+    Args:
+        board: An integer, a packed board
+
+    Returns:
+        The list of the indexes (4*i+j) of the void cells, in row-major order
+    """
+    return [k for k in range(16) if not (board >> 4*k) & 0xF]
+
+
+def max_exponent(board:int) -> int:
+    """
+    Returns the biggest exponent on a packed board
+    """
+    best = 0
+    while board:
+        best = max(best, board & 0xF)
+        board >>= 4
+    return best
+
+
+def exponent_of(value:int, max_exponent:int=MAX_EXPONENT) -> int:
+    """
+    Returns the exponent of a tile value
+
+    Args:
+        value: An integer, a tile value (0 for a void cell, else a power of 2 from 2 on)
+        max_exponent: An integer, the biggest exponent the board can store
+
+    Returns:
+        An integer, 0 for a void cell, n for a tile of value 2**n
+
+    Raises:
+        ValueError: if the value isn't a tile value or if it's too big to be stored
+    """
+    if not value:
+        return 0
+    exponent = value.bit_length() - 1
+    if value < 2 or value != 1 << exponent:
+        raise ValueError("%r is not a tile value" % (value,))
+    if exponent > max_exponent:
+        raise ValueError("the tile %d is bigger than %d, the biggest tile of this board" % (value, 1 << max_exponent))
+    return exponent
+
+
+def from_matrix(matrix:list) -> int:
+    """
+    Packs a 4x4 matrix of tile values (0, 2, 4, 8...) into a 64-bit integer
+
+    Raises:
+        ValueError: if a tile is bigger than 2**MAX_EXPONENT (see exponent_of)
+    """
+    board = 0
+    for i in range(4):
+        for j in range(4):
+            if matrix[i][j]:
+                board |= exponent_of(matrix[i][j]) << 4*(4*i+j)
+    return board
+
+
+def to_matrix(board:int) -> list:
+    """
+    Unpacks a 64-bit integer into a 4x4 matrix of tile values (0, 2, 4, 8...)
+    """
+    matrix = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            e = (board >> 4*(4*i+j)) & 0xF
+            row.append(1 << e if e else 0)
+        matrix.append(row)
+    return matrix
+
@@ -10,6 +10,7 @@ The Button class allows to create, draw and handle buttons
 """
 
 import pygame
+from profiler import PROFILER
 
 class Button:
     """
@@ -23,7 +24,9 @@ class Button:
         disabled: A boolean, representing if the button is disabled or not
         __value: A string that will be displayed on the button
         __font: A pygame font used to write the string displayed on the button
+        __text_surface: A pygame surface, the rendered value, None if there's nothing to write
         __over_time: An integer, representing the amount of time the mouse cursor has been over the button
+        __drawn: A tuple, representing the state (over time and disabled flag) displayed in the last frame, None if the button must be drawn again
     """
 
     def __init__(self,*, pos, width:int, height:int, onclick=None, disabled:bool=False, value:str="",  font:pygame.font.Font=None, font_size) -> None:
@@ -51,7 +54,13 @@ class Button:
         pygame.font.init()
         self.__font = pygame.font.SysFont(font,font_size)
 
+        # The value never changes, so I render it once
+        self.__text_surface = None
+        if self.__value != "" and self.__font != None:
+            self.__text_surface = self.__font.render(str(self.__value), False,(249,246,219))
+
         self.__over_time = 0
+        self.__drawn = None
     
     def is_inside(self, pos) -> bool:
         """
@@ -81,6 +90,28 @@ class Button:
         return True
 
 
+    def set_value(self, new_value:str) -> None:
+        """
+        Changes the string displayed on the button, rendering it again only if it changed
+
+        Args:
+            new_value: A string that will be displayed on the button
+        """
+        if new_value == self.__value:
+            return
+        self.__value = new_value
+        self.__text_surface = None
+        if self.__value != "" and self.__font != None:
+            PROFILER.count("text_renders")
+            self.__text_surface = self.__font.render(str(self.__value), False,(249,246,219))
+        self.__drawn = None
+
+    def get_value(self) -> str:
+        """
+        Returns the string displayed on the button
+        """
+        return self.__value
+
     def enable(self) -> None:
         """
         Enables the button
@@ -103,18 +134,54 @@ class Button:
         """
         self.__onclick()
 
-    def show(self, screen:pygame.Surface, mousepos) -> None:
+    def is_animating(self, mousepos) -> bool:
+        """
+        Checks whether the hover fade of the button is in progress
+
+        Args:
+            mousepos: A tuple of 2 integers representing the absolute position of the mouse
+
+        Returns:
+            True if the button will change in the next frames even without any input
+        """
+        if self.disabled:
+            return False
+        if self.is_inside(mousepos):
+            return self.__over_time < 16
+        return self.__over_time > 0
+
+    def invalidate(self) -> None:
         """
-        Shows the button
+        Forces the button to be drawn again in the next frame
+        """
+        self.__drawn = None
+
+    def show(self, screen:pygame.Surface, mousepos) -> list:
+        """
+        Shows the button, if it changed since the last frame
 
         Args:
             screen: The pygame surface where the button will be drawn
             mousepos: A tuple of 2 integers representing the absolute position of the mouse
+
+        Returns:
+            A list of pygame Rects, the areas of the screen that changed (empty if nothing has been drawn)
         """
         
         # I calculate the position of the top left corner of the button
         fx,fy = self.__pos[0] - self.__width//2, self.__pos[1] - self.__height//2
 
+        # If the button looks like in the last frame, I only update the hover fade
+        state = (self.__over_time, self.disabled)
+        if state == self.__drawn:
+            if not self.disabled:
+                if self.is_inside(mousepos):
+                    self.__over_time = min(16, self.__over_time+2)
+                else:
+                    self.__over_time = max(0, self.__over_time-2)
+            return []
+        self.__drawn = state
+
         if self.disabled:
             pygame.draw.rect(screen, (100,100,100), pygame.Rect((fx,fy), (self.__width, self.__height)), 0, 4)
         else:
@@ -126,10 +193,14 @@ class Button:
             else:
                 self.__over_time = max(0, self.__over_time-2)
 
-        if self.__value != "" and self.__font != None:
-            text_surface = self.__font.render(str(self.__value), False,(249,246,219))
+        PROFILER.count("rect_draws")
+
+        if self.__text_surface is not None:
+            text_surface = self.__text_surface
 
             dx = text_surface.get_rect().width//2
             dy = text_surface.get_rect().height//2
 
-            screen.blit(text_surface, (self.__pos[0]-dx, self.__pos[1]-dy))
\ No newline at end of file
+            screen.blit(text_surface, (self.__pos[0]-dx, self.__pos[1]-dy))
+
+        return [pygame.Rect((fx,fy), (self.__width, self.__height))]
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+Cache module
+
+Caches of the evaluations of boards, meant to be keyed on canonical boards (see bitboard.canonical_board),
+so the 8 symmetries of a board share their entry.
+
+EvalCache lives in a process and can be shared by its threads. It evicts the entries with the clock algorithm:
+a hand sweeps the slots, sparing (once) the entries read since its last pass.
+
+SharedEvalCache lives in a block of shared memory and can be shared by many processes. It's a set-associative table
+(the slots are grouped in buckets of BUCKET_SIZE, a key can only be stored in its bucket), the clock evicts within a bucket.
+It takes no lock, two processes may write the same slot at once. So a slot doesn't store its key but a check word,
+the key xor the bits of the value (lockless hashing, as in chess engines): a reader finds the key back
+only if the word and the value come from the same write. A slot torn by concurrent writers holds a word matching
+no key, it's a miss until it's evicted (a wrong value is returned only if the garbage matches a key, once in 2**64)
+
+    Usage example:
+
+    cache = EvalCache(1 << 20)
+    key = bitboard.canonical_board(board)
+    value = cache.get(key)
+    if value is None:
+        value = evaluate(board)
+        cache.put(key, value)
+"""
+
+import struct
+import threading
+from multiprocessing import shared_memory
+
+BUCKET_SIZE = 8
+
+# The multiplier of the hash of a key (the golden ratio in 64 bits), the high bits of the product select the bucket
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+# The values of SharedEvalCache are stored as the 64 bits of a double, so they can be xored into the check words
+_DOUBLE = struct.Struct("=d")
+_WORD = struct.Struct("=Q")
+
+
+class EvalCache:
+    """
+    A class designed to cache evaluations in a process, evicting them with the clock algorithm
+
+    Attributes:
+        capacity: An integer, the maximum number of entries
+        __index: A dictionary mapping every key to its slot
+        __keys: A list, the key of every slot
+        __values: A list, the value of every slot
+        __referenced: A bytearray, 1 for the slots read since the last pass of the hand
+        __hand: An integer, the next slot examined for eviction
+        __lock: A threading.Lock, taken by every operation
+        __hits: An integer, the number of successful reads
+        __misses: An integer, the number of failed reads
+    """
+
+    def __init__(self, capacity:int=1 << 20) -> None:
+        """
+        Inits EvalCache
+
+        Args:
+            capacity: An integer, the maximum number of entries
+        """
+        self.capacity = capacity
+        self.__index = {}
+        self.__keys = []
+        self.__values = []
+        self.__referenced = bytearray(capacity)
+        self.__hand = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def get(self, key:int):
+        """
+        Reads the value of a key
+
+        Args:
+            key: An integer, usually a canonical packed board
+
+        Returns:
+            The value, or None if the key isn't cached
+        """
+        with self.__lock:
+            slot = self.__index.get(key)
+            if slot is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__referenced[slot] = 1
+            return self.__values[slot]
+
+    def put(self, key:int, value) -> None:
+        """
+        Stores the value of a key, evicting an entry if the cache is full
+
+        Args:
+            key: An integer, usually a canonical packed board
+            value: The value
+        """
+        with self.__lock:
+            slot = self.__index.get(key)
+            if slot is not None:
+                self.__values[slot] = value
+                return
+
+            if len(self.__keys) < self.capacity:
+                slot = len(self.__keys)
+                self.__keys.append(key)
+                self.__values.append(value)
+            else:
+                # I sweep the slots, giving a second chance to the referenced ones
+                referenced = self.__referenced
+                hand = self.__hand
+                while referenced[hand]:
+                    referenced[hand] = 0
+                    hand = (hand + 1) % self.capacity
+                slot = hand
+                self.__hand = (hand + 1) % self.capacity
+                del self.__index[self.__keys[slot]]
+                self.__keys[slot] = key
+                self.__values[slot] = value
+            self.__index[key] = slot
+            self.__referenced[slot] = 0
+
+    def clear(self) -> None:
+        """
+        Removes every entry
+        """
+        with self.__lock:
+            self.__index.clear()
+            self.__keys.clear()
+            self.__values.clear()
+            self.__referenced[:] = bytes(self.capacity)
+            self.__hand = 0
+
+    def get_stats(self) -> tuple:
+        """
+        Returns the number of hits and of misses of the reads
+        """
+        return self.__hits, self.__misses
+
+
+class SharedEvalCache:
+    """
+    A class designed to cache float evaluations in shared memory, so that many processes can share them.
+    The key 0 can't be stored
+
+    Attributes:
+        name: A string, the name of the block of shared memory, used to attach the cache from another process
+        capacity: An integer, the number of slots (a multiple of BUCKET_SIZE, the buckets are a power of 2)
+        __memory: The multiprocessing.shared_memory.SharedMemory block
+        __checks: A memoryview of unsigned 64-bit integers, the key xor the value bits of every slot (0 for a void slot)
+        __values: A memoryview of unsigned 64-bit integers, the bits of the double value of every slot (0 for a void slot)
+        __referenced: A memoryview of bytes, 1 for the slots read since the last pass of the hand of their bucket
+        __hands: A memoryview of bytes, the hand of every bucket
+        __shift: An integer, the shift selecting the bucket from the hash of a key
+        __owner: A boolean, True if this process created the block (and must unlink it)
+    """
+
+    def __init__(self, capacity:int=1 << 20, name:str=None) -> None:
+        """
+        Inits SharedEvalCache, creating a new block of shared memory or attaching an existing one
+
+        Args:
+            capacity: An integer, the minimum number of slots of a new cache (ignored when attaching)
+            name: An optional string, the name of an existing cache to attach
+        """
+        if name is None:
+            buckets = 1
+            while buckets * BUCKET_SIZE < capacity:
+                buckets *= 2
+            self.__memory = shared_memory.SharedMemory(create=True, size=8 + buckets * BUCKET_SIZE * 17 + buckets)
+            self.__memory.buf[:8] = buckets.to_bytes(8, "little")
+            self.__owner = True
+        else:
+            self.__memory = _attach(name)
+            buckets = int.from_bytes(self.__memory.buf[:8], "little")
+            self.__owner = False
+
+        self.name = self.__memory.name
+        self.capacity = buckets * BUCKET_SIZE
+        self.__shift = 64 - (buckets.bit_length() - 1)
+        buffer = self.__memory.buf
+        end = 8 + 8*self.capacity
+        self.__checks = buffer[8:end].cast("Q")
+        self.__values = buffer[end:end + 8*self.capacity].cast("Q")
+        end += 8*self.capacity
+        self.__referenced = buffer[end:end + self.capacity]
+        self.__hands = buffer[end + self.capacity:end + self.capacity + buckets]
+
+    def __getstate__(self):
+        # The cache is sent to the workers of a pool by name, every process attaches the same block
+        return self.name
+
+    def __setstate__(self, name:str) -> None:
+        self.__init__(name=name)
+
+    def __bucket(self, key:int) -> int:
+        """
+        Returns the first slot of the bucket of a key
+        """
+        return (((key * _HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.__shift) * BUCKET_SIZE if self.__shift < 64 else 0
+
+    def get(self, key:int):
+        """
+        Reads the value of a key
+
+        Args:
+            key: An integer, usually a canonical packed board
+
+        Returns:
+            A float, or None if the key isn't cached
+        """
+        if not key:
+            return None
+        checks = self.__checks
+        values = self.__values
+        start = self.__bucket(key)
+        for slot in range(start, start + BUCKET_SIZE):
+            # I read the value once: the check word proves it was written together with the key
+            bits = values[slot]
+            if checks[slot] ^ bits == key:
+                self.__referenced[slot] = 1
+                return _DOUBLE.unpack(_WORD.pack(bits))[0]
+        return None
+
+    def put(self, key:int, value:float) -> None:
+        """
+        Stores the value of a key, evicting an entry of its bucket if the bucket is full
+
+        Args:
+            key: An integer, usually a canonical packed board (not 0)
+            value: A float
+        """
+        if not key:
+            return
+        checks = self.__checks
+        values = self.__values
+        start = self.__bucket(key)
+        target = None
+        for slot in range(start, start + BUCKET_SIZE):
+            # A void slot (both words 0) decodes to the key 0, which is never stored
+            stored = checks[slot] ^ values[slot]
+            if stored == key or stored == 0:
+                target = slot
+                break
+
+        if target is None:
+            # I sweep the bucket, giving a second chance to the referenced slots
+            bucket = start // BUCKET_SIZE
+            referenced = self.__referenced
+            hand = self.__hands[bucket]
+            while referenced[start + hand]:
+                referenced[start + hand] = 0
+                hand = (hand + 1) % BUCKET_SIZE
+            target = start + hand
+            self.__hands[bucket] = (hand + 1) % BUCKET_SIZE
+
+        bits = _WORD.unpack(_DOUBLE.pack(value))[0]
+        values[target] = bits
+        self.__referenced[target] = 0
+        checks[target] = key ^ bits
+
+    def close(self) -> None:
+        """
+        Detaches the cache from this process, and frees the block of shared memory if this process created it
+        """
+        self.__release()
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
+
+    def __release(self) -> None:
+        """
+        Releases the views of the block, which must be gone before the block is closed
+        """
+        for view in (self.__checks, self.__values, self.__referenced, self.__hands):
+            view.release()
+
+    def __del__(self) -> None:
+        # The block closes itself when it's collected, after the cache
+        if hasattr(self, "_SharedEvalCache__hands"):
+            self.__release()
+
+
+def _attach(name:str) -> shared_memory.SharedMemory:
+    """
+    Attaches an existing block of shared memory, without tracking it when possible:
+    only the process that created it unlinks it
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the block is tracked anyway: the processes started by multiprocessing
+        # share the tracker of their parent, so it's unlinked only when the creator is done
+        return shared_memory.SharedMemory(name=name)
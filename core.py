@@ -0,0 +1,231 @@
+"""
+Core module
+
+The GameCore class handles the logic of a 2048 game: board, moves, spawning, score and game over.
+It never imports pygame, so it can be used by headless simulations.
+The board can have any size supported by the grid module (4x4 by default)
+
+    Usage example:
+
+    core = GameCore(seed=42)
+    core.make_move("left")
+    if core.check_game_over():
+        print(core.get_score())
+"""
+
+import random
+import bitboard
+import dataset
+import grid
+import replay
+
+
+class GameCore:
+    """
+    A class designed to handle the logic of a 2048 game
+
+    Attributes:
+        __score: An integer, representing the current player's score
+        __grid: The engine of the board (see the grid module)
+        __board: The board of the grid: for the 4x4 board an integer, packed in 64 bits (see the bitboard module)
+        __spawned: A list of tuples of 2 integers, the indexes of the cells where a tile spawned during the last turn
+        __rng: A random.Random instance, used to spawn the tiles
+        __log: A bytearray, the replay log of the current game (see the replay module), None if the game isn't recorded
+        __direction: An integer, the move of the current turn, written in the replay log with the spawned tile
+        __legal: An integer, the mask of the legal moves on the current board (bit d is set if the move d is legal),
+            computed once every time the board changes
+        __recorder: A dataset.DatasetWriter (or None), every move is recorded in it as a transition
+        __first: A boolean, True until the first move of the current game
+    """
+
+    def __init__(self, seed=None, rng:random.Random=None, record:bool=False, rows:int=4, cols:int=4, recorder=None) -> None:
+        """
+        Inits GameCore and starts a new game
+
+        Args:
+            seed: An optional seed for the random generator used to spawn the tiles
+            rng: An optional random.Random instance used to spawn the tiles, it overrides seed
+            record: A boolean, if True every game is recorded in a replay log (see get_log)
+            rows: An integer, the number of rows of the board
+            cols: An integer, the number of columns of the board
+            recorder: An optional dataset.DatasetWriter, every move is recorded in it as a transition
+
+        Raises:
+            ValueError: if the size of the board isn't supported, or if a board that isn't 4x4 is recorded
+        """
+        self.__grid = grid.make_grid(rows, cols)
+        if record and (rows, cols) != (4, 4):
+            raise ValueError("only 4x4 games can be recorded in a replay log")
+        if recorder is not None and (rows, cols) != (4, 4):
+            raise ValueError("only 4x4 games can be recorded in a dataset")
+        self.__recorder = recorder
+
+        self.__rng = rng if rng is not None else random.Random(seed)
+        self.__log = bytearray() if record else None
+        self.reset()
+
+    def reset(self, seed=None) -> None:
+        """
+        Resets the board and start a new game by spawning the first 2 tiles
+
+        Args:
+            seed: An optional seed, if specified the random generator is seeded again before the new game
+        """
+        if seed is not None:
+            self.__rng.seed(seed)
+
+        self.__score = 0
+        self.__board = self.__grid.empty()
+        self.__spawned = []
+        self.__direction = 0
+        self.__first = True
+        if self.__log is not None:
+            self.__log[:] = replay.HEADER
+
+        # I generate the first two tiles of the game
+        self.__next_turn()
+        self.__next_turn()
+
+    def make_move(self, move:str) -> bool:
+        """
+        If it's legal, makes the specified move and spawns a new tile
+
+        Args:
+            move: A string, it must be "up", "down", "right" or "left"
+
+        Returns:
+            True if the move has been made, False if it wasn't legal
+        """
+        direction = bitboard.MOVE_INDEX[move]
+
+        # I check if the move is legal
+        if not self.__legal >> direction & 1:
+            return False
+
+        board = self.__board
+        self.__board, score = self.__grid.move(self.__board, direction)
+        self.__score += score
+
+        self.__spawned = []
+        self.__direction = direction
+        cell, exponent = self.__next_turn()
+
+        if self.__recorder is not None:
+            flags = (dataset.FIRST if self.__first else 0) | (dataset.LAST if not self.__legal else 0)
+            self.__recorder.record(board, direction, score, cell, exponent, flags)
+        self.__first = False
+        return True
+
+    def __next_turn(self) -> tuple:
+        """
+        Sets up the board for the next turn by spawning a tile in a random location
+
+        Returns:
+            A tuple of 2 integers: the index of the cell where the tile spawned and its exponent, (0, 0) if no tile spawned
+        """
+
+        # I create a list containing all the free cells
+        free_cells = self.__grid.empty_cells(self.__board)
+        k = exponent = 0
+
+        # I there's at least one free_cell
+        # I will pick one of them randomly and spawn a tile inside
+        if free_cells != []:
+            k = self.__rng.choice(free_cells)
+
+            # The new tile's value will be 2 five times out of six, 4 one time of six
+            exponent = 1 if self.__rng.randint(0,5) else 2
+            self.__board = self.__grid.spawn(self.__board, k, exponent)
+
+            self.__spawned.append(divmod(k, self.__grid.cols))
+            if self.__log is not None:
+                self.__log.append(replay.encode(self.__direction, k, exponent))
+
+        # The board changed, so I compute again the legal moves
+        self.__legal = self.__grid.legal_mask(self.__board)
+        return k, exponent
+
+    def is_legal_move(self, move:str) -> bool:
+        """
+        Checks whether a move is legal or not
+
+        Args:
+            move: A string, it must be "up", "down", "right" or "left"
+
+        Returns:
+            True if the move is legal, False if it isn't
+        """
+        return bool(self.__legal >> bitboard.MOVE_INDEX[move] & 1)
+
+    def legal_moves(self) -> list:
+        """
+        Returns the legal moves on the current board
+
+        Returns:
+            A list of strings ("up", "right", "down" or "left"), empty if the game is over
+        """
+        return [move for direction, move in enumerate(bitboard.MOVES) if self.__legal >> direction & 1]
+
+    def get_legal_mask(self) -> int:
+        """
+        Returns the mask of the legal moves on the current board
+
+        Returns:
+            An integer, bit d is set if the move d (bitboard.UP, RIGHT, DOWN or LEFT) is legal
+        """
+        return self.__legal
+
+    def check_game_over(self) -> bool:
+        """
+        Checks whether there is a legal move.
+        if not, the game is over
+
+        Returns:
+            True if the game is over, False if there is at least a legal move
+        """
+        return self.__legal == 0
+
+    def get_score(self) -> int:
+        """
+        Returns the current player's score
+
+        Returns:
+            The current player's score
+        """
+        return self.__score
+
+    def get_board(self):
+        """
+        Returns the current board
+
+        Returns:
+            The board of the grid (see get_grid): for the 4x4 board an integer, packed in 64 bits (see the bitboard module)
+        """
+        return self.__board
+
+    def get_grid(self):
+        """
+        Returns the engine of the board
+
+        Returns:
+            A BitboardGrid, a PackedGrid or an ArrayGrid (see the grid module)
+        """
+        return self.__grid
+
+    def get_log(self) -> bytes:
+        """
+        Returns the replay log of the current game
+
+        Returns:
+            The bytes of the log (see the replay module), None if the game isn't recorded
+        """
+        return None if self.__log is None else bytes(self.__log)
+
+    def get_spawned(self) -> list:
+        """
+        Returns the cells where a tile spawned during the last turn
+
+        Returns:
+            A list of tuples of 2 integers, the indexes of the cells
+        """
+        return self.__spawned
@@ -0,0 +1,233 @@
+"""
+Dataset module
+
+A streaming recorder of the transitions of 4x4 games (for training pipelines) and its reader.
+
+Every transition is a fixed-width record of 16 bytes, little endian:
+    board: 8 bytes, the packed board before the move (see the bitboard module)
+    reward: 4 bytes, the score gained by the move
+    move: 1 byte, the move (bitboard.UP, RIGHT, DOWN or LEFT)
+    cell: 1 byte, the index (4*i+j) of the cell where a tile spawned after the move
+    exponent: 1 byte, the exponent of the spawned tile (1 for a 2, 2 for a 4)
+    flags: 1 byte, FIRST if it's the first move of a game, LAST if the game is over after it
+
+The records are written in chunks: a directory of files named <prefix>-<sequence>.rec, each one written at once
+(atomically) when it's full, so a reader can consume the chunks while the games are still being recorded.
+A chunk starts with a 16-byte header (the magic "2REC", the format version, the compression,
+the size of a record and the number of records) followed by the records, optionally compressed with zlib.
+The uncompressed chunks are read as zero-copy NumPy views through mmap
+
+    Usage example:
+
+    writer = DatasetWriter("dataset")
+    core = GameCore(recorder=writer)
+    ...
+    writer.close()
+
+    for records in DatasetReader("dataset").iter_arrays():
+        boards, moves = records["board"], records["move"]
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b"2REC"
+VERSION = 1
+HEADER = struct.Struct("<4sHBBI4x")
+RECORD = struct.Struct("<QIBBBB")
+EXTENSION = ".rec"
+
+# The values of the compression field of the header
+NONE = 0
+ZLIB = 1
+
+# The bits of the flags of a record
+FIRST = 1
+LAST = 2
+
+# The fields of a record, as a NumPy dtype description
+FIELDS = [("board", "<u8"), ("reward", "<u4"), ("move", "u1"), ("cell", "u1"), ("exponent", "u1"), ("flags", "u1")]
+
+
+class DatasetError(ValueError):
+    """
+    Raised when a chunk is malformed
+    """
+
+
+class DatasetWriter:
+    """
+    A class designed to record transitions into a directory of chunks
+
+    Attributes:
+        path: A string, the path of the directory
+        prefix: A string, the prefix of the names of the chunks written by this writer
+        chunk_size: An integer, the number of records of a full chunk
+        compression: An integer, the zlib compression level of the chunks, 0 to store them uncompressed (and mappable)
+        __buffer: A bytearray, the records of the current chunk (it's allocated once)
+        __count: An integer, the number of records in the buffer
+        __chunks: An integer, the number of chunks written
+    """
+
+    def __init__(self, path:str, chunk_size:int=1 << 16, compression:int=0, prefix:str=None) -> None:
+        """
+        Inits DatasetWriter, creating the directory if it's missing
+
+        Args:
+            path: A string, the path of the directory
+            chunk_size: An integer, the number of records of a full chunk
+            compression: An integer, the zlib compression level of the chunks (1 to 9), 0 to store them uncompressed
+            prefix: An optional string, the prefix of the names of the chunks, unique to the process and to the time by default
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.prefix = prefix if prefix is not None else "%d-%d" % (int(time.time()), os.getpid())
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.__buffer = bytearray(chunk_size * RECORD.size)
+        self.__count = 0
+        self.__chunks = 0
+
+    def record(self, board:int, move:int, reward:int, cell:int, exponent:int, flags:int=0) -> None:
+        """
+        Appends a transition, writing the chunk if it's full
+
+        Args:
+            board: An integer, the packed board before the move
+            move: An integer, the move (bitboard.UP, RIGHT, DOWN or LEFT)
+            reward: An integer, the score gained by the move
+            cell: An integer, the index (4*i+j) of the cell where a tile spawned after the move
+            exponent: An integer, the exponent of the spawned tile
+            flags: An integer, FIRST and LAST combined
+        """
+        RECORD.pack_into(self.__buffer, self.__count * RECORD.size, board, reward, move, cell, exponent, flags)
+        self.__count += 1
+        if self.__count == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the records of the buffer as a new chunk, if there are any
+        """
+        if not self.__count:
+            return
+        data = memoryview(self.__buffer)[:self.__count * RECORD.size]
+        if self.compression:
+            data = zlib.compress(data, self.compression)
+
+        name = os.path.join(self.path, "%s-%06d%s" % (self.prefix, self.__chunks, EXTENSION))
+        temporary = name + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, ZLIB if self.compression else NONE, RECORD.size, self.__count))
+            f.write(data)
+        os.replace(temporary, name)
+        self.__count = 0
+        self.__chunks += 1
+
+    def close(self) -> None:
+        """
+        Writes the last records
+        """
+        self.flush()
+
+
+class DatasetReader:
+    """
+    A class designed to read the chunks of a directory
+
+    Attributes:
+        path: A string, the path of the directory
+    """
+
+    def __init__(self, path:str) -> None:
+        """
+        Inits DatasetReader
+
+        Args:
+            path: A string, the path of the directory
+        """
+        self.path = path
+
+    def get_chunks(self) -> list:
+        """
+        Lists the chunks written so far, sorted by name
+
+        Returns:
+            A list of strings, the paths of the chunks
+        """
+        return [os.path.join(self.path, name) for name in sorted(os.listdir(self.path)) if name.endswith(EXTENSION)]
+
+    def count(self) -> int:
+        """
+        Returns the number of records written so far, reading only the headers of the chunks
+        """
+        total = 0
+        for path in self.get_chunks():
+            with open(path, "rb") as f:
+                total += _parse_header(f.read(HEADER.size))[1]
+        return total
+
+    def iter_chunks(self):
+        """
+        Reads the chunks one after the other
+
+        Yields:
+            A buffer (a memoryview of a mapped file or the decompressed bytes) with the records of every chunk
+        """
+        for path in self.get_chunks():
+            with open(path, "rb") as f:
+                compression, count = _parse_header(f.read(HEADER.size))
+                if compression == ZLIB:
+                    data = zlib.decompress(f.read())
+                elif count:
+                    data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))[HEADER.size:]
+                else:
+                    data = b""
+            if len(data) != count * RECORD.size:
+                raise DatasetError("truncated chunk: " + path)
+            yield data
+
+    def __iter__(self):
+        """
+        Reads the records one after the other, without NumPy
+
+        Yields:
+            A tuple (board, reward, move, cell, exponent, flags) for every record
+        """
+        for data in self.iter_chunks():
+            yield from RECORD.iter_unpack(data)
+
+    def iter_arrays(self):
+        """
+        Reads the chunks as NumPy structured arrays, with the fields of FIELDS.
+        The arrays of the uncompressed chunks are read-only views of the mapped files, nothing is copied
+
+        Yields:
+            A (N,) structured array for every chunk
+        """
+        import numpy as np
+        dtype = np.dtype(FIELDS)
+        for data in self.iter_chunks():
+            yield np.frombuffer(data, dtype=dtype)
+
+
+def _parse_header(header:bytes) -> tuple:
+    """
+    Checks the header of a chunk
+
+    Returns:
+        A tuple of 2 integers: the compression and the number of records
+
+    Raises:
+        DatasetError: if the header is malformed, or the format version or the size of a record doesn't match
+    """
+    try:
+        magic, version, compression, size, count = HEADER.unpack(header)
+    except struct.error:
+        raise DatasetError("truncated header")
+    if magic != MAGIC or version != VERSION or size != RECORD.size or compression not in (NONE, ZLIB):
+        raise DatasetError("not a chunk of this format version")
+    return compression, count
@@ -1,7 +1,9 @@
 """ 
 Game module
 
-The Game class allows to handle and render a 2048 game 
+The Game class allows to handle and render a 2048 game.
+The logic of the game is handled by a GameCore (see the core module), Game only renders it.
+The board can have any size supported by the grid module (4x4 by default)
 
     Usage example:
 
@@ -9,8 +11,48 @@ The Game class allows to handle and render a 2048 game
     game.show(surface)
 """
 
-import random
+from collections import deque
 import pygame
+import bitboard
+from core import GameCore
+from tile_cache import TileCache
+from profiler import PROFILER
+
+# The length (in milliseconds) of the animations: the tiles slide, then the new and the merged tiles pop up.
+# The game over veil fades in while the tiles slide
+SLIDE_TIME = 100
+SPAWN_TIME = 100
+GAME_OVER_TIME = 850
+
+# The size of the popping tiles is rounded to this number of pixels, so that only a few sizes are rendered
+SPAWN_SIZE_STEP = 4
+
+# The maximum number of moves waiting in the input queue, the moves issued when it's full are dropped
+MAX_QUEUED_MOVES = 8
+
+
+class CellAnimation:
+    """
+    A class designed to hold the animation state of a single cell of the board.
+    Game keeps one for every cell and reuses them move after move
+
+    Attributes:
+        moving: A boolean, representing if the tile that was in the cell before the last move is sliding
+        destination: An integer, the index (cols*i+j) of the cell where the sliding tile stops
+        value: An integer, the value of the sliding tile
+        spawning: A boolean, representing if the tile in the cell after the last move pops up (spawned or merged)
+    """
+
+    __slots__ = ("moving", "destination", "value", "spawning")
+
+    def __init__(self) -> None:
+        """
+        Inits CellAnimation, with no animation in progress
+        """
+        self.moving = False
+        self.destination = 0
+        self.value = 0
+        self.spawning = False
 
 
 class Game:
@@ -22,17 +64,26 @@ class Game:
         __cell_size: An integer, representing the size of a single cell of the board
         __margin: An integer, represeting the margin between two cells
         __fonts: A list of pygame fonts, the font must be chosen according to the number of digits (using it as index)
-        __score: An integer, representing the current player's score
-        __board: A 4x4 matrix, representing the 2048 game
-        __animating: An integer, representing how many frames are left in the current animation
-        __animating_time: An integer, representing the length in frame of an animation
-        __animating_info: A list of tuples of 3 elements: a tuple of 2 integers representing the starting position, a tuple of 2 integers representing the destination of the animation and an integer representing the value of the animated cell
-        __spawning: a list of tuples of 3 integers: the 2 indexes of the cell that is "spawning" and the current spawning frame that needs to be displayed
-        __spawning_time: An integer, representing the length in frame of a spawning animation
-        __time_since_game_over: An integers, representing the number of frames displayed since the game ended
+        __tiles: A TileCache, holding the pre-rendered tiles
+        __background: A pygame surface, the pre-rendered void board (None until the first frame)
+        __overlay: A tuple of 2 pygame surfaces, the pre-rendered game over veil and text (None until the game is first over)
+        __core: A GameCore, handling the logic of the game
+        __animations: A boolean, representing if the animations are enabled (if not, the board is always drawn at rest)
+        __clock: A function with no arguments returning the current time in milliseconds, it drives the animations
+        __cells: A list of CellAnimation, the animation state of every cell, indexed by cols*i+j
+        __centers: A list of tuples of 2 integers, the absolute position (in pixel) of the center of every cell, indexed by cols*i+j
+        __lines: A dictionary, mapping every move to the lines of the board (see the grid module) as lists of indexes of cells
+        __exponents: A list of integers, reused to unpack the exponents of a board, indexed by cols*i+j
+        __slide_start: An integer, the time (in milliseconds) when the tiles started sliding, None if no move has been made
+        __spawning: A boolean, representing if at least a tile pops up after the last move
+        __spawn_start: An integer, the time (in milliseconds) when the spawning tiles start popping up
+        __game_over_start: An integer, the time (in milliseconds) when the game ended, None if the game isn't over
+        __queue: A deque of strings, the moves waiting to be made, in order
+        __collapse: A boolean, if True the queued moves are made as soon as possible, cutting short the sliding tiles
+        __dirty: A boolean, representing if the board needs to be drawn again even if no animation is in progress
     """
 
-    def __init__(self, position:tuple, cell_size:int, margin:int, font:str, max_font_size:int) -> None:
+    def __init__(self, position:tuple, cell_size:int, margin:int, font:str, max_font_size:int, seed=None, rng=None, record:bool=False, rows:int=4, cols:int=4, animations:bool=True, clock=None, collapse:bool=True, recorder=None) -> None:
         """
         Inits Game
 
@@ -42,6 +93,17 @@ class Game:
             margin: An integer, represeting the margin between two cells
             font: A string representing a valid pygame font
             max_font_size: An integer, representing the size of the biggest font possible
+            seed: An optional seed for the random generator used to spawn the tiles
+            rng: An optional random.Random instance used to spawn the tiles (it can be shared with other games), it overrides seed
+            record: A boolean, if True every game is recorded in a replay log (see GameCore.get_log)
+            rows: An integer, the number of rows of the board
+            cols: An integer, the number of columns of the board
+            animations: A boolean, if False the tiles don't slide nor pop up (for a fast playback)
+            clock: An optional function with no arguments returning the current time in milliseconds,
+                pygame.time.get_ticks by default
+            collapse: A boolean, if True the queued moves are made as soon as possible, cutting short the sliding tiles,
+                if False every queued move waits until the tiles of the previous one stop sliding
+            recorder: An optional dataset.DatasetWriter, every move is recorded in it as a transition (see GameCore)
         """
         self.__pos = position
         self.__cell_size = cell_size
@@ -54,28 +116,59 @@ class Game:
             font_size = max_font_size - int((i/6 * max_font_size)/1.15)
             self.__fonts.append(pygame.font.SysFont(font,font_size))
 
-        self.reset()
+        # The tiles, the void board and the game over overlay are rendered once and reused
+        self.__tiles = TileCache(self.__fonts)
+        self.__background = None
+        self.__overlay = None
 
-    def reset(self) -> None:
+        self.__animations = animations
+        self.__clock = clock if clock is not None else pygame.time.get_ticks
+        self.__queue = deque()
+        self.__collapse = collapse
+
+        self.__core = GameCore(seed=seed, rng=rng, record=record, rows=rows, cols=cols, recorder=recorder)
+
+        # The animation state and the position of every cell are allocated once
+        self.__cells = [CellAnimation() for _ in range(rows*cols)]
+        self.__centers = [self.__cell_center(i,j) for i in range(rows) for j in range(cols)]
+        self.__lines = {direction: [[cols*i+j for i,j in line] for line in lines]
+                        for direction, lines in self.__core.get_grid().lines.items()}
+        self.__exponents = [0]*(rows*cols)
+        self.__reset_animations()
+
+    def reset(self, seed=None) -> None:
         """
         Resets the board and start a new game by spawning the first 2 tiles
-        """
-        self.__score = 0
 
-        self.__board = [[0 for _ in range(4)] for _ in range(4)]
-
-        self.__animating = 0
-        self.__animation_time = 6
-        self.__animation_info = []
+        Args:
+            seed: An optional seed, if specified the random generator is seeded again before the new game
+        """
+        self.__core.reset(seed)
+        self.__queue.clear()
+        self.__reset_animations()
 
-        self.__spawning = []
-        self.__spawning_time = 6
+    def __reset_animations(self) -> None:
+        """
+        Resets all the animations, making the tiles of a new game spawn
+        """
+        self.__slide_start = None
+        self.__game_over_start = None
+        self.__dirty = True
+        for cell in self.__cells:
+            cell.moving = cell.spawning = False
 
-        self.__time_since_game_over = 0
+        # The first two tiles of the game are spawning
+        self.__set_spawned()
+        self.__spawn_start = self.__clock()
 
-        # I generate the first two tiles of the game
-        self.__next_turn()
-        self.__next_turn()
+    def __set_spawned(self) -> None:
+        """
+        Makes the tiles spawned during the last turn pop up
+        """
+        cols = self.__core.get_grid().cols
+        for i,j in self.__core.get_spawned():
+            self.__cells[cols*i+j].spawning = True
+        self.__spawning = True
 
 
     def make_move(self, move:str) -> None:
@@ -85,177 +178,94 @@ class Game:
         Args:
             move: A string, it must be "up", "down", "right" or "left"
         """
+        # The time spent making the move is charged to the game logic, even when the move comes from an event
+        section = PROFILER.switch("logic")
+        self.__make_move(move)
+        PROFILER.switch(section)
+
+    def queue_move(self, move:str) -> bool:
+        """
+        Adds a move to the input queue, it will be made by update
+
+        Args:
+            move: A string, it must be "up", "down", "right" or "left"
+
+        Returns:
+            True if the move has been queued, False if the queue is full and the move has been dropped
+        """
+        if len(self.__queue) >= MAX_QUEUED_MOVES:
+            return False
+        self.__queue.append(move)
+        return True
+
+    def update(self) -> None:
+        """
+        Makes the queued moves, in order. If the queue collapses the animations, every queued move is made now
+        and only the last one is animated, otherwise a move is made only when the tiles of the previous one stop sliding
+        """
+        while self.__queue and (self.__collapse or not self.__is_sliding(self.__clock())):
+            self.make_move(self.__queue.popleft())
+
+    def __make_move(self, move:str) -> None:
+        """
+        If it's legal, makes the specified move and computes its animations
+        """
+        old_board = self.__core.get_board()
+        grid = self.__core.get_grid()
 
-        # I check if the move is legal
-        if not self.is_legal_move(move):
+        # I make the move, if it isn't legal nothing changes
+        if not self.__core.make_move(move):
             return
+        PROFILER.count("moves")
         
-        # I reset all the animations
-        self.__spawning = []
-        self.__animation_info = []
-        self.__animating = self.__animation_time
-
-        if move == "up":
-            for j in range(4):
-                last_valid = 0
-                for i in range(4):
-                    # I check if the current cell is not void
-                    if self.__board[i][j] != 0:
-                        # I check if the current tile can be moved 
-                        if i != last_valid:
-                            if self.__board[last_valid][j] == 0:
-                                # The current tile will move in a void cell
-                                self.__animation_info.append(((i,j),(last_valid,j), self.__board[i][j]))
-                                self.__board[last_valid][j] = self.__board[i][j]
-                                self.__board[i][j] = 0
-                                
-                            elif self.__board[last_valid][j] == self.__board[i][j]:
-                                # The current tile will merge with another one with the same value
-                                self.__animation_info.append(((i,j),(last_valid,j), self.__board[i][j]))
-                                self.__spawning.append((last_valid,j,0))
-                                self.__board[last_valid][j] *= 2
-                                self.__score += self.__board[last_valid][j]
-                                
-                                last_valid +=1
-                                self.__board[i][j] = 0
-                            else:
-                                # The current tile will move (or will stand still) to the furthest valid cell
-                                last_valid +=1
-                                self.__animation_info.append(((i,j),(last_valid,j), self.__board[i][j]))
-                                
-                                self.__board[last_valid][j], self.__board[i][j] = self.__board[i][j], self.__board[last_valid][j]
-
-                        else:
-                            # In the animation the current tile won't move
-                            self.__animation_info.append(((i,j),(i,j), self.__board[i][j]))
-
-        elif move == "right":
-            for i in range(4):
-                last_valid = 0
-                for j in range(4):
-                    # I check if the current cell is not void
-                    if self.__board[i][3-j] != 0:
-                        # I check if the current tile can be moved 
-                        if j != last_valid:
-                            if self.__board[i][3-last_valid] == 0:
-                                # The current tile will move in a void cell
-                                self.__animation_info.append(((i,3-j),(i,3-last_valid), self.__board[i][3-j]))
-                                self.__board[i][3-last_valid] = self.__board[i][3-j]
-                                self.__board[i][3-j] = 0
-                                
-                            elif self.__board[i][3-last_valid] == self.__board[i][3-j]:
-                                # The current tile will merge with another one with the same value
-                                self.__animation_info.append(((i,3-j),(i,3-last_valid), self.__board[i][3-j]))
-                                self.__spawning.append((i,3-last_valid,0))
-                                self.__board[i][3-last_valid] *= 2
-                                self.__score += self.__board[i][3-last_valid] 
-                                
-                                last_valid +=1
-                                self.__board[i][3-j] = 0
-                            else:
-                                # The current tile will move (or will stand still) to the furthest valid cell
-                                last_valid +=1
-                                self.__animation_info.append(((i,3-j),(i,3-last_valid), self.__board[i][3-j]))
-                                self.__board[i][3-last_valid], self.__board[i][3-j] = self.__board[i][3-j], self.__board[i][3-last_valid]
-
-                        else:
-                            # In the animation the current tile won't move
-                            self.__animation_info.append(((i,3-j),(i,3-j), self.__board[i][3-j]))
-
-        elif move == "down":
-            for j in range(4):
-                last_valid = 0
-                for i in range(4):
-                    # I check if the current cell is not void
-                    if self.__board[3-i][j] != 0:
-                        # I check if the current tile can be moved 
-                        if i != last_valid:
-                            if self.__board[3-last_valid][j] == 0:
-                                # The current tile will move in a void cell
-                                self.__board[3-last_valid][j] = self.__board[3-i][j]
-                                self.__animation_info.append(((3-i,j),(3-last_valid,j), self.__board[3-i][j]))
-                                self.__board[3-i][j] = 0
-                                
-                            elif self.__board[3-last_valid][j] == self.__board[3-i][j]:
-                                # The current tile will merge with another one with the same value
-                                self.__animation_info.append(((3-i,j),(3-last_valid,j), self.__board[3-i][j]))
-                                self.__spawning.append((3-last_valid,j,0))
-                                self.__board[3-last_valid][j] *= 2
-                                self.__score += self.__board[3-last_valid][j] 
-                                
-                                last_valid +=1
-                                self.__board[3-i][j] = 0
-                            else:
-                                # The current tile will move (or will stand still) to the furthest valid cell
-                                last_valid +=1
-                                self.__animation_info.append(((3-i,j),(3-last_valid,j), self.__board[3-i][j]))
-                                self.__board[3-last_valid][j], self.__board[3-i][j] = self.__board[3-i][j], self.__board[3-last_valid][j]
-                        
-                        else:
-                            # In the animation the current tile won't move
-                            self.__animation_info.append(((3-i,j),(3-i,j), self.__board[3-i][j]))
-                    
-        elif move == "left":
-            for i in range(4):
-                last_valid = 0
-                for j in range(4):
-                    # I check if the current cell is not void
-                    if self.__board[i][j] != 0:
-                        # I check if the current tile can be moved 
-                        if j != last_valid:
-                            if self.__board[i][last_valid] == 0:
-                                # The current tile will move in a void cell
-                                self.__animation_info.append(((i,j),(i,last_valid), self.__board[i][j]))
-                                self.__board[i][last_valid] = self.__board[i][j]
-                                self.__board[i][j] = 0
-                                
-                            elif self.__board[i][last_valid] == self.__board[i][j]:
-                                # The current tile will merge with another one with the same value
-                                self.__animation_info.append(((i,j),(i,last_valid), self.__board[i][j]))
-                                self.__spawning.append((i,last_valid,0))
-                                self.__board[i][last_valid] *= 2
-                                self.__score += self.__board[i][last_valid]
-                                
-                                last_valid +=1
-                                self.__board[i][j] = 0
-                            else:
-                                # The current tile will move (or will stand still) to the furthest valid cell
-                                last_valid +=1
-                                self.__animation_info.append(((i,j),(i,last_valid), self.__board[i][j]))
-                                self.__board[i][last_valid], self.__board[i][j] = self.__board[i][j], self.__board[i][last_valid]
-
-                        else:
-                            # In the animation the current tile won't move
-                            self.__animation_info.append(((i,j),(i,j), self.__board[i][j]))
-
-
-        self.__next_turn()
-
-    def __next_turn(self) -> None:
-        """
-        Sets up the board for the next turn by spawning a tile in a random location
-        """
-
-        # I create a list containing all the free cells
-        free_cells = []
-        for i in range(4):
-            for j in range(4):
-                if self.__board[i][j] == 0:
-                    free_cells.append((i,j))
-
-        # I there's at least one free_cell
-        # I will pick one of them randomly and spawn a tile inside
-        if free_cells != []:
-            i,j = random.choice(free_cells)
-
-            # The new tile's value will be 2 five times out of six, 4 one time of six
-            if random.randint(0,5):
-                self.__board[i][j] = 2
-            else:
-                self.__board[i][j] = 4
-
-            self.__spawning.append((i,j,0))
-            
+        # I reset all the animations: the tiles start sliding now and they pop up when they stop
+        now = self.__clock()
+        cells = self.__cells
+        for cell in cells:
+            cell.moving = cell.spawning = False
+        self.__spawning = False
+        # Without animations nothing slides: a stale start would make show() draw the (empty) sliding tiles
+        # if the animations were enabled right after this move
+        self.__slide_start = now if self.__animations else None
+        self.__spawn_start = now + SLIDE_TIME
+        self.__dirty = True
+
+        if self.__core.check_game_over():
+            self.__game_over_start = now
+
+        if not self.__animations:
+            return
+
+        # I compute the animation of every tile, line by line, following the rules of bitboard.slide_line
+        # on the cells of the old board, so that nothing is allocated
+        exponents = self.__exponents
+        grid.unpack(old_board, exponents)
+        max_exponent = grid.MAX_EXPONENT
+        for line in self.__lines[bitboard.MOVE_INDEX[move]]:
+            dst = -1
+            last = 0
+            can_merge = False
+            for k in line:
+                e = exponents[k]
+                if e == 0:
+                    continue
+                cell = cells[k]
+                cell.moving = True
+                cell.value = 1 << e
+                if can_merge and e == last and e != max_exponent:
+                    # The current tile merges with another one with the same value
+                    cell.destination = line[dst]
+                    cells[line[dst]].spawning = True
+                    self.__spawning = True
+                    can_merge = False
+                else:
+                    dst += 1
+                    cell.destination = line[dst]
+                    last = e
+                    can_merge = True
+
+        # The new tile spawned at the end of the turn
+        self.__set_spawned()
 
     def is_legal_move(self, move:str) -> bool:
         """
@@ -267,76 +277,16 @@ class Game:
         Returns:
             True if the move is legal, False if it isn't
         """
-        if move == "up":
-            for j in range(4):
-                i = 0
-                gap = False
-                while i < 4:
-                    # I checks if the current cell is void
-                    # If the current cell is not void and the previous one is void, the move is legal
-                    if self.__board[i][j] == 0:
-                        gap = True
-                    elif gap:
-                        return True
-                    # If two tiles can be merge, the move is legal
-                    if i < 3 and self.__board[i][j] != 0:
-                        if self.__board[i][j] == self.__board[i+1][j]:
-                            return True
-                    i+=1
-
-        elif move == "right":
-            for j in range(4):
-                i = 0
-                gap = False
-                while i < 4:
-                    # I checks if the current cell is void
-                    # If the current cell is not void and the previous one is void, the move is legal
-                    if self.__board[j][3-i] == 0:
-                        gap = True
-                    elif gap:
-                        return True
-                    # If two tiles can be merge, the move is legal
-                    if i < 3 and self.__board[j][3-i] != 0:
-                        if self.__board[j][3-i] == self.__board[j][3-(i+1)]:
-                            return True
-                    i+=1
-
-        elif move == "down":
-            for j in range(4):
-                i = 0
-                gap = False
-                while i < 4:
-                    # I checks if the current cell is void
-                    # If the current cell is not void and the previous one is void, the move is legal
-                    if self.__board[3-i][j] == 0:
-                        gap = True
-                    elif gap:
-                        return True
-                    # If two tiles can be merge, the move is legal
-                    if i < 3 and self.__board[3-i][j] != 0:
-                        if self.__board[3-i][j] == self.__board[3-(i+1)][j]:
-                            return True
-                    i+=1
-            
-        elif move == "left":
-            for j in range(4):
-                i = 0
-                gap = False
-                while i < 4:
-                    # I checks if the current cell is void
-                    # If the current cell is not void and the previous one is void, the move is legal
-                    if self.__board[j][i] == 0:
-                        gap = True
-                    elif gap:
-                        return True
-                    # If two tiles can be merge, the move is legal
-                    if i < 3 and self.__board[j][i] != 0:
-                        if self.__board[j][i] == self.__board[j][i+1]:
-                            return True
-                    i+=1
-            
-
-        return False
+        return self.__core.is_legal_move(move)
+
+    def legal_moves(self) -> list:
+        """
+        Returns the legal moves on the current board
+
+        Returns:
+            A list of strings ("up", "right", "down" or "left"), empty if the game is over
+        """
+        return self.__core.legal_moves()
 
     def check_game_over(self) -> bool:
         """
@@ -346,15 +296,7 @@ class Game:
         Returns:
             True if the game is over, False if there is at least a legal move
         """
-        if self.is_legal_move("up"):
-            return False
-        if self.is_legal_move("right"):
-            return False
-        if self.is_legal_move("down"):
-            return False
-        if self.is_legal_move("left"):
-            return False
-        return True
+        return self.__core.check_game_over()
 
     def get_score(self) -> int:
         """
@@ -363,154 +305,213 @@ class Game:
         Returns:
             The current player's score
         """
-        return self.__score
+        return self.__core.get_score()
 
-    def show(self, screen) -> None:
+    def get_core(self) -> GameCore:
         """
-        Shows the board
+        Returns the GameCore handling the logic of the game
+
+        Returns:
+            The GameCore of the game
+        """
+        return self.__core
+
+    def is_animating(self) -> bool:
+        """
+        Checks whether an animation (moving tiles, spawning tiles or game over fade) is in progress
+
+        Returns:
+            True if the board will change in the next frames even without any input
+        """
+        if self.__queue:
+            return True
+        if not self.__animations:
+            return False
+        now = self.__clock()
+        if self.__spawning and now < self.__spawn_start + SPAWN_TIME:
+            return True
+        if self.__is_sliding(now):
+            return True
+        return self.__game_over_start is not None and now < self.__game_over_start + GAME_OVER_TIME
+
+    def __is_sliding(self, now:int) -> bool:
+        """
+        Checks whether the tiles of the last move are still sliding
 
         Args:
-            screen: The pygame surface where the board will be drawn
+            now: An integer, the current time in milliseconds
+        """
+        return self.__animations and self.__slide_start is not None and now < self.__slide_start + SLIDE_TIME
+
+    def set_animations(self, animations:bool) -> None:
         """
+        Enables or disables the animations
 
-        # The color of the tile depends depends on its value
-        color = {
-            0: (205,193,180),
-            2: (238,228,218),
-            4: (238,225,201),
-            8: (243,178,122),
-            16: (246,150,100),
-            32: (247,124,95),
-            64: (247,95,59),
-            128: (237,208,115),
-            256: (237,204,98),
-            512: (237,200,80),
-            1024: (237,197,63),
-            2048: (237,194,46),
-            4096: (60,58,50),
-            8192: (60,58,50),
-            16384: (60,58,50),
-            32768: (60,58,50),
-            65536: (60,58,50),
-            131072: (60,58,50)
-        }
-        pygame.draw.rect(screen, (187,173,160), pygame.Rect(self.__pos, [self.__margin*5 + self.__cell_size*4]*2),0,5)
-
-        if not self.__animating:
-            for i in range(4):
-                for j in range(4):
-                    if self.__board[i][j] != 0:
-
-                        # I check whether the current tile is spawning
-                        is_spawning = False
-                        for e in self.__spawning:
-                            ti,tj,tt = e
-                            if (ti,tj) == (i,j):
-                                is_spawning = True
-                                break
-                        
-                        if not is_spawning:
-                            pygame.draw.rect(screen, color[self.__board[i][j]], pygame.Rect((self.__pos[0]+self.__margin*(j+1)+self.__cell_size*j, self.__pos[1]+self.__margin*(i+1)+self.__cell_size*i),[self.__cell_size]*2),0,3)
-                        else:
-                            # I calculate the actual size of the tile according to the spawning animation phase
-                            ds = 0.4/self.__spawning_time * tt
-                            actual_cell_size = (ds+0.7)*self.__cell_size
-                            actual_cell_size = int(actual_cell_size)
-
-                            # I calculate the real adjusted position of the cell and draws it
-                            delta = (actual_cell_size-self.__cell_size)//2
-                            pygame.draw.rect(screen, color[self.__board[i][j]], pygame.Rect((self.__pos[0]+self.__margin*(j+1)+self.__cell_size*j -delta, self.__pos[1]+self.__margin*(i+1)+self.__cell_size*i - delta),[actual_cell_size]*2),0,3)
-
-                            # I checks if the spawning animation is over
-                            # if it isn't, I increment the current frame of the animation
-                            if tt == self.__spawning_time:
-                                self.__spawning.remove((i,j,tt))
-                            else:
-                                self.__spawning[self.__spawning.index((i,j,tt))] = (i,j,tt+1)
-                                
-                        text_color = (119,110,101)
-                        if self.__board[i][j] > 4:
-                            text_color = (249,246,242)
-                        
-                        # I calculate the position of the text of the tile
-                        cx,cy=(self.__pos[0]+self.__margin*(j+1)+self.__cell_size*j, self.__pos[1]+self.__margin*(i+1)+self.__cell_size*i)
-                        cx += self.__cell_size//2
-                        cy += self.__cell_size//2
-
-                        text_surface = self.__fonts[len(str(self.__board[i][j]))-1].render(str(self.__board[i][j]),False,text_color)
-
-                        r = text_surface.get_rect()
-
-                        dx = r.width//2
-                        dy = r.height//2
-
-                        screen.blit(text_surface, (cx-dx,cy-dy))
+        Args:
+            animations: A boolean, if False the tiles don't slide nor pop up (for a fast playback)
+        """
+        # I drop the animations in progress, so that the board is drawn at rest until the next move
+        if animations != self.__animations:
+            self.__slide_start = None
+            self.__spawning = False
+            for cell in self.__cells:
+                cell.moving = cell.spawning = False
+        self.__animations = animations
+        self.__dirty = True
+
+    def invalidate(self) -> None:
+        """
+        Forces the board to be drawn again in the next frame
+        """
+        self.__dirty = True
+
+    def show(self, screen) -> list:
+        """
+        Shows the board, if it changed since the last frame
+
+        Args:
+            screen: The pygame surface where the board will be drawn
+
+        Returns:
+            A list of pygame Rects, the areas of the screen that changed (empty if nothing has been drawn)
+        """
+        if not self.__dirty and not self.is_animating():
+            return []
+
+        # The last frame of an animation is always followed by a frame showing the board at rest
+        self.__dirty = self.is_animating()
+
+        # The void board never changes, so it's rendered only once
+        if self.__background is None:
+            self.__background = self.__render_background()
+        screen.blit(self.__background, self.__pos)
+
+        # I unpack the exponent of every tile, in row-major order, into the same list every frame
+        exponents = self.__exponents
+        self.__core.get_grid().unpack(self.__core.get_board(), exponents)
+
+        # The animations are driven by the time elapsed since they started, whatever the frame rate is
+        now = self.__clock()
+        if not self.__is_sliding(now):
+            popping = self.__animations and self.__spawning and now < self.__spawn_start + SPAWN_TIME
+            if popping:
+                # I calculate the actual size of the popping tiles according to the spawning animation phase:
+                # they grow from 70% to 110% of the cell, then they're drawn at rest
+                progress = max(0, now - self.__spawn_start) / SPAWN_TIME
+                popping_size = int((0.7 + 0.4*progress)*self.__cell_size)
+                popping_size -= popping_size % SPAWN_SIZE_STEP
+
+            for k, e in enumerate(exponents):
+                if e != 0:
+                    if popping and self.__cells[k].spawning:
+                        self.__blit_tile(screen, 1 << e, popping_size, self.__centers[k])
                     else:
-                        pygame.draw.rect(screen, color[0], pygame.Rect((self.__pos[0]+self.__margin*(j+1)+self.__cell_size*j, self.__pos[1]+self.__margin*(i+1)+self.__cell_size*i),[self.__cell_size]*2),0,3)
+                        self.__blit_tile(screen, 1 << e, self.__cell_size, self.__centers[k])
 
         else:
-            # I draw the void board
-            for i in range(4):
-                for j in range(4):
-                    pygame.draw.rect(screen, color[0], pygame.Rect((self.__pos[0]+self.__margin*(j+1)+self.__cell_size*j, self.__pos[1]+self.__margin*(i+1)+self.__cell_size*i),[self.__cell_size]*2),0,3)
-            
-            for info in self.__animation_info:                
-                p1,p2,v = info
-                i1,j1 = p1
-                i2,j2 = p2
-                
-                # I calculate the positions of the starting cell and of the destination cell of the current animated tile
-                cx1,cy1 = self.__margin*(j1+1) + self.__cell_size*j1, self.__margin*(i1+1) + self.__cell_size*i1
-                cx2,cy2 = self.__margin*(j2+1) + self.__cell_size*j2, self.__margin*(i2+1) + self.__cell_size*i2
-
-                # I calculate the position variation
-                dx,dy = cx1-cx2, cy1-cy2
-
-                # I calculate the actual position, according to the animation phase
-                ax,ay = self.__pos
-                ax+=cx2
-                ay+=cy2
-                ax+=int(dx*(self.__animating/self.__animation_time))
-                ay+=int(dy*(self.__animating/self.__animation_time))
-
-                pygame.draw.rect(screen, color[v], pygame.Rect((ax,ay),[self.__cell_size]*2),0,3)
-
-                # I calculate the position of the text of the tile
-                ax += self.__cell_size//2
-                ay += self.__cell_size//2
-
-                text_color = (119,110,101)
-                if v > 4:
-                    text_color = (249,246,242)
-
-                text_surface = self.__fonts[len(str(v))-1].render(str(v),False,text_color)
-
-                r = text_surface.get_rect()
-
-                dx = r.width//2
-                dy = r.height//2
-
-                screen.blit(text_surface, (ax-dx,ay-dy))
-                
-            self.__animating -=1
+            progress = (now - self.__slide_start) / SLIDE_TIME
+            for k, cell in enumerate(self.__cells):
+                if cell.moving:
+                    # I interpolate the actual position between the starting cell and the destination cell
+                    cx1,cy1 = self.__centers[k]
+                    cx2,cy2 = self.__centers[cell.destination]
+                    ax = cx1 + int((cx2-cx1)*progress)
+                    ay = cy1 + int((cy2-cy1)*progress)
+
+                    self.__blit_tile(screen, cell.value, self.__cell_size, (ax,ay))
 
         # I checks if the game is over
-        if self.check_game_over():
+        if self.__game_over_start is not None:
             # the board will slowly fade away
-            image = pygame.Surface([self.__margin*5 + self.__cell_size*4]*2, pygame.SRCALPHA,32)
-            pygame.draw.rect(image, (187,173,160),pygame.Rect((0,0), [self.__margin*5 + self.__cell_size*4]*2),0,5)
-            image = image.convert_alpha()
-            image.set_alpha(min(self.__time_since_game_over,200))
+            if self.__overlay is None:
+                self.__overlay = self.__render_overlay()
+            image, text_surface = self.__overlay
+            fade = 255
+            if self.__animations:
+                fade = min(255, 255 * (now - self.__game_over_start) // GAME_OVER_TIME)
+            image.set_alpha(min(fade,200))
             screen.blit(image,self.__pos)
 
             # I display the text "Game Over!"
-            text_surface = self.__fonts[0].render(str("Game over!"), False,(119,111,102))
-            text_surface = text_surface.convert_alpha()
-            text_surface.set_alpha(min(255,self.__time_since_game_over))
+            text_surface.set_alpha(fade)
             dx = text_surface.get_rect().width//2
             dy = text_surface.get_rect().height//2
 
-            screen.blit(text_surface, (self.__pos[0] + (self.__cell_size*2+ 5/2*self.__margin) -dx, self.__pos[1]+(self.__cell_size*2+ 5/2*self.__margin)-dy))
+            board_width, board_height = self.get_size()
+            screen.blit(text_surface, (self.__pos[0] + board_width/2 -dx, self.__pos[1] + board_height/2 -dy))
 
-            if self.__time_since_game_over < 255:
-                self.__time_since_game_over += 5
\ No newline at end of file
+        return [pygame.Rect(self.__pos, self.get_size())]
+
+    def get_size(self) -> tuple:
+        """
+        Returns the size of the board
+
+        Returns:
+            A tuple of 2 integers, the width and the height (in pixel) of the board
+        """
+        grid = self.__core.get_grid()
+        return (self.__margin*(grid.cols+1) + self.__cell_size*grid.cols,
+                self.__margin*(grid.rows+1) + self.__cell_size*grid.rows)
+
+    def __cell_center(self, i:int, j:int) -> tuple:
+        """
+        Returns the absolute position (in pixel) of the center of a cell
+
+        Args:
+            i: An integer, the row of the cell
+            j: An integer, the column of the cell
+
+        Returns:
+            A tuple of 2 integers
+        """
+        return (self.__pos[0] + self.__margin*(j+1) + self.__cell_size*j + self.__cell_size//2,
+                self.__pos[1] + self.__margin*(i+1) + self.__cell_size*i + self.__cell_size//2)
+
+    def __blit_tile(self, screen, value:int, size:int, center:tuple) -> None:
+        """
+        Draws a pre-rendered tile
+
+        Args:
+            screen: The pygame surface where the tile will be drawn
+            value: An integer, the value of the tile
+            size: An integer, the side (in pixel) of the tile
+            center: A tuple of 2 integers, the absolute position (in pixel) of the center of the tile
+        """
+        sprite = self.__tiles.get(value, size)
+        screen.blit(sprite, sprite.get_rect(center=center))
+        PROFILER.count("blits")
+
+    def __render_background(self) -> pygame.Surface:
+        """
+        Renders the void board
+
+        Returns:
+            A pygame surface with per-pixel alpha, as big as the board
+        """
+        size = self.get_size()
+        image = pygame.Surface(size, pygame.SRCALPHA, 32)
+        pygame.draw.rect(image, (187,173,160), pygame.Rect((0,0), size),0,5)
+        PROFILER.count("rect_draws")
+
+        grid = self.__core.get_grid()
+        void = self.__tiles.get(0, self.__cell_size)
+        for i in range(grid.rows):
+            for j in range(grid.cols):
+                x,y = self.__cell_center(i,j)
+                image.blit(void, void.get_rect(center=(x-self.__pos[0], y-self.__pos[1])))
+        return image.convert_alpha()
+
+    def __render_overlay(self) -> tuple:
+        """
+        Renders the game over overlay
+
+        Returns:
+            A tuple of 2 pygame surfaces: the veil covering the board and the text "Game over!"
+        """
+        size = self.get_size()
+        image = pygame.Surface(size, pygame.SRCALPHA,32)
+        pygame.draw.rect(image, (187,173,160),pygame.Rect((0,0), size),0,5)
+        text_surface = self.__fonts[0].render(str("Game over!"), False,(119,111,102))
+        PROFILER.count("rect_draws")
+        PROFILER.count("text_renders")
+        return image.convert_alpha(), text_surface.convert_alpha()
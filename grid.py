@@ -0,0 +1,415 @@
+"""
+Grid module
+
+Engines for 2048 boards of any size, from 3x3 up to 8x8 (rectangular boards too).
+Every engine is stateless and works on immutable (hashable) boards:
+
+    BitboardGrid: the 4x4 board, a thin wrapper around the table driven bitboard module
+    PackedGrid: boards up to 4x4 cells packed in an integer, the cell (i,j) stored as a
+        4-bit exponent in the nibble starting at bit 4*(cols*i+j)
+    ArrayGrid: bigger boards stored as bytes, the cell (i,j) stored as an exponent in the byte cols*i+j
+
+Every move slides the lines of the board listed starting from the edge the tiles are moved toward
+(see bitboard.slide_line), so no direction needs its own code
+
+    Usage example:
+
+    grid = make_grid(5, 5)
+    board = grid.spawn(grid.empty(), 12, 1)
+    board, score = grid.move(board, bitboard.LEFT)
+"""
+
+from array import array
+import bitboard
+
+# The smallest and the biggest number of rows or columns of a board
+MIN_SIDE = 3
+MAX_SIDE = 8
+
+# The slide tables of the packed lines, by length of the line
+_LINE_TABLES = {}
+
+# The engines already built, by size of the board
+_GRIDS = {}
+
+
+def board_lines(rows:int, cols:int) -> dict:
+    """
+    Lists the lines of a board for every move
+
+    Args:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+
+    Returns:
+        A dictionary mapping every move (bitboard.UP, RIGHT, DOWN or LEFT) to the list of the lines of cells (i,j),
+        each one listed starting from the edge the tiles are moved toward
+    """
+    return {
+        bitboard.UP: [[(i,j) for i in range(rows)] for j in range(cols)],
+        bitboard.RIGHT: [[(i,cols-1-j) for j in range(cols)] for i in range(rows)],
+        bitboard.DOWN: [[(rows-1-i,j) for i in range(rows)] for j in range(cols)],
+        bitboard.LEFT: [[(i,j) for j in range(cols)] for i in range(rows)],
+    }
+
+
+def _line_table(length:int) -> tuple:
+    """
+    Returns (building it once) the slide table of the packed lines of a given length
+
+    Args:
+        length: An integer, the number of cells of the line
+
+    Returns:
+        A tuple of 2 arrays indexed by packed line (its first cell in the lowest nibble):
+        the packed line slid toward its first cell and the score gained
+    """
+    if length == 4:
+        # The lines of 4 cells are the rows of the bitboard module
+        return bitboard.ROW_LEFT, bitboard.SCORE_LEFT
+
+    table = _LINE_TABLES.get(length)
+    if table is None:
+        results = array("H", bytes(2 << 4*length))
+        scores = array("I", bytes(4 << 4*length))
+        for packed in range(1 << 4*length):
+            line = [(packed >> 4*k) & 0xF for k in range(length)]
+            result = 0
+            for src, dst, merged in bitboard.slide_line(line):
+                if merged:
+                    result += 1 << 4*dst
+                    scores[packed] += 1 << (line[src]+1)
+                else:
+                    result |= line[src] << 4*dst
+            results[packed] = result
+        table = _LINE_TABLES[length] = (results, scores)
+    return table
+
+
+class PackedGrid:
+    """
+    A class designed to handle boards up to 4x4 cells, packed in an integer
+
+    Attributes:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+        lines: A dictionary, mapping every move to the lines of cells (i,j) of the board (see board_lines)
+        MAX_EXPONENT: An integer, tiles with this exponent don't merge anymore
+        __shifts: A dictionary, mapping every move to the lines of the board as lists of bit offsets
+        __tables: A dictionary, mapping every move to the slide table of its lines (see _line_table)
+    """
+
+    MAX_EXPONENT = bitboard.MAX_EXPONENT
+
+    def __init__(self, rows:int, cols:int) -> None:
+        """
+        Inits PackedGrid
+
+        Args:
+            rows: An integer, the number of rows of the board (at most 4)
+            cols: An integer, the number of columns of the board (at most 4)
+        """
+        self.rows = rows
+        self.cols = cols
+        self.lines = board_lines(rows, cols)
+        self.__shifts = {direction: [[4*(cols*i+j) for i,j in line] for line in lines] for direction, lines in self.lines.items()}
+        self.__tables = {direction: _line_table(len(lines[0])) for direction, lines in self.lines.items()}
+
+    def empty(self) -> int:
+        """
+        Returns a board with no tiles
+        """
+        return 0
+
+    def move(self, board:int, direction:int) -> tuple:
+        """
+        Makes a move on a board, without spawning any tile
+
+        Args:
+            board: A board of this grid
+            direction: An integer, it must be bitboard.UP, RIGHT, DOWN or LEFT
+
+        Returns:
+            A tuple of 2 elements: the resulting board and the score gained with the move.
+            If the move is not legal the board is returned unchanged
+        """
+        results, scores = self.__tables[direction]
+        result = 0
+        score = 0
+        for shifts in self.__shifts[direction]:
+            line = 0
+            for k, shift in enumerate(shifts):
+                line |= ((board >> shift) & 0xF) << 4*k
+            slid = results[line]
+            score += scores[line]
+            for k, shift in enumerate(shifts):
+                result |= ((slid >> 4*k) & 0xF) << shift
+        return result, score
+
+    def legal_mask(self, board:int) -> int:
+        """
+        Computes the legality of all the moves at once
+
+        Args:
+            board: A board of this grid
+
+        Returns:
+            An integer whose bit d is set if the move d (bitboard.UP, RIGHT, DOWN or LEFT) is legal
+        """
+        mask = 0
+        for direction, lines in self.__shifts.items():
+            results = self.__tables[direction][0]
+            for shifts in lines:
+                line = 0
+                for k, shift in enumerate(shifts):
+                    line |= ((board >> shift) & 0xF) << 4*k
+                if results[line] != line:
+                    mask |= 1 << direction
+                    break
+        return mask
+
+    def empty_cells(self, board:int) -> list:
+        """
+        Lists the void cells of a board
+
+        Returns:
+            The list of the indexes (cols*i+j) of the void cells, in row-major order
+        """
+        return [k for k in range(self.rows*self.cols) if not (board >> 4*k) & 0xF]
+
+    def spawn(self, board:int, k:int, exponent:int) -> int:
+        """
+        Returns a copy of the board with a tile spawned in the void cell of index k (cols*i+j)
+        """
+        return board | exponent << 4*k
+
+    def get_cell(self, board:int, i:int, j:int) -> int:
+        """
+        Returns the exponent stored in the cell (i,j) of a board
+        """
+        return (board >> 4*(self.cols*i+j)) & 0xF
+
+    def max_exponent(self, board:int) -> int:
+        """
+        Returns the biggest exponent on a board
+        """
+        return bitboard.max_exponent(board)
+
+    def unpack(self, board:int, exponents:list) -> None:
+        """
+        Reads the exponents of a board into an existing list, so that no list is allocated
+
+        Args:
+            board: A board of this grid
+            exponents: A list of rows*cols integers, filled with the exponents in row-major order
+        """
+        for k in range(len(exponents)):
+            exponents[k] = (board >> 4*k) & 0xF
+
+    def to_matrix(self, board:int) -> list:
+        """
+        Unpacks a board into a matrix of tile values (0, 2, 4, 8...)
+        """
+        matrix = []
+        for i in range(self.rows):
+            row = []
+            for j in range(self.cols):
+                e = self.get_cell(board, i, j)
+                row.append(1 << e if e else 0)
+            matrix.append(row)
+        return matrix
+
+    def from_matrix(self, matrix:list) -> int:
+        """
+        Packs a matrix of tile values (0, 2, 4, 8...) into a board
+
+        Raises:
+            ValueError: if a tile is bigger than 2**MAX_EXPONENT (see bitboard.exponent_of)
+        """
+        board = 0
+        for i in range(self.rows):
+            for j in range(self.cols):
+                if matrix[i][j]:
+                    board |= bitboard.exponent_of(matrix[i][j], self.MAX_EXPONENT) << 4*(self.cols*i+j)
+        return board
+
+
+class BitboardGrid(PackedGrid):
+    """
+    A class designed to handle the 4x4 board, where the moves are resolved by the bitboard module
+    """
+
+    def __init__(self) -> None:
+        """
+        Inits BitboardGrid
+        """
+        super().__init__(4, 4)
+
+    # The packed layout is the same, so the faster functions of the bitboard module can be used directly
+    move = staticmethod(bitboard.move)
+    legal_mask = staticmethod(bitboard.legal_mask)
+    empty_cells = staticmethod(bitboard.empty_cells)
+    to_matrix = staticmethod(bitboard.to_matrix)
+    from_matrix = staticmethod(bitboard.from_matrix)
+
+
+class ArrayGrid:
+    """
+    A class designed to handle boards of any size, stored as bytes (one exponent for every cell, in row-major order)
+
+    Attributes:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+        lines: A dictionary, mapping every move to the lines of cells (i,j) of the board (see board_lines)
+        MAX_EXPONENT: An integer, tiles with this exponent don't merge anymore
+        __indexes: A dictionary, mapping every move to the lines of the board as lists of indexes of bytes
+    """
+
+    MAX_EXPONENT = 255
+
+    def __init__(self, rows:int, cols:int) -> None:
+        """
+        Inits ArrayGrid
+
+        Args:
+            rows: An integer, the number of rows of the board
+            cols: An integer, the number of columns of the board
+        """
+        self.rows = rows
+        self.cols = cols
+        self.lines = board_lines(rows, cols)
+        self.__indexes = {direction: [[cols*i+j for i,j in line] for line in lines] for direction, lines in self.lines.items()}
+
+    def empty(self) -> bytes:
+        """
+        Returns a board with no tiles
+        """
+        return bytes(self.rows*self.cols)
+
+    def move(self, board:bytes, direction:int) -> tuple:
+        """
+        Makes a move on a board, without spawning any tile
+
+        Args:
+            board: A board of this grid
+            direction: An integer, it must be bitboard.UP, RIGHT, DOWN or LEFT
+
+        Returns:
+            A tuple of 2 elements: the resulting board and the score gained with the move.
+            If the move is not legal the board is returned unchanged
+        """
+        cells = bytearray(board)
+        score = 0
+        for indexes in self.__indexes[direction]:
+            line = [board[k] for k in indexes]
+            for k in indexes:
+                cells[k] = 0
+            for src, dst, merged in bitboard.slide_line(line, self.MAX_EXPONENT):
+                if merged:
+                    cells[indexes[dst]] += 1
+                    score += 1 << cells[indexes[dst]]
+                else:
+                    cells[indexes[dst]] = line[src]
+        return bytes(cells), score
+
+    def legal_mask(self, board:bytes) -> int:
+        """
+        Computes the legality of all the moves at once
+
+        Args:
+            board: A board of this grid
+
+        Returns:
+            An integer whose bit d is set if the move d (bitboard.UP, RIGHT, DOWN or LEFT) is legal
+        """
+        mask = 0
+        for direction, lines in self.__indexes.items():
+            for indexes in lines:
+                # A line can be moved if a tile leaves its cell or merges with another one
+                if any(src != dst or merged for src, dst, merged in bitboard.slide_line([board[k] for k in indexes], self.MAX_EXPONENT)):
+                    mask |= 1 << direction
+                    break
+        return mask
+
+    def empty_cells(self, board:bytes) -> list:
+        """
+        Lists the void cells of a board
+
+        Returns:
+            The list of the indexes (cols*i+j) of the void cells, in row-major order
+        """
+        return [k for k, e in enumerate(board) if not e]
+
+    def spawn(self, board:bytes, k:int, exponent:int) -> bytes:
+        """
+        Returns a copy of the board with a tile spawned in the void cell of index k (cols*i+j)
+        """
+        return board[:k] + bytes([exponent]) + board[k+1:]
+
+    def get_cell(self, board:bytes, i:int, j:int) -> int:
+        """
+        Returns the exponent stored in the cell (i,j) of a board
+        """
+        return board[self.cols*i+j]
+
+    def max_exponent(self, board:bytes) -> int:
+        """
+        Returns the biggest exponent on a board
+        """
+        return max(board)
+
+    def unpack(self, board:bytes, exponents:list) -> None:
+        """
+        Reads the exponents of a board into an existing list, so that no list is allocated
+
+        Args:
+            board: A board of this grid
+            exponents: A list of rows*cols integers, filled with the exponents in row-major order
+        """
+        for k, e in enumerate(board):
+            exponents[k] = e
+
+    def to_matrix(self, board:bytes) -> list:
+        """
+        Unpacks a board into a matrix of tile values (0, 2, 4, 8...)
+        """
+        return [[1 << e if e else 0 for e in board[self.cols*i:self.cols*(i+1)]] for i in range(self.rows)]
+
+    def from_matrix(self, matrix:list) -> bytes:
+        """
+        Packs a matrix of tile values (0, 2, 4, 8...) into a board
+
+        Raises:
+            ValueError: if a tile is bigger than 2**MAX_EXPONENT (see bitboard.exponent_of)
+        """
+        return bytes(bitboard.exponent_of(value, self.MAX_EXPONENT) for row in matrix for value in row)
+
+
+def make_grid(rows:int=4, cols:int=4):
+    """
+    Returns the engine of a board size: the bitboard module for 4x4 boards,
+    a packed integer for smaller boards and bytes for bigger ones
+
+    Args:
+        rows: An integer, the number of rows of the board
+        cols: An integer, the number of columns of the board
+
+    Returns:
+        A BitboardGrid, a PackedGrid or an ArrayGrid
+
+    Raises:
+        ValueError: if the board is smaller than MIN_SIDE or bigger than MAX_SIDE
+    """
+    if not (MIN_SIDE <= rows <= MAX_SIDE and MIN_SIDE <= cols <= MAX_SIDE):
+        raise ValueError("the board must have between %d and %d rows and columns" % (MIN_SIDE, MAX_SIDE))
+
+    grid = _GRIDS.get((rows, cols))
+    if grid is None:
+        if rows == 4 and cols == 4:
+            grid = BitboardGrid()
+        elif rows <= 4 and cols <= 4:
+            grid = PackedGrid(rows, cols)
+        else:
+            grid = ArrayGrid(rows, cols)
+        _GRIDS[rows, cols] = grid
+    return grid
@@ -0,0 +1,165 @@
+"""
+High score module
+
+The HighScore class loads the high score at startup and saves it from a background thread,
+so that the frame loop never waits for the disk. Updates are coalesced: a burst of new
+high scores (one for every merge during a good run) results in a single write.
+A score that keeps rising (the autoplay) is still written at least every max_delay seconds
+
+    Usage example:
+
+    highscore = HighScore("data.dat")
+    highscore.update(score)
+    ...
+    highscore.close()
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class HighScore:
+    """
+    A class designed to persist the high score
+
+    The file contains a JSON object {"highscore": score}. It's written to a temporary file
+    that is then renamed over the old one, so a crash never leaves a corrupted file
+
+    Attributes:
+        __path: A string, the path of the data file
+        __delay: A float, the time (in seconds) an update waits for other updates before being written
+        __max_delay: A float, the maximum time (in seconds) an update waits before being written, even if other updates keep coming
+        __value: An integer, the current high score
+        __saved: An integer, the high score stored in the data file
+        __changed_at: A float, the time of the last update that hasn't been written yet, None if there's none
+        __dirty_since: A float, the time of the first update that hasn't been written yet, None if there's none
+        __closed: A boolean, representing if the high score has been closed
+        __condition: A threading.Condition, guarding the attributes above and waking up the writer
+        __thread: The background writer thread
+    """
+
+    def __init__(self, path:str="data.dat", delay:float=1.0, max_delay:float=5.0) -> None:
+        """
+        Inits HighScore, loading the high score from the data file and starting the writer thread
+
+        Args:
+            path: A string, the path of the data file
+            delay: A float, the time (in seconds) an update waits for other updates before being written
+            max_delay: A float, the maximum time (in seconds) an update waits before being written
+        """
+        self.__path = path
+        self.__delay = delay
+        self.__max_delay = max_delay
+        self.__value = self.__saved = self.__load()
+        self.__changed_at = None
+        self.__dirty_since = None
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+        self.__thread = threading.Thread(target=self.__run, name="highscore-writer", daemon=True)
+        self.__thread.start()
+
+    def __load(self) -> int:
+        """
+        Reads the high score from the data file
+
+        Returns:
+            The high score, 0 if the file does not exist or if its content is corrupted
+        """
+        try:
+            with open(self.__path, "r") as f:
+                return int(json.load(f)["highscore"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+
+    def get(self) -> int:
+        """
+        Returns the current high score
+
+        Returns:
+            The current high score
+        """
+        return self.__value
+
+    def update(self, score:int) -> bool:
+        """
+        Records a score, it will be written in the background if it's a new high score
+
+        Args:
+            score: An integer, the score of the current game
+
+        Returns:
+            True if the score is a new high score, False if it isn't
+        """
+        if score <= self.__value:
+            return False
+
+        with self.__condition:
+            self.__value = score
+            self.__changed_at = time.monotonic()
+            if self.__dirty_since is None:
+                self.__dirty_since = self.__changed_at
+            self.__condition.notify()
+        return True
+
+    def flush(self) -> None:
+        """
+        Writes the current high score now, if it hasn't been written yet
+        """
+        with self.__condition:
+            value = self.__value
+            if value == self.__saved:
+                return
+            self.__changed_at = None
+            self.__dirty_since = None
+            self.__saved = value
+        self.__write(value)
+
+    def close(self) -> None:
+        """
+        Stops the writer thread and writes the high score one last time
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__thread.join()
+        self.flush()
+
+    def __write(self, value:int) -> None:
+        """
+        Atomically replaces the data file
+        """
+        temporary = self.__path + ".tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump({"highscore": value}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.__path)
+        except OSError:
+            # Losing a high score is better than crashing the game, it'll be written again on exit
+            with self.__condition:
+                if self.__saved == value:
+                    self.__saved = None
+
+    def __run(self) -> None:
+        """
+        The body of the writer thread: it waits until no update has arrived for delay seconds,
+        or until the oldest unwritten update is max_delay seconds old, then writes
+        """
+        while True:
+            with self.__condition:
+                while not self.__closed and self.__changed_at is None:
+                    self.__condition.wait()
+                if self.__closed:
+                    return
+
+                deadline = min(self.__changed_at + self.__delay, self.__dirty_since + self.__max_delay)
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.__condition.wait(remaining)
+                    continue
+
+            self.flush()
@@ -12,6 +12,7 @@ Each label has as a static title and a dinamic content (value)
 """
 
 import pygame
+from profiler import PROFILER
 
 class Label:
     """
@@ -26,6 +27,9 @@ class Label:
         __value: A string that will be displayed as content in the label
         __title_font: A pygame font used to write the title string displayed on the label
         __value_font: A pygame font used to write the content string displayed on the label
+        __title_surface: A pygame surface, the rendered title
+        __value_surface: A pygame surface, the rendered content, None if it must be rendered again
+        __dirty: A boolean, representing if the label changed since the last frame
     """
     def __init__(self, pos:tuple, size:tuple, title:str, value:str, title_font:str, title_font_size:int, value_font:str, value_font_size:int) -> None:
         """
@@ -49,6 +53,12 @@ class Label:
         pygame.font.init()
         self.__title_font = pygame.font.SysFont(title_font,title_font_size)
         self.__value_font = pygame.font.SysFont(value_font,value_font_size)
+
+        # The title never changes, so I render it once
+        self.__title_surface = self.__title_font.render(str(self.__title), False,(238,223,199))
+        self.__value_surface = None
+
+        self.__dirty = True
     
     def set_value(self, new_value:str) -> None:
         """
@@ -57,7 +67,10 @@ class Label:
         Args:
             new_value: A string that will be displayed as content in the label
         """
-        self.__value = new_value
+        if new_value != self.__value:
+            self.__value = new_value
+            self.__value_surface = None
+            self.__dirty = True
 
     def get_value(self) -> str:
         """
@@ -68,22 +81,38 @@ class Label:
         """
         return self.__value
 
-    def show(self, screen:pygame.Surface) -> None:
+    def invalidate(self) -> None:
+        """
+        Forces the label to be drawn again in the next frame
+        """
+        self.__dirty = True
+
+    def show(self, screen:pygame.Surface) -> list:
         """
-        Shows the label
+        Shows the label, if it changed since the last frame
 
         Args:
             screen: The pygame surface where the button will be drawn
+
+        Returns:
+            A list of pygame Rects, the areas of the screen that changed (empty if nothing has been drawn)
         """
+        if not self.__dirty:
+            return []
+        self.__dirty = False
 
         # I calculate the position of the top left corner of the label
         fx,fy = self.__posx - self.__width//2, self.__posy - self.__height//2
     
         pygame.draw.rect(screen, (187,173,160), pygame.Rect((fx,fy), (self.__width, self.__height)), 0, 4)        
+        PROFILER.count("rect_draws")
 
-        # I create and display the surfaces for title and value of the label
-        title_surface = self.__title_font.render(str(self.__title), False,(238,223,199))
-        value_surface = self.__value_font.render(str(self.__value), False,(255,255,255))
+        # I display the surfaces for title and value of the label, rendering the value only if it changed
+        if self.__value_surface is None:
+            self.__value_surface = self.__value_font.render(str(self.__value), False,(255,255,255))
+            PROFILER.count("text_renders")
+        title_surface = self.__title_surface
+        value_surface = self.__value_surface
 
         dx1 = title_surface.get_rect().width//2
         dy1 = title_surface.get_rect().height//2
@@ -92,4 +121,6 @@ class Label:
         dy2 = value_surface.get_rect().height//2
         
         screen.blit(title_surface, (self.__posx-dx1, self.__posy-dy1 -self.__height//5))
-        screen.blit(value_surface, (self.__posx-dx2, self.__posy-dy2 +self.__height//5))
\ No newline at end of file
+        screen.blit(value_surface, (self.__posx-dx2, self.__posy-dy2 +self.__height//5))
+
+        return [pygame.Rect((fx,fy), (self.__width, self.__height))]
\ No newline at end of file
@@ -2,7 +2,12 @@ import pygame
 from game import Game
 from button import Button
 from label import Label
-import json
+from highscore import HighScore
+from profiler import PROFILER
+from autoplay import AIWorker, SPEEDS, DEFAULT_SPEED, TURBO_FRACTION, TURBO_DEPTH
+from ai import ExpectimaxPlayer
+import sys
+import time
 
 # window sizes
 size = width, height = 550,660
@@ -10,102 +15,260 @@ size = width, height = 550,660
 # window's background color
 bgcolor = (249,246,219)
 
-screen = pygame.display.set_mode(size)
-pygame.display.set_caption('2048')
-clock = pygame.time.Clock()
-pygame.font.init()
-
 # The font that will be used for button's text, labels' titles and values and for the game's digits
 DEFAULT_FONT = "franklingothicmedium"
 
-# Size and position of cells and board
-CELL_SIZE = 96
-CELL_MARGIN = 12
-GAME_POS = (width-(CELL_SIZE*4 + CELL_MARGIN*5))//2,(height-(CELL_SIZE*4 + CELL_MARGIN*5))//2
+# The command line can choose the size of the board (e.g. "python main.py 5x5"), the frame rate (--fps=144),
+# disable the animations (--no-animations) and enable the profiler (--profile, see the profiler module)
+ARGS = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+
+# The animations last the same time whatever the frame rate is
+FPS = 60
+for arg in sys.argv[1:]:
+    if arg.startswith("--fps="):
+        FPS = int(arg[len("--fps="):])
+ANIMATIONS = "--no-animations" not in sys.argv
+
+# Size of the board
+BOARD_ROWS, BOARD_COLS = 4, 4
+if ARGS:
+    BOARD_ROWS, BOARD_COLS = map(int, ARGS[0].lower().split("x"))
 
-# Size and position of the new game button
-BTN_POS = width//2, height-(height-(CELL_SIZE*4 + CELL_MARGIN*5))//4
-BTN_WIDTH = (CELL_SIZE*4 + CELL_MARGIN*5)
-BTN_HEIGHT = min((height-(CELL_SIZE*4 + CELL_MARGIN*5))//2 - 20, 100)
+# Size and position of cells and board, the board is 444 pixels wide or high whatever its size
+BOARD_SIDE = 444
+CELL_MARGIN = 48 // max(BOARD_ROWS, BOARD_COLS)
+CELL_SIZE = (BOARD_SIDE - CELL_MARGIN*(max(BOARD_ROWS, BOARD_COLS)+1)) // max(BOARD_ROWS, BOARD_COLS)
+BOARD_WIDTH = CELL_SIZE*BOARD_COLS + CELL_MARGIN*(BOARD_COLS+1)
+BOARD_HEIGHT = CELL_SIZE*BOARD_ROWS + CELL_MARGIN*(BOARD_ROWS+1)
+GAME_POS = (width-BOARD_WIDTH)//2,(height-BOARD_HEIGHT)//2
+
+# Size and position of the buttons: the new game button, then the hint and the autoplay buttons on its right
+BTN_GAP = 10
+AI_BTN_WIDTH = BOARD_WIDTH//4
+BTN_WIDTH = BOARD_WIDTH - 2*(AI_BTN_WIDTH + BTN_GAP)
+BTN_HEIGHT = min((height-BOARD_HEIGHT)//2 - 20, 100)
+BTN_POS = GAME_POS[0] + BTN_WIDTH//2, height-(height-BOARD_HEIGHT)//4
+HINT_BTN_POS = GAME_POS[0] + BTN_WIDTH + BTN_GAP + AI_BTN_WIDTH//2, BTN_POS[1]
+AUTO_BTN_POS = GAME_POS[0] + BOARD_WIDTH - AI_BTN_WIDTH//2, BTN_POS[1]
 
 # Size and positions of the labels
-SCORE_LABEL_POS = GAME_POS[0] + (CELL_SIZE*4 + CELL_MARGIN*5)//4, (height-(CELL_SIZE*4 + CELL_MARGIN*5))//4
-BEST_SCORE_LABEL_POS = GAME_POS[0] + 3*(CELL_SIZE*4 + CELL_MARGIN*5)//4, (height-(CELL_SIZE*4 + CELL_MARGIN*5))//4
-LABEL_SIZE = int((CELL_SIZE*4 + CELL_MARGIN*5)//2 * 0.9), BTN_HEIGHT
-
-# Game, Button and Label objects
-game = Game(GAME_POS,CELL_SIZE, CELL_MARGIN, DEFAULT_FONT, 50)
-new_game_btn = Button(pos=BTN_POS, width=BTN_WIDTH,height=BTN_HEIGHT,onclick=game.reset,value="New Game",font=DEFAULT_FONT, font_size=40)
-score_label = Label(SCORE_LABEL_POS, LABEL_SIZE, "SCORE", 0, DEFAULT_FONT,20, DEFAULT_FONT,30)
-best_score_label = Label(BEST_SCORE_LABEL_POS, LABEL_SIZE, "BEST", 0, DEFAULT_FONT,20, DEFAULT_FONT,30)
-
-try:
-    # Tries to open a file, if the file does not exist 
-    # or if the content is corrupted, 
-    # it will just assume the current highscore is 0
-    f = open("data.dat","r")
-    content = json.load(f)
-    f.close()
-    best_score_label.set_value(content["highscore"])
-except:
-    best_score_label.set_value(0)
-
-
-running = True
-up = down = right = left = False
-
-while running:
-    screen.fill(bgcolor)
+SCORE_LABEL_POS = GAME_POS[0] + BOARD_WIDTH//4, (height-BOARD_HEIGHT)//4
+BEST_SCORE_LABEL_POS = GAME_POS[0] + 3*BOARD_WIDTH//4, (height-BOARD_HEIGHT)//4
+LABEL_SIZE = int(BOARD_WIDTH//2 * 0.9), BTN_HEIGHT
+
+# The arrow keys queue the moves, they are made by game.update (see Game.queue_move)
+KEY_MOVES = {pygame.K_UP: "up", pygame.K_RIGHT: "right", pygame.K_DOWN: "down", pygame.K_LEFT: "left"}
+
+# The keys changing the speed of the autoplay (see autoplay.SPEEDS)
+FASTER_KEYS = (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS)
+SLOWER_KEYS = (pygame.K_MINUS, pygame.K_KP_MINUS)
+
+
+def main() -> None:
+    if "--profile" in sys.argv:
+        PROFILER.enable()
+
+    screen = pygame.display.set_mode(size)
+    pygame.display.set_caption('2048')
+    clock = pygame.time.Clock()
+    pygame.font.init()
+
+    # Game, Button and Label objects
+    game = Game(GAME_POS,CELL_SIZE, CELL_MARGIN, DEFAULT_FONT, 50*CELL_SIZE//96, rows=BOARD_ROWS, cols=BOARD_COLS, animations=ANIMATIONS)
+    score_label = Label(SCORE_LABEL_POS, LABEL_SIZE, "SCORE", 0, DEFAULT_FONT,20, DEFAULT_FONT,30)
+    best_score_label = Label(BEST_SCORE_LABEL_POS, LABEL_SIZE, "BEST", 0, DEFAULT_FONT,20, DEFAULT_FONT,30)
 
-    for event in pygame.event.get():
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:
-                # I check if the button is being clicked
-                if new_game_btn.is_inside(event.pos):
-                    new_game_btn.click()
-
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_UP and not up:
-                game.make_move("up")
-            elif event.key == pygame.K_RIGHT and not right:
-                game.make_move("right")
-            elif event.key == pygame.K_DOWN and not down:
-                game.make_move("down")
-            elif event.key == pygame.K_LEFT and not left:    
-                game.make_move("left")
-
-        elif event.type == pygame.KEYUP:
-            if event.key == pygame.K_UP:
-                up = False
-            elif event.key == pygame.K_RIGHT:
-                right = False
-            elif event.key == pygame.K_DOWN:
-                down = False
-            elif event.key == pygame.K_LEFT:
-                left = False
-
-    if new_game_btn.is_inside(pygame.mouse.get_pos()):
-        pygame.mouse.set_cursor(*pygame.cursors.Cursor(pygame.SYSTEM_CURSOR_HAND))
-    else:
-        pygame.mouse.set_cursor(*pygame.cursors.arrow)
-
-    # I get the current player's score and display it in the score label
-    score = game.get_score()
-    score_label.set_value(score)
-
-    # If the current score is the highscore
-    # I update the best score label and the highscore in the data file
-    if best_score_label.get_value() < score:
-        best_score_label.set_value(score)
-        f = open("data.dat","w")
-        json.dump({"highscore":score},f)
-        f.close()
-
-    # I display the game, the button and the labels
-    game.show(screen)
-    new_game_btn.show(screen, pygame.mouse.get_pos())
-    score_label.show(screen)
-    best_score_label.show(screen)
+    # The AI works on 4x4 boards only, it computes its moves in a worker process (see the autoplay module)
+    # so the frame loop never waits for it. Its answers are either shown as a hint or made by the autoplay
+    ai_worker = AIWorker() if (BOARD_ROWS, BOARD_COLS) == (4, 4) else None
+    # The turbo mode searches its moves in the frame loop (see the autoplay module)
+    turbo_player = ExpectimaxPlayer(depth=TURBO_DEPTH, time_budget=None) if ai_worker is not None else None
+    autoplay = {"on": False, "speed": SPEEDS.index(DEFAULT_SPEED), "last_move": 0, "hint": None}
 
+    def new_game():
+        game.reset()
+        autoplay["hint"] = None
+        if ai_worker is not None:
+            hint_btn.set_value("Hint")
+        set_autoplay(False)
+
+    def hint():
+        if not game.check_game_over():
+            # I remember the board of the hint, the label goes back to "Hint" as soon as the board changes
+            autoplay["hint"] = game.get_core().get_board()
+            ai_worker.request(autoplay["hint"])
+            hint_btn.set_value("...")
+
+    def set_autoplay(on):
+        autoplay["on"] = on
+        turbo = on and SPEEDS[autoplay["speed"]] is None
+        # The turbo mode makes too many moves to show them sliding
+        game.set_animations(ANIMATIONS and not turbo)
+        auto_btn.set_value("Stop" if on else "Auto")
+        if on:
+            hint_btn.disable()
+        elif ai_worker is not None:
+            hint_btn.enable()
+        speed = SPEEDS[autoplay["speed"]]
+        pygame.display.set_caption("2048" if not on else "2048 - autoplay, %s" % ("turbo" if speed is None else "%d moves/s" % speed))
+
+    new_game_btn = Button(pos=BTN_POS, width=BTN_WIDTH,height=BTN_HEIGHT,onclick=new_game,value="New Game",font=DEFAULT_FONT, font_size=34)
+    hint_btn = Button(pos=HINT_BTN_POS, width=AI_BTN_WIDTH,height=BTN_HEIGHT,onclick=hint,value="Hint",font=DEFAULT_FONT, font_size=28, disabled=ai_worker is None)
+    auto_btn = Button(pos=AUTO_BTN_POS, width=AI_BTN_WIDTH,height=BTN_HEIGHT,onclick=lambda: set_autoplay(not autoplay["on"]),value="Auto",font=DEFAULT_FONT, font_size=28, disabled=ai_worker is None)
+    buttons = [new_game_btn, hint_btn, auto_btn]
+
+    # The highscore is loaded now and saved in the background, so the frame loop never waits for the disk
+    # (if the data file does not exist or if its content is corrupted, the current highscore is 0).
+    # Every board size has its own highscore
+    highscore = HighScore("data.dat" if (BOARD_ROWS, BOARD_COLS) == (4, 4) else "data_%dx%d.dat" % (BOARD_ROWS, BOARD_COLS))
+    best_score_label.set_value(highscore.get())
+
+    running = True
+
+    # When the profiler is enabled, the summary of the last frames is displayed in the top left corner (F3 hides it)
+    show_profile = PROFILER.enabled
+    profile_font = pygame.font.SysFont("couriernew", 14)
+
+    # The whole window is drawn once, then only the areas that change are updated
+    screen.fill(bgcolor)
     pygame.display.update()
-    clock.tick(60)
\ No newline at end of file
+    hand_cursor = False
+
+    while running:
+        # If nothing is moving on the screen and the AI isn't working, I wait for the next event instead of drawing identical frames
+        mousepos = pygame.mouse.get_pos()
+        thinking = ai_worker is not None and (autoplay["on"] or ai_worker.is_pending())
+        if game.is_animating() or thinking or any(button.is_animating(mousepos) for button in buttons):
+            events = pygame.event.get()
+        else:
+            events = [pygame.event.wait()] + pygame.event.get()
+
+        # The time spent waiting for the events isn't part of the frame
+        PROFILER.begin_frame()
+        PROFILER.switch("events")
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    # I check if a button is being clicked
+                    for button in buttons:
+                        if button.is_inside(event.pos) and not button.disabled:
+                            button.click()
+
+            elif event.type == pygame.KEYDOWN:
+                if event.key in KEY_MOVES and not autoplay["on"]:
+                    game.queue_move(KEY_MOVES[event.key])
+                elif event.key in FASTER_KEYS + SLOWER_KEYS:
+                    step = 1 if event.key in FASTER_KEYS else -1
+                    autoplay["speed"] = max(0, min(len(SPEEDS)-1, autoplay["speed"] + step))
+                    set_autoplay(autoplay["on"])
+                elif event.key == pygame.K_F3 and PROFILER.enabled:
+                    show_profile = not show_profile
+                    if not show_profile:
+                        pygame.event.post(pygame.event.Event(pygame.WINDOWEXPOSED))
+
+            elif event.type == pygame.WINDOWEXPOSED:
+                # The content of the window has been lost, everything must be drawn again
+                screen.fill(bgcolor)
+                game.invalidate()
+                for button in buttons:
+                    button.invalidate()
+                score_label.invalidate()
+                best_score_label.invalidate()
+                pygame.display.update()
+
+        mousepos = pygame.mouse.get_pos()
+        if any(button.is_inside(mousepos) and not button.disabled for button in buttons) != hand_cursor:
+            hand_cursor = not hand_cursor
+            if hand_cursor:
+                pygame.mouse.set_cursor(*pygame.cursors.Cursor(pygame.SYSTEM_CURSOR_HAND))
+            else:
+                pygame.mouse.set_cursor(*pygame.cursors.arrow)
+
+        PROFILER.switch("logic")
+
+        if ai_worker is not None and not ai_worker.is_alive():
+            # The worker process is gone (killed or crashed), so the AI is turned off for the rest of the session
+            ai_worker.close()
+            ai_worker = None
+            autoplay["hint"] = None
+            set_autoplay(False)
+            hint_btn.set_value("Hint")
+            hint_btn.disable()
+            auto_btn.disable()
+
+        if ai_worker is not None:
+            board = game.get_core().get_board()
+            speed = SPEEDS[autoplay["speed"]]
+            now = pygame.time.get_ticks()
+
+            if autoplay["on"] and speed is None:
+                # Turbo mode: I make moves until the share of the frame left for them is over
+                deadline = time.perf_counter() + TURBO_FRACTION / FPS
+                while not game.check_game_over() and time.perf_counter() < deadline:
+                    game.make_move(turbo_player.get_move(board))
+                    board = game.get_core().get_board()
+            else:
+                # The answers about boards that are gone (after a move or a new game) are ignored
+                result = ai_worker.poll()
+                if result is not None and result[0] == board and result[1] is not None:
+                    if autoplay["on"]:
+                        game.queue_move(result[1])
+                        autoplay["last_move"] = now
+                    elif autoplay["hint"] == board:
+                        hint_btn.set_value(result[1].capitalize())
+
+                if autoplay["on"] and not ai_worker.is_pending() and now - autoplay["last_move"] >= 1000 // speed:
+                    ai_worker.request(board)
+
+            # The hint (or its "...") is shown until the board changes, even if its answer has been dropped as stale
+            if autoplay["hint"] is not None and autoplay["hint"] != board:
+                autoplay["hint"] = None
+                hint_btn.set_value("Hint")
+
+            if autoplay["on"] and game.check_game_over():
+                set_autoplay(False)
+
+        # I make the queued moves
+        game.update()
+
+        # I get the current player's score and display it in the score label
+        score = game.get_score()
+        score_label.set_value(score)
+
+        # If the current score is the highscore
+        # I update the best score label, the data file will be updated in the background
+        if highscore.update(score):
+            best_score_label.set_value(score)
+
+        PROFILER.switch("render")
+
+        # I display the game, the buttons and the labels, and I update only the areas that changed
+        dirty = game.show(screen)
+        for button in buttons:
+            dirty += button.show(screen, mousepos)
+        dirty += score_label.show(screen)
+        dirty += best_score_label.show(screen)
+        if show_profile:
+            dirty += PROFILER.draw_overlay(screen, profile_font)
+
+        PROFILER.switch("update")
+        if dirty:
+            pygame.display.update(dirty)
+        PROFILER.end_frame()
+
+        clock.tick(FPS)
+
+    if ai_worker is not None:
+        ai_worker.close()
+    highscore.close()
+    PROFILER.dump()
+    pygame.quit()
+
+
+# The AI worker process may import this module again (with the spawn start method), so the window is opened only here
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+N-tuple module
+
+A learned evaluation of 2048 boards: an n-tuple network. Every tuple is a list of cells whose exponents
+index a table of weights, and the value of a board is the sum of the weights selected by every tuple
+on the 8 symmetries of the board (its rotations and reflections), so symmetric boards share their weights.
+The network values afterstates (the boards right after a move, before the spawn): the greedy player
+makes the move with the best immediate score plus value of its afterstate.
+
+It's trained with TD(0) by playing headless games on a pool of processes: every worker maps the same
+weight file and updates it in place, without locks (concurrent updates of the same weight are rare and harmless).
+The weights are stored with the format of the tables module, a float32 table for every tuple,
+and the key of the file records the tuples, so a file is always loaded with the network it was trained for
+
+    Usage example:
+
+    python ntuple.py --games 100000 --workers 8 --weights ntuple.weights
+    ...
+    network = load("ntuple.weights")
+    value = network.evaluate(board)
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from array import array
+
+import bitboard
+import tables
+
+# 5 tuples of 4 cells (cell 4*row + column): the outer and the inner row, the corner, the edge and the middle 2x2 square.
+# Every table has 16**4 weights
+SMALL_TUPLES = ((0,1,2,3), (4,5,6,7), (0,1,4,5), (1,2,5,6), (5,6,9,10))
+
+# 4 tuples of 6 cells: two 2x3 rectangles and two 6-cell lines, 16**6 weights (64 MB) for every table
+LARGE_TUPLES = ((0,1,2,3,4,5), (4,5,6,7,8,9), (0,1,2,4,5,6), (4,5,6,8,9,10))
+
+KEY_PREFIX = "ntuple v1, tuples "
+DEFAULT_PATH = "ntuple.weights"
+
+
+def _key(tuples:tuple) -> str:
+    return KEY_PREFIX + " ".join(",".join(str(cell) for cell in cells) for cells in tuples)
+
+
+def _parse_key(key:str) -> tuple:
+    return tuple(tuple(int(cell) for cell in cells.split(",")) for cells in key[len(KEY_PREFIX):].split(" "))
+
+
+class NTupleNetwork:
+    """
+    A class designed to evaluate boards with the weights of an n-tuple network
+
+    Attributes:
+        tuples: A tuple of tuples of integers, the cells (4*row + column) of every tuple
+        features: An integer, the number of weights summed to evaluate a board (8 for every tuple)
+        __tables: A list of tuples (weights, runs), one for every tuple of cells: the float32 table of its weights
+            (an array.array or a memoryview) and its runs of consecutive cells, as tuples (shift, mask, position):
+            a run is read from the board at shift and written in the index of the weight at position
+    """
+
+    def __init__(self, tuples:tuple=SMALL_TUPLES, weights:list=None) -> None:
+        """
+        Inits NTupleNetwork
+
+        Args:
+            tuples: A tuple of tuples of integers, the cells (4*row + column) of every tuple
+            weights: An optional list with the table of every tuple (see make_weights), all zeros by default
+        """
+        self.tuples = tuple(tuple(cells) for cells in tuples)
+        self.features = 8 * len(self.tuples)
+        if weights is None:
+            weights = [make_weights(len(cells)) for cells in self.tuples]
+
+        self.__tables = []
+        for cells, table in zip(self.tuples, weights):
+            if len(table) != 16 ** len(cells):
+                raise ValueError("the table of the tuple %s has %d weights" % (cells, len(table)))
+            # I merge the cells that are consecutive on the board, so they are read with a single shift
+            runs = []
+            start = 0
+            for k in range(1, len(cells)+1):
+                if k == len(cells) or cells[k] != cells[k-1] + 1:
+                    runs.append((4*cells[start], (1 << 4*(k-start)) - 1, 4*start))
+                    start = k
+            self.__tables.append((table, tuple(runs)))
+
+    def get_weights(self) -> list:
+        """
+        Returns the table of weights of every tuple
+        """
+        return [table for table, _ in self.__tables]
+
+    def evaluate(self, board:int) -> float:
+        """
+        Evaluates a board (an afterstate)
+
+        Args:
+            board: An integer, a packed board
+
+        Returns:
+            A float, the expected score the game will still gain
+        """
+        total = 0.0
+        for b in bitboard.symmetries(board):
+            for table, runs in self.__tables:
+                index = 0
+                for shift, mask, position in runs:
+                    index |= ((b >> shift) & mask) << position
+                total += table[index]
+        return total
+
+    def update(self, board:int, delta:float) -> None:
+        """
+        Adds a delta to every weight selected by a board
+
+        Args:
+            board: An integer, a packed board
+            delta: A float, added to every weight (so the value of the board changes by delta*features)
+        """
+        for b in bitboard.symmetries(board):
+            for table, runs in self.__tables:
+                index = 0
+                for shift, mask, position in runs:
+                    index |= ((b >> shift) & mask) << position
+                table[index] += delta
+
+    def best_move(self, board:int):
+        """
+        Chooses the legal move with the best immediate score plus value of its afterstate
+
+        Args:
+            board: An integer, a packed board
+
+        Returns:
+            A tuple (direction, afterstate, score, value), or None if there's no legal move
+        """
+        best = None
+        for direction in range(4):
+            child, score = bitboard.move(board, direction)
+            if child == board:
+                continue
+            value = self.evaluate(child)
+            if best is None or score + value > best[2] + best[3]:
+                best = (direction, child, score, value)
+        return best
+
+
+def make_weights(length:int) -> array:
+    """
+    Builds a table of zero weights for a tuple
+
+    Args:
+        length: An integer, the number of cells of the tuple
+
+    Returns:
+        An array.array of 16**length float32
+    """
+    return array("f", bytes(4 * 16**length))
+
+
+def create(path:str, tuples:tuple=SMALL_TUPLES) -> None:
+    """
+    Writes a weight file with all the weights set to zero
+
+    Args:
+        path: A string, the path of the file
+        tuples: A tuple of tuples of integers, the cells of every tuple
+    """
+    tables.write(path, _key(tuples), {"T%d" % k: make_weights(len(cells)) for k, cells in enumerate(tuples)})
+
+
+def load(path:str=DEFAULT_PATH, writable:bool=False) -> NTupleNetwork:
+    """
+    Loads a network by mapping its weight file
+
+    Args:
+        path: A string, the path of the file
+        writable: A boolean, if True the updates of the weights are written to the file
+
+    Returns:
+        An NTupleNetwork
+
+    Raises:
+        ValueError: if the file is missing or it isn't a weight file
+    """
+    key = tables.read_key(path)
+    weights = None if key is None or not key.startswith(KEY_PREFIX) else tables.read(path, key, writable)
+    if weights is None:
+        raise ValueError("missing or invalid weight file: " + path)
+    tuples = _parse_key(key)
+    return NTupleNetwork(tuples, [weights["T%d" % k] for k in range(len(tuples))])
+
+
+def _spawn(board:int, rng:random.Random) -> int:
+    """
+    Spawns a tile in a random void cell, a 2 five times out of six and a 4 one time of six (as GameCore does)
+    """
+    cells = bitboard.empty_cells(board)
+    return board | (2 if rng.random() < 1/6 else 1) << 4*rng.choice(cells)
+
+
+def train_game(network:NTupleNetwork, rng:random.Random, learning_rate:float) -> tuple:
+    """
+    Plays a game with the greedy player, learning from it with TD(0) on the afterstates:
+    the value of every afterstate moves toward the score of the next move plus the value of the next afterstate,
+    the value of the last afterstate toward zero
+
+    Args:
+        network: An NTupleNetwork, its weights are updated during the game
+        rng: A random.Random instance, used to spawn the tiles
+        learning_rate: A float, the fraction of the error corrected by every update
+
+    Returns:
+        A tuple of 3 integers: the score, the number of moves and the biggest exponent of the game
+    """
+    rate = learning_rate / network.features
+    board = _spawn(_spawn(0, rng), rng)
+    score = moves = 0
+    previous = previous_value = None
+    while True:
+        best = network.best_move(board)
+        if best is None:
+            break
+        _, afterstate, reward, value = best
+        if previous is not None:
+            network.update(previous, rate * (reward + value - previous_value))
+        previous, previous_value = afterstate, value
+        score += reward
+        moves += 1
+        board = _spawn(afterstate, rng)
+
+    if previous is not None:
+        network.update(previous, -rate * previous_value)
+    return score, moves, bitboard.max_exponent(board)
+
+
+# The network of the current worker process, mapped once from the weight file
+_network = None
+
+
+def _init_worker(path:str) -> None:
+    global _network
+    _network = load(path, writable=True)
+
+
+def _train_games(task:tuple) -> list:
+    """
+    Plays a chunk of training games in a worker
+
+    Args:
+        task: A tuple (seed, games, learning_rate)
+
+    Returns:
+        A list with the result of every game (see train_game)
+    """
+    seed, games, learning_rate = task
+    rng = random.Random(seed)
+    return [train_game(_network, rng, learning_rate) for _ in range(games)]
+
+
+def train(path:str, games:int, workers:int=1, learning_rate:float=0.1, tuples:tuple=SMALL_TUPLES,
+          seed:int=0, chunk:int=100, report=None) -> None:
+    """
+    Trains the network of a weight file, creating it if it's missing
+
+    Args:
+        path: A string, the path of the weight file
+        games: An integer, the number of games to play
+        workers: An integer, the number of processes playing the games
+        learning_rate: A float, the fraction of the error corrected by every update
+        tuples: A tuple of tuples of integers, the cells of every tuple of a new network
+        seed: An integer, the seed of the first chunk of games, chunk i uses seed+i
+        chunk: An integer, the number of games played by a worker before reporting their results
+        report: An optional function, called with the list of results of every chunk (see train_game)
+    """
+    if tables.read_key(path) is None:
+        create(path, tuples)
+
+    tasks = [(seed + k, min(chunk, games - start), learning_rate) for k, start in enumerate(range(0, games, chunk))]
+    if workers <= 1:
+        _init_worker(path)
+        results = map(_train_games, tasks)
+        for chunk_results in results:
+            if report is not None:
+                report(chunk_results)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(path,)) as pool:
+        for chunk_results in pool.imap_unordered(_train_games, tasks):
+            if report is not None:
+                report(chunk_results)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Trains an n-tuple network with TD(0) on headless games")
+    parser.add_argument("--games", type=int, default=10000, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--weights", default=DEFAULT_PATH, help="weight file, created if it's missing")
+    parser.add_argument("--learning-rate", type=float, default=0.1, help="fraction of the error corrected by every update")
+    parser.add_argument("--large", action="store_true", help="use the 6-cell tuples for a new weight file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the games")
+    parser.add_argument("--chunk", type=int, default=100, help="games played by a worker between reports")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    start = time.perf_counter()
+    played = [0]
+
+    def report(results):
+        played[0] += len(results)
+        mean = sum(score for score, _, _ in results) / len(results)
+        best = max(exponent for _, _, exponent in results)
+        print("%d games in %.1fs, last %d: mean score %.1f, max tile %d" % (
+            played[0], time.perf_counter() - start, len(results), mean, 1 << best))
+
+    train(args.weights, args.games, args.workers, args.learning_rate,
+          LARGE_TUPLES if args.large else SMALL_TUPLES, args.seed, args.chunk, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Profiler module
+
+An opt-in instrumentation of the frame loop. When it's enabled, the time of every frame is split in sections
+(events, logic, render and update) and some counters (text renders, rect draws, tile blits, moves) are kept.
+The last frames are stored in a fixed-size ring buffer, they can be summarised, drawn as an overlay
+and dumped to a CSV file.
+
+It's enabled by the environment variable GAME2048_PROFILE (its value, if it isn't "1", is the path of the dump)
+or by the --profile flag of main.py. When it's disabled, every hook returns immediately
+
+    Usage example:
+
+    PROFILER.begin_frame()
+    PROFILER.switch("events")
+    ...
+    PROFILER.count("text_renders")
+    ...
+    PROFILER.end_frame()
+    PROFILER.dump()
+"""
+
+import os
+import time
+from array import array
+
+ENV_VAR = "GAME2048_PROFILE"
+DEFAULT_PATH = "profile.csv"
+
+SECTIONS = ("events", "logic", "render", "update")
+COUNTERS = ("text_renders", "rect_draws", "blits", "moves")
+
+
+class Profiler:
+    """
+    A class designed to record the timings and the counters of the last frames
+
+    Attributes:
+        enabled: A boolean, representing if the hooks record anything
+        path: A string, the path of the CSV file written by dump
+        capacity: An integer, the number of frames kept in the ring buffer
+        __times: An array of doubles, the time (in seconds) spent in every section, len(SECTIONS) for every frame
+        __counts: An array of integers, the counters, len(COUNTERS) for every frame
+        __frames: An integer, the number of frames recorded since the beginning
+        __section: An integer, the index of the section the time is currently charged to, None outside a frame
+        __last: A float, the time of the last switch of section
+        __overlay_rect: A pygame Rect, the area covered by the overlay so far, None if it has never been drawn
+    """
+
+    def __init__(self, enabled:bool=False, path:str=DEFAULT_PATH, capacity:int=600) -> None:
+        """
+        Inits Profiler
+
+        Args:
+            enabled: A boolean, representing if the hooks record anything
+            path: A string, the path of the CSV file written by dump
+            capacity: An integer, the number of frames kept in the ring buffer
+        """
+        self.enabled = enabled
+        self.path = path
+        self.capacity = capacity
+        self.__times = array("d", bytes(8*capacity*len(SECTIONS)))
+        self.__counts = array("L", [0]) * (capacity*len(COUNTERS))
+        self.__frames = 0
+        self.__section = None
+        self.__last = 0.0
+        self.__overlay_rect = None
+
+    def enable(self, path:str=None) -> None:
+        """
+        Enables the hooks
+
+        Args:
+            path: An optional string, the path of the CSV file written by dump
+        """
+        self.enabled = True
+        if path is not None:
+            self.path = path
+
+    def begin_frame(self) -> None:
+        """
+        Starts recording a new frame, overwriting the oldest one if the ring buffer is full
+        """
+        if not self.enabled:
+            return
+        slot = self.__frames % self.capacity
+        for k in range(len(SECTIONS)):
+            self.__times[slot*len(SECTIONS) + k] = 0.0
+        for k in range(len(COUNTERS)):
+            self.__counts[slot*len(COUNTERS) + k] = 0
+        self.__section = None
+        self.__last = time.perf_counter()
+
+    def switch(self, section:str):
+        """
+        Charges the time elapsed since the last switch to the current section, then makes another section current
+
+        Args:
+            section: A string, one of SECTIONS, or None to stop charging the time to any section
+
+        Returns:
+            The name of the section that was current, so that nested hooks can restore it
+        """
+        if not self.enabled:
+            return None
+        now = time.perf_counter()
+        previous = self.__section
+        if previous is not None:
+            self.__times[(self.__frames % self.capacity)*len(SECTIONS) + previous] += now - self.__last
+        self.__section = None if section is None else SECTIONS.index(section)
+        self.__last = now
+        return None if previous is None else SECTIONS[previous]
+
+    def count(self, counter:str, n:int=1) -> None:
+        """
+        Increments a counter of the current frame
+
+        Args:
+            counter: A string, one of COUNTERS
+            n: An integer, the increment
+        """
+        if not self.enabled:
+            return
+        self.__counts[(self.__frames % self.capacity)*len(COUNTERS) + COUNTERS.index(counter)] += n
+
+    def end_frame(self) -> None:
+        """
+        Ends the current frame
+        """
+        if not self.enabled:
+            return
+        self.switch(None)
+        self.__frames += 1
+
+    def get_frames(self) -> list:
+        """
+        Returns the frames kept in the ring buffer
+
+        Returns:
+            A list of tuples, from the oldest to the newest frame: the index of the frame,
+            the time (in seconds) of every section and the value of every counter
+        """
+        frames = []
+        for frame in range(max(0, self.__frames - self.capacity), self.__frames):
+            slot = frame % self.capacity
+            frames.append((frame,)
+                          + tuple(self.__times[slot*len(SECTIONS):(slot+1)*len(SECTIONS)])
+                          + tuple(self.__counts[slot*len(COUNTERS):(slot+1)*len(COUNTERS)]))
+        return frames
+
+    def get_summary(self) -> dict:
+        """
+        Summarises the frames kept in the ring buffer
+
+        Returns:
+            A dictionary mapping every section (and "total") to a tuple of 2 floats, the mean
+            and the 99th percentile of its time (in milliseconds), and every counter to its mean for frame
+        """
+        frames = self.get_frames()
+        summary = {}
+        if not frames:
+            return summary
+
+        columns = list(zip(*frames))
+        totals = [sum(frame[1:1+len(SECTIONS)]) for frame in frames]
+        for name, values in list(zip(SECTIONS, columns[1:1+len(SECTIONS)])) + [("total", totals)]:
+            values = sorted(values)
+            summary[name] = (1000 * sum(values) / len(values), 1000 * values[min(len(values)-1, int(0.99 * len(values)))])
+        for name, values in zip(COUNTERS, columns[1+len(SECTIONS):]):
+            summary[name] = sum(values) / len(values)
+        return summary
+
+    def draw_overlay(self, screen, font, position:tuple=(0,0)) -> list:
+        """
+        Draws the summary of the last frames on the screen
+
+        Args:
+            screen: The pygame surface where the overlay will be drawn
+            font: A pygame font used to write the summary
+            position: A tuple of 2 integers, the absolute position (in pixel) of the top left corner of the overlay
+
+        Returns:
+            A list of pygame Rects, the areas of the screen that changed
+        """
+        import pygame
+        summary = self.get_summary()
+        if not summary:
+            return []
+
+        lines = ["%-7s %6s %6s ms" % ("", "mean", "p99")]
+        lines += ["%-7s %6.2f %6.2f ms" % ((name,) + summary[name]) for name in SECTIONS + ("total",)]
+        lines.append(" ".join("%s %.1f" % (name.split("_")[0], summary[name]) for name in COUNTERS))
+
+        surfaces = [font.render(line, False, (255,255,255)) for line in lines]
+        width = max(surface.get_width() for surface in surfaces) + 8
+        height = sum(surface.get_height() for surface in surfaces) + 8
+        rect = pygame.Rect(position, (width, height))
+        # The box never shrinks: when the text gets narrower, the pixels of the wider text drawn before are covered too
+        if self.__overlay_rect is not None:
+            rect.union_ip(self.__overlay_rect)
+        self.__overlay_rect = rect
+        screen.fill((0,0,0), rect)
+        y = position[1] + 4
+        for surface in surfaces:
+            screen.blit(surface, (position[0] + 4, y))
+            y += surface.get_height()
+        return [rect]
+
+    def dump(self, path:str=None) -> None:
+        """
+        Writes the frames kept in the ring buffer to a CSV file, if the profiler is enabled
+
+        Args:
+            path: An optional string, the path of the file (the path attribute by default)
+        """
+        if not self.enabled:
+            return
+        with open(path or self.path, "w") as f:
+            f.write(",".join(("frame",) + tuple(name + "_ms" for name in SECTIONS) + COUNTERS) + "\n")
+            for frame in self.get_frames():
+                times = ["%.4f" % (1000 * t) for t in frame[1:1+len(SECTIONS)]]
+                f.write(",".join([str(frame[0])] + times + [str(c) for c in frame[1+len(SECTIONS):]]) + "\n")
+
+
+def _from_environment() -> Profiler:
+    """
+    Builds the profiler of the process, enabled if the environment variable is set
+    """
+    value = os.environ.get(ENV_VAR, "")
+    if value in ("", "0"):
+        return Profiler()
+    return Profiler(enabled=True, path=DEFAULT_PATH if value == "1" else value)
+
+
+# The profiler of the process, shared by main.py and the components it draws
+PROFILER = _from_environment()
@@ -0,0 +1,133 @@
+"""
+Replay module
+
+A compact binary log of the moves and spawns of a game, and a replayer running it
+at full engine speed (see the bitboard module) with no rendering.
+
+A log starts with a 3-byte header (the magic "2R" and the format version),
+followed by one byte for each of the 2 initial spawns and one byte for every turn:
+    bits 0-1: the move (bitboard.UP, RIGHT, DOWN or LEFT), always 0 for the initial spawns
+    bits 2-5: the index (4*i+j) of the cell where the tile spawned
+    bit 6: set if the spawned tile is a 4, clear if it is a 2
+
+    Usage example:
+
+    core = GameCore(seed=42, record=True)
+    ...
+    board, score, moves = replay(core.get_log())
+    assert board == core.get_board() and score == core.get_score()
+"""
+
+import bitboard
+
+MAGIC = b"2R"
+VERSION = 1
+HEADER = MAGIC + bytes([VERSION])
+
+
+class ReplayError(ValueError):
+    """
+    Raised when a log is malformed or inconsistent with the rules of the game
+    """
+
+
+def encode(direction:int, cell:int, exponent:int) -> int:
+    """
+    Encodes a turn in a single byte
+
+    Args:
+        direction: An integer, the move of the turn (0 for the initial spawns)
+        cell: An integer, the index (4*i+j) of the cell where the tile spawned
+        exponent: An integer, the exponent of the spawned tile (1 or 2)
+
+    Returns:
+        An integer between 0 and 127
+    """
+    return direction | cell << 2 | (exponent - 1) << 6
+
+
+def decode(byte:int) -> tuple:
+    """
+    Decodes a turn
+
+    Args:
+        byte: An integer, an encoded turn
+
+    Returns:
+        A tuple of 3 integers: the move, the index of the cell of the spawned tile and its exponent
+    """
+    return byte & 3, (byte >> 2) & 0xF, (byte >> 6 & 1) + 1
+
+
+def _initial_board(log:bytes) -> int:
+    """
+    Checks the header of a log and decodes its initial spawns
+
+    Args:
+        log: The bytes of a log
+
+    Returns:
+        The packed board at the beginning of the game
+
+    Raises:
+        ReplayError: if the log is malformed
+    """
+    if log[:len(HEADER)] != HEADER:
+        raise ReplayError("not a replay log, or unsupported version")
+    if len(log) < len(HEADER) + 2:
+        raise ReplayError("truncated replay log")
+
+    board = 0
+    for byte in log[len(HEADER):len(HEADER)+2]:
+        _, cell, exponent = decode(byte)
+        board |= exponent << 4*cell
+    return board
+
+
+def iter_replay(log:bytes):
+    """
+    Replays a log turn by turn
+
+    Args:
+        log: The bytes of a log (see GameCore.get_log)
+
+    Yields:
+        A tuple of 3 integers for every turn: the move, the packed board and the score after the turn
+
+    Raises:
+        ReplayError: if the log is malformed or makes an impossible turn
+    """
+    board = _initial_board(log)
+    score = 0
+    move = bitboard.move
+    for byte in log[len(HEADER)+2:]:
+        direction, cell, exponent = decode(byte)
+        new_board, gained = move(board, direction)
+        if new_board == board:
+            raise ReplayError("illegal move in replay log")
+        if (new_board >> 4*cell) & 0xF:
+            raise ReplayError("tile spawned in a non-void cell")
+        board = new_board | exponent << 4*cell
+        score += gained
+        yield direction, board, score
+
+
+def replay(log:bytes) -> tuple:
+    """
+    Replays a whole log
+
+    Args:
+        log: The bytes of a log (see GameCore.get_log)
+
+    Returns:
+        A tuple of 3 integers: the final packed board, the final score and the number of moves
+
+    Raises:
+        ReplayError: if the log is malformed or makes an impossible turn
+    """
+    board = _initial_board(log)
+    score = 0
+    moves = 0
+    for _, board, score in iter_replay(log):
+        moves += 1
+    return board, score, moves
@@ -0,0 +1,271 @@
+"""
+Server module
+
+A headless game server: it hosts many concurrent 2048 sessions (bots or remote players) with asyncio,
+speaking a line-delimited JSON protocol over TCP or Unix sockets. Every line sent by a client is a request,
+answered by exactly one line, in order:
+
+    {"op": "new", "seed": 42, "rows": 4, "cols": 4}     starts a session, every field but op is optional
+    {"op": "move", "session": 1, "move": "left"}        makes a move ("up", "right", "down" or "left")
+    {"op": "state", "session": 1}                       returns the state of a session
+    {"op": "legal", "session": 1}                       returns the legal moves of a session
+    {"op": "close", "session": 1}                       ends a session
+
+A reply is {"ok": true, ...} or {"ok": false, "error": message}. The replies of new, move and state hold
+the state of the session: "session", "board" (the rows of tile values, 0 for a void cell), "score", "over" and "legal";
+the reply of a move also holds "moved" (False if the move wasn't legal) and "gained" (the score of the move).
+A session belongs to the connection that started it and ends with it.
+
+Every session is a whole GameCore (its board, score and legal moves, but also its grid engine and its recorder,
+a few hundred bytes); the unseeded ones share a single random generator instead of owning one
+
+    Usage example:
+
+    python server.py --port 2048
+    python server.py --unix /tmp/2048.sock
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+from core import GameCore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 2048
+
+# The bytes of output buffered for a connection before the server waits for the client to read them
+WRITE_BUFFER_LIMIT = 1 << 16
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a request can't be served, its message is sent back to the client
+    """
+
+
+class Server:
+    """
+    A class designed to serve 2048 sessions to many concurrent connections
+
+    Attributes:
+        max_sessions: An integer, the maximum number of sessions open at once on the whole server
+        __rng: A random.Random instance, shared by the sessions started without a seed
+        __connections: An integer, the number of open connections
+        __sessions: An integer, the number of open sessions
+        __last_session: An integer, the id of the last session started (the ids are unique on the whole server)
+        __moves: An integer, the number of moves made since the server started
+        __encode: A function, encoding a reply into a compact JSON string
+    """
+
+    def __init__(self, max_sessions:int=100000, seed=None) -> None:
+        """
+        Inits Server
+
+        Args:
+            max_sessions: An integer, the maximum number of sessions open at once on the whole server
+            seed: An optional seed for the random generator shared by the unseeded sessions
+        """
+        self.max_sessions = max_sessions
+        self.__rng = random.Random(seed)
+        self.__connections = 0
+        self.__sessions = 0
+        self.__last_session = 0
+        self.__moves = 0
+        self.__encode = json.JSONEncoder(separators=(",", ":")).encode
+
+    def get_stats(self) -> tuple:
+        """
+        Returns some statistics about the server
+
+        Returns:
+            A tuple of 3 integers: the number of open connections, the number of open sessions and the number of moves made
+        """
+        return self.__connections, self.__sessions, self.__moves
+
+    async def serve_tcp(self, host:str=DEFAULT_HOST, port:int=DEFAULT_PORT) -> asyncio.AbstractServer:
+        """
+        Starts listening on a TCP socket
+
+        Returns:
+            The asyncio server, already serving
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_unix(self, path:str) -> asyncio.AbstractServer:
+        """
+        Starts listening on a Unix socket
+
+        Returns:
+            The asyncio server, already serving
+        """
+        return await asyncio.start_unix_server(self.handle, path)
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """
+        Serves a connection until the client closes it, then ends its sessions
+
+        Args:
+            reader: The asyncio StreamReader of the connection
+            writer: The asyncio StreamWriter of the connection
+        """
+        self.__connections += 1
+        sessions = {}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    # ValueError: a line longer than the limit of the reader
+                    break
+                if not line:
+                    break
+                if line.isspace():
+                    continue
+
+                writer.write(self.handle_request(sessions, line))
+                # I wait for the client only when it's slow at reading, not after every reply
+                if writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                    await writer.drain()
+        finally:
+            self.__connections -= 1
+            self.__sessions -= len(sessions)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def handle_request(self, sessions:dict, line:bytes) -> bytes:
+        """
+        Serves a single request
+
+        Args:
+            sessions: A dictionary mapping the id of every session of the connection to its GameCore
+            line: The bytes of the request
+
+        Returns:
+            The bytes of the reply, a line of JSON
+        """
+        try:
+            try:
+                request = json.loads(line)
+            except (ValueError, RecursionError):
+                # A deeply nested line exhausts the recursion of the decoder, it's rejected like any malformed line
+                raise ProtocolError("invalid JSON")
+            if not isinstance(request, dict):
+                raise ProtocolError("a request must be a JSON object")
+
+            op = request.get("op")
+            if op == "new":
+                reply = self.__new(sessions, request)
+            elif op in ("move", "state", "legal", "close"):
+                session = request.get("session")
+                # JSON true and false are Python bools, which are ints too: they don't address the sessions 1 and 0
+                core = sessions.get(session) if type(session) is int else None
+                if core is None:
+                    raise ProtocolError("unknown session: %r" % (session,))
+
+                if op == "move":
+                    reply = self.__move(session, core, request.get("move"))
+                elif op == "state":
+                    reply = self.__state(session, core)
+                elif op == "legal":
+                    reply = {"ok": True, "session": session, "legal": core.legal_moves()}
+                else:
+                    del sessions[session]
+                    self.__sessions -= 1
+                    reply = {"ok": True, "session": session}
+            else:
+                raise ProtocolError("unknown op: %r" % (op,))
+        except ProtocolError as e:
+            reply = {"ok": False, "error": str(e)}
+
+        return (self.__encode(reply) + "\n").encode()
+
+    def __new(self, sessions:dict, request:dict) -> dict:
+        """
+        Starts a session
+        """
+        if self.__sessions >= self.max_sessions:
+            raise ProtocolError("too many sessions")
+
+        seed = request.get("seed")
+        rows, cols = request.get("rows", 4), request.get("cols", 4)
+        if type(rows) is not int or type(cols) is not int:
+            raise ProtocolError("rows and cols must be integers")
+        try:
+            # A seeded session has its own generator, so it can be played again
+            if seed is None:
+                core = GameCore(rng=self.__rng, rows=rows, cols=cols)
+            else:
+                core = GameCore(seed=seed, rows=rows, cols=cols)
+        except (ValueError, TypeError) as e:
+            raise ProtocolError(str(e))
+
+        self.__last_session += 1
+        session = self.__last_session
+        sessions[session] = core
+        self.__sessions += 1
+        return self.__state(session, core)
+
+    def __move(self, session:int, core:GameCore, move) -> dict:
+        """
+        Makes a move in a session
+        """
+        if move not in ("up", "right", "down", "left"):
+            raise ProtocolError("unknown move: %r" % (move,))
+
+        score = core.get_score()
+        moved = core.make_move(move)
+        self.__moves += moved
+        reply = self.__state(session, core)
+        reply["moved"] = moved
+        reply["gained"] = core.get_score() - score
+        return reply
+
+    def __state(self, session:int, core:GameCore) -> dict:
+        """
+        Builds the state of a session
+        """
+        legal = core.legal_moves()
+        return {
+            "ok": True,
+            "session": session,
+            "board": core.get_grid().to_matrix(core.get_board()),
+            "score": core.get_score(),
+            "over": not legal,
+            "legal": legal,
+        }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serves headless 2048 sessions over a line-delimited JSON protocol")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address of the TCP socket")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port of the TCP socket")
+    parser.add_argument("--unix", help="path of a Unix socket, used instead of TCP")
+    parser.add_argument("--max-sessions", type=int, default=100000, help="maximum number of sessions open at once")
+    parser.add_argument("--seed", type=int, help="seed of the random generator shared by the unseeded sessions")
+    return parser.parse_args(argv)
+
+
+async def _serve(args:argparse.Namespace) -> None:
+    server = Server(args.max_sessions, args.seed)
+    if args.unix:
+        listener = await server.serve_unix(args.unix)
+    else:
+        listener = await server.serve_tcp(args.host, args.port)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None) -> None:
+    try:
+        asyncio.run(_serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
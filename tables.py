@@ -0,0 +1,194 @@
+"""
+Tables module
+
+A cache of precomputed lookup tables, generated once into a versioned binary file and loaded with mmap,
+so that every process using them maps the same pages instead of building (and storing) its own copy.
+
+A file starts with a header:
+    the magic "2TBL" and the format version (2 bytes)
+    the key of the content (a string identifying the generator and its parameters) and the number of tables
+    for every table: its name, its array typecode, its offset and its length in bytes
+followed by the data of the tables, every table aligned to 64 bytes.
+A file whose format version or key doesn't match is generated again.
+
+The files are stored in the directory named by the environment variable GAME2048_CACHE,
+by default 2048.py in the user's cache directory. If it can't be written, the tables are built in memory
+
+    Usage example:
+
+    tables = load("bitboard", "rows v1", build)
+    ROW_LEFT = tables["ROW_LEFT"]
+"""
+
+import mmap
+import os
+import struct
+
+MAGIC = b"2TBL"
+VERSION = 1
+ALIGNMENT = 64
+
+ENV_VAR = "GAME2048_CACHE"
+
+# The maps opened by this process, kept alive as long as their tables are used
+_MAPS = []
+
+
+def cache_dir() -> str:
+    """
+    Returns the directory where the table files are stored
+    """
+    path = os.environ.get(ENV_VAR)
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "2048.py")
+
+
+def _pack_string(text:str) -> bytes:
+    data = text.encode()
+    return struct.pack("<H", len(data)) + data
+
+
+def _unpack_string(buffer, offset:int) -> tuple:
+    length, = struct.unpack_from("<H", buffer, offset)
+    return bytes(buffer[offset+2:offset+2+length]).decode(), offset+2+length
+
+
+def write(path:str, key:str, tables:dict) -> None:
+    """
+    Writes tables to a file, atomically replacing it
+
+    Args:
+        path: A string, the path of the file
+        key: A string, the key of the content
+        tables: A dictionary mapping the name of every table to an array.array
+    """
+    # The header is laid out first, so that the offsets of the tables are known
+    entries = [(name, table.typecode, len(table) * table.itemsize) for name, table in tables.items()]
+    header_size = len(MAGIC) + 2 + len(_pack_string(key)) + 2
+    header_size += sum(len(_pack_string(name)) + 1 + 16 for name, _, _ in entries)
+
+    offset = -(-header_size // ALIGNMENT) * ALIGNMENT
+    header = MAGIC + struct.pack("<H", VERSION) + _pack_string(key) + struct.pack("<H", len(entries))
+    offsets = []
+    for name, typecode, size in entries:
+        header += _pack_string(name) + typecode.encode() + struct.pack("<QQ", offset, size)
+        offsets.append(offset)
+        offset += -(-size // ALIGNMENT) * ALIGNMENT
+
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "wb") as f:
+        f.write(header)
+        for (name, _, _), table_offset in zip(entries, offsets):
+            f.write(bytes(table_offset - f.tell()))
+            f.write(tables[name].tobytes())
+    os.replace(temporary, path)
+
+
+def read_key(path:str):
+    """
+    Reads the key of the content of a file, without mapping its tables
+
+    Args:
+        path: A string, the path of the file
+
+    Returns:
+        A string, or None if the file is missing or if its format version doesn't match
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(len(MAGIC) + 4 + 0xFFFF)
+        if header[:len(MAGIC)] != MAGIC or struct.unpack_from("<H", header, len(MAGIC))[0] != VERSION:
+            return None
+        return _unpack_string(header, len(MAGIC) + 2)[0]
+    except (OSError, struct.error, UnicodeDecodeError):
+        return None
+
+
+def read(path:str, key:str, writable:bool=False):
+    """
+    Maps the tables of a file
+
+    Args:
+        path: A string, the path of the file
+        key: A string, the expected key of the content
+        writable: A boolean, if True the tables can be modified: the changes are written to the file
+            and seen by every process mapping it
+
+    Returns:
+        A dictionary mapping the name of every table to a memoryview (indexed like an array.array), read-only unless writable,
+        None if the file is missing, or if its format version or its key doesn't match
+    """
+    try:
+        with open(path, "r+b" if writable else "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if buffer[:len(MAGIC)] != MAGIC or struct.unpack_from("<H", buffer, len(MAGIC))[0] != VERSION:
+            return None
+        file_key, offset = _unpack_string(buffer, len(MAGIC) + 2)
+        if file_key != key:
+            return None
+
+        count, = struct.unpack_from("<H", buffer, offset)
+        offset += 2
+        view = memoryview(buffer)
+        tables = {}
+        for _ in range(count):
+            name, offset = _unpack_string(buffer, offset)
+            typecode = chr(buffer[offset])
+            table_offset, size = struct.unpack_from("<QQ", buffer, offset+1)
+            offset += 17
+            if table_offset + size > len(buffer):
+                return None
+            tables[name] = view[table_offset:table_offset+size].cast(typecode)
+    except (struct.error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+    _MAPS.append(buffer)
+    return tables
+
+
+def load(name:str, key:str, build) -> dict:
+    """
+    Loads a set of tables from its file, generating the file if it's missing or stale
+
+    Args:
+        name: A string, the name of the set of tables (the stem of its file)
+        key: A string, identifying the generator and its parameters: when it changes, the file is generated again
+        build: A function with no arguments, returning a dictionary mapping the name of every table to an array.array
+
+    Returns:
+        A dictionary mapping the name of every table to a read-only memoryview (indexed like an array.array),
+        or to the built array.array if the file can't be written
+    """
+    path = os.path.join(cache_dir(), name + ".tables")
+    tables = read(path, key)
+    if tables is not None:
+        return tables
+
+    built = build()
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+        write(path, key, built)
+    except OSError:
+        return built
+
+    tables = read(path, key)
+    return tables if tables is not None else built
+
+
+def clear() -> None:
+    """
+    Removes every table file from the cache directory
+    """
+    try:
+        names = os.listdir(cache_dir())
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(".tables"):
+            os.remove(os.path.join(cache_dir(), name))
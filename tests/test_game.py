@@ -0,0 +1,52 @@
+"""
+Tests of the Game class, rendered headless through the SDL dummy video driver
+
+    Usage example:
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from game import Game, SLIDE_TIME
+from tile_cache import TILE_COLORS
+
+CELL_SIZE = 96
+MARGIN = 12
+
+
+class TestAnimationsToggle(unittest.TestCase):
+
+    def setUp(self) -> None:
+        pygame.display.init()
+        self.screen = pygame.display.set_mode((500, 500))
+        self.clock = [0]
+        self.game = Game((0,0), CELL_SIZE, MARGIN, None, 50, seed=0, animations=False, clock=lambda: self.clock[0])
+
+    def tearDown(self) -> None:
+        pygame.display.quit()
+
+    def test_tiles_drawn_after_enabling_animations(self) -> None:
+        # I enable the animations right after a move made without them, while its slide would still be running
+        self.game.make_move(self.game.legal_moves()[0])
+        self.clock[0] += SLIDE_TIME // 2
+        self.game.set_animations(True)
+        self.assertTrue(self.game.show(self.screen))
+
+        grid = self.game.get_core().get_grid()
+        for i, row in enumerate(grid.to_matrix(self.game.get_core().get_board())):
+            for j, value in enumerate(row):
+                # I sample the tile next to its left edge, away from the value written in the middle
+                x = MARGIN*(j+1) + CELL_SIZE*j + 8
+                y = MARGIN*(i+1) + CELL_SIZE*i + CELL_SIZE//2
+                self.assertEqual(tuple(self.screen.get_at((x,y)))[:3], TILE_COLORS[value], (i, j, value))
+
+
+if __name__ == "__main__":
+    unittest.main()
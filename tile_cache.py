@@ -0,0 +1,129 @@
+"""
+Tile cache module
+
+The TileCache class pre-renders the tiles of a 2048 board (rounded background and value),
+so that drawing a tile is a single blit
+
+    Usage example:
+
+    cache = TileCache(fonts)
+    sprite = cache.get(2048, cell_size)
+    screen.blit(sprite, sprite.get_rect(center=cell_center))
+"""
+
+from collections import OrderedDict
+import pygame
+from profiler import PROFILER
+
+# The color of the tile depends on its value
+TILE_COLORS = {
+    0: (205,193,180),
+    2: (238,228,218),
+    4: (238,225,201),
+    8: (243,178,122),
+    16: (246,150,100),
+    32: (247,124,95),
+    64: (247,95,59),
+    128: (237,208,115),
+    256: (237,204,98),
+    512: (237,200,80),
+    1024: (237,197,63),
+    2048: (237,194,46),
+}
+BIG_TILE_COLOR = (60,58,50)
+
+# The color of the value depends on the tile too
+DARK_TEXT_COLOR = (119,110,101)
+LIGHT_TEXT_COLOR = (249,246,242)
+
+
+class TileCache:
+    """
+    A class designed to pre-render the tiles of a 2048 board, keyed by value and size.
+    When the cache is full, the least recently used tile is evicted
+
+    Attributes:
+        __fonts: A list of pygame fonts, the font must be chosen according to the number of digits (using it as index)
+        __max_size: An integer, the maximum number of tiles kept in the cache
+        __sprites: An OrderedDict, mapping a tuple (value, size) to the pre-rendered pygame surface, from the least to the most recently used
+    """
+
+    def __init__(self, fonts:list, max_size:int=128) -> None:
+        """
+        Inits TileCache
+
+        Args:
+            fonts: A list of pygame fonts, the font must be chosen according to the number of digits (using it as index)
+            max_size: An integer, the maximum number of tiles kept in the cache
+        """
+        self.__fonts = fonts
+        self.__max_size = max_size
+        self.__sprites = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__sprites)
+
+    def get(self, value:int, size:int) -> pygame.Surface:
+        """
+        Returns the sprite of a tile, rendering it if it isn't in the cache
+
+        Args:
+            value: An integer, the value of the tile (0 for a void cell)
+            size: An integer, the side (in pixel) of the tile
+
+        Returns:
+            A pygame surface with per-pixel alpha. The tile is centered in the surface,
+            that can be bigger than the tile when the value doesn't fit in it
+        """
+        key = (value, size)
+        sprite = self.__sprites.get(key)
+        if sprite is not None:
+            self.__sprites.move_to_end(key)
+            return sprite
+
+        sprite = self.__render(value, size)
+        self.__sprites[key] = sprite
+        if len(self.__sprites) > self.__max_size:
+            self.__sprites.popitem(last=False)
+        return sprite
+
+    def clear(self) -> None:
+        """
+        Removes every tile from the cache
+        """
+        self.__sprites.clear()
+
+    def __render(self, value:int, size:int) -> pygame.Surface:
+        """
+        Renders the sprite of a tile
+
+        Args:
+            value: An integer, the value of the tile (0 for a void cell)
+            size: An integer, the side (in pixel) of the tile
+
+        Returns:
+            A pygame surface with per-pixel alpha
+        """
+        text_surface = None
+        width = height = size
+        if value != 0:
+            text_color = DARK_TEXT_COLOR if value <= 4 else LIGHT_TEXT_COLOR
+            # The values with more digits than fonts are written with the smallest font
+            font = self.__fonts[min(len(str(value)), len(self.__fonts))-1]
+            text_surface = font.render(str(value), False, text_color)
+            PROFILER.count("text_renders")
+            width = max(width, text_surface.get_width())
+            height = max(height, text_surface.get_height())
+
+        sprite = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        tile = pygame.Rect(0, 0, size, size)
+        tile.center = (width//2, height//2)
+        pygame.draw.rect(sprite, TILE_COLORS.get(value, BIG_TILE_COLOR), tile, 0, 3)
+        PROFILER.count("rect_draws")
+
+        if text_surface is not None:
+            sprite.blit(text_surface, text_surface.get_rect(center=(width//2, height//2)))
+
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite
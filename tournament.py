@@ -0,0 +1,152 @@
+"""
+Tournament module
+
+Plays many headless 2048 games with a chosen policy, spreading them across a pool of processes.
+The result of every game is streamed to a JSONL file as soon as the game is over.
+The transitions of the games can also be recorded in a dataset (see the dataset module), every worker writes its own chunks
+
+    Usage example:
+
+    python tournament.py --games 1000 --policy expectimax --workers 64 --output results.jsonl
+    python tournament.py --games 100000 --policy ntuple --dataset selfplay
+"""
+
+import argparse
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import time
+
+import ai
+import bitboard
+import dataset
+import ntuple
+from core import GameCore
+
+POLICIES = ("random", "greedy", "expectimax", "montecarlo", "ntuple", "expectimax-ntuple")
+
+# The player of the current worker process, built once and reused for every game
+_player = None
+
+# The dataset writer of the current worker process, None if the games aren't recorded
+_recorder = None
+
+
+def _init_worker(dataset_path:str) -> None:
+    """
+    Opens the dataset writer of a worker process, its last chunk is written when the process exits
+    """
+    global _recorder
+    if dataset_path:
+        _recorder = dataset.DatasetWriter(dataset_path)
+        multiprocessing.util.Finalize(_recorder, _recorder.close, exitpriority=10)
+
+
+def make_player(policy:str, seed:int, depth:int, time_budget, weights:str=ntuple.DEFAULT_PATH):
+    """
+    Builds the player of a policy
+
+    Args:
+        policy: A string, one of POLICIES
+        seed: An integer, the seed of the random and of the Monte Carlo player
+        depth: An integer, the search depth of the expectimax player
+        time_budget: A float, the time budget (in seconds) of the expectimax and of the Monte Carlo player, None for no limit
+        weights: A string, the weight file of the n-tuple network of the ntuple policies
+
+    Returns:
+        A player, an object with a get_move(board) method
+    """
+    if policy == "random":
+        return ai.RandomPlayer(seed)
+    if policy == "greedy":
+        return ai.GreedyPlayer()
+    if policy == "expectimax":
+        return ai.ExpectimaxPlayer(depth=depth, time_budget=time_budget)
+    if policy == "montecarlo":
+        return ai.MonteCarloPlayer(time_budget=time_budget, seed=seed)
+    if policy == "ntuple":
+        return ai.NTuplePlayer(path=weights)
+    if policy == "expectimax-ntuple":
+        return ai.ExpectimaxPlayer(depth=depth, time_budget=time_budget, evaluator=ntuple.load(weights).evaluate)
+    raise ValueError("unknown policy: " + policy)
+
+
+def play_game(task:tuple) -> dict:
+    """
+    Plays a whole game
+
+    Args:
+        task: A tuple (index, seed, policy, depth, time_budget, weights)
+
+    Returns:
+        A dictionary with the result of the game
+    """
+    global _player
+    index, seed, policy, depth, time_budget, weights = task
+
+    start = time.perf_counter()
+
+    # The random players are seeded with the game, the other ones are reused across games
+    if policy in ("random", "montecarlo") or _player is None:
+        _player = make_player(policy, seed, depth, time_budget, weights)
+
+    # Every game spawns its tiles from its own seed, so it can be played again
+    core = GameCore(seed=seed, recorder=_recorder)
+    moves = 0
+    while True:
+        move = _player.get_move(core.get_board())
+        if move is None or not core.make_move(move):
+            break
+        moves += 1
+
+    return {
+        "game": index,
+        "seed": seed,
+        "policy": policy,
+        "score": core.get_score(),
+        "max_tile": 1 << bitboard.max_exponent(core.get_board()),
+        "moves": moves,
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Plays headless 2048 games across a pool of processes")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--policy", choices=POLICIES, default="random", help="policy used to choose the moves")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed+i")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file where results are streamed")
+    parser.add_argument("--depth", type=int, default=3, help="search depth of the expectimax policy")
+    parser.add_argument("--dataset", help="directory where the transitions of the games are recorded")
+    parser.add_argument("--weights", default=ntuple.DEFAULT_PATH, help="weight file of the ntuple policies (see ntuple.py)")
+    parser.add_argument("--time-budget", type=float, default=0.008,
+                        help="time budget (in seconds) of an expectimax or Monte Carlo decision, 0 for no limit (deterministic games)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    time_budget = args.time_budget if args.time_budget > 0 else None
+    tasks = [(i, args.seed + i, args.policy, args.depth, time_budget, args.weights) for i in range(args.games)]
+
+    start = time.perf_counter()
+    total_score = 0
+    with open(args.output, "w") as f, multiprocessing.Pool(args.workers, _init_worker, (args.dataset,)) as pool:
+        # The results are written as soon as every game is over, in completion order
+        for result in pool.imap_unordered(play_game, tasks):
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            total_score += result["score"]
+        # The workers must exit on their own (not be terminated), so they write their last chunk
+        pool.close()
+        pool.join()
+
+    elapsed = time.perf_counter() - start
+    print("%d games in %.2fs (%.1f games/s), mean score %.1f" % (
+        args.games, elapsed, args.games / elapsed, total_score / max(1, args.games)))
+
+
+if __name__ == "__main__":
+    main()